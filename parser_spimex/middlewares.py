@@ -3,11 +3,17 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+from urllib.parse import urlsplit
+
 from scrapy import signals
+from scrapy.responsetypes import responsetypes
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+from parser_xml.http_cache import DEFAULT_MAX_BYTES, STATUS_NOT_MODIFIED, HttpCache
+from parser_xml.rate_control import RateController, parse_retry_after
+
 
 class ParserSpimexSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -101,3 +107,158 @@ class ParserSpimexDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class HttpCacheMiddleware:
+    """
+    Условные запросы (ETag / Last-Modified) через общий дисковый кэш
+    parser_xml.http_cache: тот же кэш используют парсеры на requests
+    и aiohttp. Ответ 304 заменяется ответом 200 с телом из кэша.
+
+    Кэшируются только запросы к хосту BASE_DOMAIN; запросы с
+    meta["dont_cache"] (например, служебные запросы пауков) кэш не трогают.
+
+    Приоритет ниже HttpCompressionMiddleware (590), чтобы в кэш попадало
+    уже распакованное тело ответа.
+    """
+
+    def __init__(self, cache, host=None):
+        self.cache = cache
+        self.host = host
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        cache = HttpCache(
+            settings.get("HTTP_CACHE_DIR"),
+            settings.getint("HTTP_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES),
+        )
+        base_domain = settings.get("BASE_DOMAIN")
+        return cls(cache, urlsplit(base_domain).netloc if base_domain else None)
+
+    def _skip(self, request):
+        """
+        Запрос не к целевому сайту или с отказом от кэша.
+        """
+        if request.meta.get("dont_cache"):
+            return True
+        return self.host is not None and urlsplit(request.url).netloc != self.host
+
+    def process_request(self, request, spider):
+        if self._skip(request):
+            return None
+        for name, value in self.cache.request_headers(request.url).items():
+            request.headers.setdefault(name, value)
+        return None
+
+    def process_response(self, request, response, spider):
+        if self._skip(request):
+            return response
+        if response.status == STATUS_NOT_MODIFIED:
+            meta = self.cache.lookup(request.url)
+            if meta is None:
+                # Запись кэша вытеснена после построения условного запроса:
+                # запрос повторяется без условных заголовков
+                headers = request.headers.copy()
+                for name in ("If-None-Match", "If-Modified-Since"):
+                    headers.pop(name, None)
+                return request.replace(headers=headers, dont_filter=True)
+            body = self.cache.read_body(request.url)
+            headers = response.headers.copy()
+            if meta.get("content_type"):
+                headers["Content-Type"] = meta["content_type"]
+            response_class = responsetypes.from_args(
+                headers=headers, url=request.url, body=body
+            )
+            return response_class(
+                url=request.url,
+                status=200,
+                headers=headers,
+                body=body,
+                request=request,
+                flags=response.flags + ["cached"],
+            )
+
+        if response.status == 200:
+            headers = {
+                name: response.headers.get(name).decode("latin-1")
+                for name in ("ETag", "Last-Modified", "Content-Type")
+                if response.headers.get(name)
+            }
+            self.cache.store(
+                request.url,
+                headers,
+                body=response.body,
+                encoding=getattr(response, "encoding", None),
+            )
+        return response
+
+
+class AimdThrottleMiddleware:
+    """
+    AIMD-регулятор темпа запросов parser_xml.rate_control вместо
+    фиксированного DOWNLOAD_DELAY: по времени и статусу каждого ответа
+    (и по ошибкам загрузки) контроллер пересчитывает паузу и число
+    одновременных запросов, и они переносятся в слот загрузчика Scrapy.
+    При закрытии паука метрики контроллера пишутся в RATE_METRICS_FILE.
+
+    Приоритет выше RetryMiddleware (550): ответы 429 и 5xx учитываются
+    до повторных попыток.
+    """
+
+    def __init__(self, crawler, controller, metrics_file):
+        self.crawler = crawler
+        self.controller = controller
+        self.metrics_file = metrics_file
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        controller = RateController(
+            crawler.spider.name if crawler.spider else "scrapy",
+            start_delay=settings.getfloat("RATE_START_DELAY", 2.0),
+            min_delay=settings.getfloat("RATE_MIN_DELAY", 0.2),
+            max_delay=settings.getfloat("RATE_MAX_DELAY", 60.0),
+            max_concurrency=settings.getint("RATE_MAX_CONCURRENCY", 16),
+        )
+        middleware = cls(crawler, controller, settings.get("RATE_METRICS_FILE"))
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def _adjust_slot(self, request):
+        slot = self.crawler.engine.downloader.slots.get(
+            request.meta.get("download_slot")
+        )
+        if slot is not None:
+            slot.delay = self.controller.delay
+            slot.concurrency = self.controller.limit
+
+    def process_request(self, request, spider):
+        self._adjust_slot(request)
+        return None
+
+    def process_response(self, request, response, spider):
+        self.controller.record(
+            request.meta.get("download_latency", 0.0),
+            status=response.status,
+            retry_after=parse_retry_after(response.headers),
+        )
+        self._adjust_slot(request)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        self.controller.record(
+            request.meta.get("download_latency", 0.0), error=exception
+        )
+        self._adjust_slot(request)
+        return None
+
+    def spider_closed(self, spider):
+        if not self.metrics_file:
+            return
+        metrics = self.controller.export(self.metrics_file)
+        spider.logger.info(
+            f"Темп запросов: {metrics['throughput']} запр./с, "
+            f"пауза {metrics['delay']} с, одновременно {metrics['concurrency']}, "
+            f"снижений темпа: {sum(metrics['backoffs'].values())}"
+        )
@@ -50,9 +50,13 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
+DOWNLOADER_MIDDLEWARES = {
 #    "parser_spimex.middlewares.ParserSpimexDownloaderMiddleware": 543,
-#}
+    # Условные запросы через общий с parser_xml дисковый HTTP-кэш
+    "parser_spimex.middlewares.HttpCacheMiddleware": 580,
+    # AIMD-регулятор темпа запросов вместо фиксированного DOWNLOAD_DELAY
+    "parser_spimex.middlewares.AimdThrottleMiddleware": 900,
+}
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -100,6 +104,19 @@ URL_SAVE_DIR = '../app/spimex/migrations/cvs/spimex.cvs'
 LOG_SAVE_DIR = 'parser.log'
 XML_SAVE_DIR = 'downloaded_xls_files'
 CSV_FILE = 'raw/trading_results.csv'
+# Реестр ссылок на XLS-файлы (SQLite): статус скачивания и хеш файлов
+REGISTRY_PATH = 'raw/links.sqlite3'
+# Дисковый HTTP-кэш условных запросов (ETag / Last-Modified) и его предельный размер
+HTTP_CACHE_DIR = 'http_cache'
+HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Самая новая уже собранная дата торгов: обход ссылок останавливается на ней
+WATERMARK_FILE = 'raw/watermark.json'
+# AIMD-регулятор темпа запросов (parser_xml.rate_control)
+RATE_START_DELAY = 2.0
+RATE_MIN_DELAY = 0.2
+RATE_MAX_DELAY = 60.0
+RATE_MAX_CONCURRENCY = 16
+RATE_METRICS_FILE = 'raw/rate_metrics.json'
 BASE_SAVE_DIR = 'downloaded_xls_files'
 
 FEED_FORMAT = "csv"
@@ -4,6 +4,14 @@ import pandas as pd
 from scrapy import Spider, Request
 from scrapy.utils.project import get_project_settings
 from scrapy.utils.log import logger
+from parser_xml.archive import XlsArchive
+from parser_xml.registry import LinkRegistry
+from parser_xml.schema import (
+    RESULT_COLUMNS_MAP,
+    parse_trade_date,
+    to_compact_frame,
+    to_csv_frame,
+)
 from ..items import ParsedDataItem
 
 class XlsParserSpider(Spider):
@@ -14,19 +22,29 @@ class XlsParserSpider(Spider):
         super().__init__(*args, **kwargs)
         settings = get_project_settings()
         self.xml_save_dir = settings.get("XML_SAVE_DIR")
+        self.registry_path = settings.get("REGISTRY_PATH")
 
     def start_requests(self):
-        """Генерация начальных запросов."""
-        for root, dirs, files in os.walk(self.xml_save_dir):
-            for file in files:
-                if file.endswith(".xls"):
-                    file_path = os.path.join(root, file)
-                    logger.info(f"Обрабатывается файл: {file_path}")
-                    yield Request(
-                        url="https://example.com",
-                        meta={"file_path": file_path},
-                        dont_filter=True,
-                    )
+        """
+        Генерация начальных запросов: каждый уникальный файл архива
+        XLS-файлов один раз (с именами ссылок на него из реестра) и файлы
+        вне архива.
+        """
+        archive = XlsArchive(self.xml_save_dir)
+        with LinkRegistry(self.registry_path) as registry:
+            archive.adopt(registry)
+            sources = archive.sources(registry)
+        for file_path, names in sources:
+            logger.info(f"Обрабатывается файл: {file_path}")
+            yield Request(
+                url="https://example.com",
+                meta={
+                    "file_path": file_path,
+                    "names": names,
+                    "dont_cache": True,
+                },
+                dont_filter=True,
+            )
 
     def parse_xls_file(self, response):
         """Парсит XLS-файл и возвращает данные."""
@@ -64,7 +82,9 @@ class XlsParserSpider(Spider):
             logger.info(f"Обработан файл: {file_path}")
             logger.info(f"Найдено строк: {len(df)}")
 
-            yield from self._process_data(df, file_path)
+            yield from self._process_data(
+                df, file_path, response.meta.get("names")
+            )
 
         except Exception as e:
             logger.error(f"Ошибка при обработке файла {file_path}: {e}")
@@ -82,33 +102,34 @@ class XlsParserSpider(Spider):
         df = df.dropna(how="all")
         return df
 
-    def _process_data(self, df, file_path):
-        """Обрабатывает данные и возвращает результирующий DataFrame."""
-        date = os.path.splitext(os.path.basename(file_path))[0]
+    def _process_data(self, df, file_path, names=None):
+        """
+        Обрабатывает данные и возвращает результирующий DataFrame.
+        names (["dd.mm.yyyy_N", ...]) - имена ссылок на файл архива:
+        строки повторяются для каждой ссылки. Без них используется
+        имя файла.
+        """
+        file_stem = os.path.splitext(os.path.basename(file_path))[0]
 
         df.columns = df.columns.str.replace(r"\s+", " ", regex=True).str.strip()
 
-        if "Код Инструмента" not in df.columns:
-            logger.error("Столбец 'Код Инструмента' отсутствует!")
-            logger.error("Доступные столбцы:", df.columns.tolist())
+        missing = [column for column in RESULT_COLUMNS_MAP if column not in df.columns]
+        if missing:
+            logger.error(f"В файле {file_path} отсутствуют столбцы: {missing}")
             return
 
-        for index, row in df.iterrows():
-            try:
+        result_df = df[list(RESULT_COLUMNS_MAP)].rename(columns=RESULT_COLUMNS_MAP)
+        product_id = result_df["exchange_product_id"].str
+        result_df["oil_id"] = product_id[:4]
+        result_df["delivery_basis_id"] = product_id[4:7]
+        result_df["delivery_type_id"] = product_id[-1]
+        result_df["id"] = df.index + 1
+
+        for source in names or [file_stem]:
+            result_df["date"] = parse_trade_date(source)
+            result_df["source"] = source
+            for row in to_csv_frame(to_compact_frame(result_df)).itertuples(index=False):
                 item = ParsedDataItem()
-                item["id"] = index + 1
-                item["exchange_product_id"] = row["Код Инструмента"]
-                item["exchange_product_name"] = row["Наименование Инструмента"]
-                item["delivery_basis_name"] = row["Базис поставки"]
-                item["volume"] = row["Объем Договоров в единицах измерения"]
-                item["total"] = row["Обьем Договоров, руб."]
-                item["count"] = row["Количество Договоров, шт."]
-                item["oil_id"] = row["Код Инструмента"][:4]
-                item["delivery_basis_id"] = row["Код Инструмента"][4:7]
-                item["delivery_type_id"] = row["Код Инструмента"][-1]
-                item["date"] = date
-
+                for field, value in row._asdict().items():
+                    item[field] = None if pd.isna(value) else value
                 yield item
-            except KeyError as e:
-                logger.error(f"Ошибка обработки строки {index}: {e}")
-                continue
@@ -1,63 +1,98 @@
 import scrapy
-from bs4 import BeautifulSoup
-import pandas as pd
-import os
 from parser_spimex.logger_config import logger
+from parser_xml.extractor import (
+    extract_xls_links_and_dates,
+    get_next_page_url,
+    parse_html,
+)
+from parser_xml.registry import LinkRegistry
+from parser_xml.watermark import (
+    newest_date,
+    parse_date,
+    resolve_watermark,
+    split_by_watermark,
+    update_watermark,
+)
 
 
 class TradingSpider(scrapy.Spider):
     name = "trading_spider"
 
     custom_settings = {
-        "DOWNLOAD_DELAY": 2,
         "RANDOMIZE_DOWNLOAD_DELAY": True,
     }
 
+    def __init__(self, since=None, full=None, *args, **kwargs):
+        """
+        Аргументы паука (scrapy crawl trading_spider -a since=01.12.2024):
+        since - собрать ссылки начиная с этой даты, full - обойти все
+        страницы до MIN_YEAR, игнорируя watermark.
+        """
+        super().__init__(*args, **kwargs)
+        self.since = parse_date(since) if since else None
+        if since and self.since is None:
+            raise ValueError(f"Некорректная дата since: {since}, ожидается dd.mm.yyyy")
+        self.full = full not in (None, "", "0", "false", "False")
+        self.watermark = None
+        self.last_date = None
+        self.registry = None
+        # Страница списка не загружена: обход неполный, watermark не сдвигается
+        self.failed = False
+
     def start_requests(self):
+        self.watermark = resolve_watermark(
+            self.settings.get("WATERMARK_FILE"), self.since, self.full
+        )
+        self.registry = LinkRegistry(self.settings.get("REGISTRY_PATH"))
         base_url = self.settings.get("BASE_URL")
-        yield scrapy.Request(url=base_url, callback=self.parse)
+        yield scrapy.Request(url=base_url, callback=self.parse, errback=self.errback)
 
     def parse(self, response):
-        soup = BeautifulSoup(response.text, "html.parser")
-        xls_links, dates = self._extract_xls_links_and_dates(soup)
+        tree = parse_html(response.text)
+        xls_links, dates = extract_xls_links_and_dates(tree)
 
         for date in dates:
             if date and not self._validate_date(date):
                 return
 
-        self._save_to_csv(dates, xls_links)
+        dates, xls_links, reached = split_by_watermark(
+            dates, xls_links, self.watermark
+        )
+        if dates:
+            self._save_links(dates, xls_links)
+            self.last_date = newest_date(dates, self.last_date)
+        if reached:
+            logger.info(
+                f"Достигнута уже собранная дата торгов {self.watermark:%d.%m.%Y}."
+            )
+            return
 
-        next_page_url = self._get_next_page_url(soup)
+        next_page_url = get_next_page_url(tree)
         if next_page_url:
             base_domain = self.settings.get("BASE_DOMAIN")
-            yield response.follow(base_domain + next_page_url, self.parse)
-
-    def _extract_xls_links_and_dates(self, soup):
-        xls_links = []
-        dates = []
-
-        for item in soup.find_all("div", class_="accordeon-inner__item"):
-            link_element = item.find("a", class_="accordeon-inner__item-title link xls")
-            if link_element:
-                xls_links.append(link_element["href"])
-            else:
-                xls_links.append(None)
-            date_element = soup.select_one(
-                "html body main section div div:nth-of-type(2) div div div:nth-of-type(2) div:nth-of-type(1) div div:nth-of-type(1) div:nth-of-type(5) div div:nth-of-type(2) div p span"
+            yield response.follow(
+                base_domain + next_page_url, self.parse, errback=self.errback
             )
-            if date_element:
-                date = date_element.text.strip()
-                dates.append(date)
-            else:
-                dates.append(None)
-
-        return xls_links, dates
 
-    def _get_next_page_url(self, soup):
-        next_page_link = soup.find("li", class_="bx-pag-next")
-        if next_page_link and next_page_link.find("a"):
-            return next_page_link.find("a")["href"]
-        return None
+    def errback(self, failure):
+        """
+        Отмечает ошибку загрузки страницы списка (сеть или HttpError):
+        более старые страницы не собраны, поэтому watermark не обновляется.
+        """
+        self.failed = True
+        logger.error(f"Ошибка загрузки страницы {failure.request.url}: {failure.value!r}")
+
+    def closed(self, reason):
+        """
+        Закрывает реестр ссылок и сохраняет самую новую собранную дату
+        торгов, если обход завершён без ошибок загрузки страниц.
+        """
+        if self.registry is not None:
+            self.registry.close()
+        if reason != "finished" or self.failed or self.last_date is None:
+            return
+        if update_watermark(self.settings.get("WATERMARK_FILE"), self.last_date):
+            logger.info(f"Watermark обновлён: {self.last_date:%d.%m.%Y}")
 
     def _validate_date(self, date):
         min_year = self.settings.get("MIN_YEAR")
@@ -74,25 +109,11 @@ class TradingSpider(scrapy.Spider):
             return False
         return True
 
-    def _save_to_csv(self, dates, xls_links):
+    def _save_links(self, dates, xls_links):
         base_domain = self.settings.get("BASE_DOMAIN")
-        csv_file = self.settings.get("CSV_FILE")
-
-        data = {
-            "Дата торгов": dates,
-            "Ссылка на скачивание": [
-                base_domain + link if link else None for link in xls_links
-            ],
-        }
-        df = pd.DataFrame(data)
-
-        df = df[df["Дата торгов"].notna() & df["Ссылка на скачивание"].notna()]
-
-        if os.path.exists(csv_file):
-            df.to_csv(
-                csv_file,
-                mode="a", header=False, index=False, encoding="utf-8")
-        else:
-            df.to_csv(csv_file, index=False, encoding="utf-8")
-
-        logger.info(f"Данные сохранены в файл: {csv_file}")
+        new_links = self.registry.add_links(
+            dates, [base_domain + link if link else None for link in xls_links]
+        )
+        logger.info(
+            f"Новых ссылок: {new_links} из {len(xls_links)} ({self.registry.path})"
+        )
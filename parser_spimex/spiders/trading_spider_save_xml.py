@@ -1,110 +1,105 @@
 import scrapy
-import pandas as pd
 import os
-from datetime import datetime
+from datetime import date
 import requests
 from scrapy.utils.log import logger
+from parser_xml.archive import XlsArchive
+from parser_xml.http_cache import HttpCache, download_to_file
+from parser_xml.rate_control import RateController
+from parser_xml.registry import LinkRegistry, file_name
 
 
 class TradingSpiderSave(scrapy.Spider):
     name = "trading_spider_save"
     custom_settings = {
-        "DOWNLOAD_DELAY": 2,
         "RANDOMIZE_DOWNLOAD_DELAY": True,
     }
 
     def start_requests(self):
         """
-        Запускает паука. Проверяет CSV-файл и начинает обработку данных.
+        Запускает паука. Берёт из реестра ещё не скачанные ссылки
+        и начинает обработку данных.
         """
-        csv_file = self.settings.get("CSV_FILE")
-        base_save_dir = self.settings.get("BASE_SAVE_DIR")
-
-        self._create_year_folders(base_save_dir)
-
-        if not self._validate_csv_file(csv_file):
-            return
-
-        df = pd.read_csv(csv_file, encoding="utf-8")
+        min_year = self.settings.get("MIN_YEAR")
 
-        for index, row in df.iterrows():
+        self.archive = XlsArchive(self.settings.get("BASE_SAVE_DIR"))
+        self.registry = LinkRegistry(self.settings.get("REGISTRY_PATH"))
+        self.cache = HttpCache(
+            self.settings.get("HTTP_CACHE_DIR"),
+            self.settings.getint("HTTP_CACHE_MAX_BYTES"),
+        )
+        # Файлы скачиваются через requests, мимо загрузчика Scrapy:
+        # у этих запросов свой регулятор темпа
+        self.rate = RateController(
+            f"{self.name}.files",
+            start_delay=0,
+            min_delay=0,
+            max_delay=self.settings.getfloat("RATE_MAX_DELAY"),
+            max_concurrency=1,
+        )
+        self.session = self.rate.attach(requests.Session())
+        self._import_legacy_csv(self.settings.get("CSV_FILE"))
+
+        for link in self.registry.pending(min_date=date(min_year, 1, 1)):
             yield scrapy.Request(
                 url="https://example.com",
                 callback=self.parse_row,
-                meta={"row": row, "base_save_dir": base_save_dir},
+                meta={"link": dict(link), "dont_cache": True},
                 dont_filter=True,
             )
 
     def parse_row(self, response):
         """
-        Обрабатывает одну строку из CSV-файла.
+        Обрабатывает одну ссылку из реестра: файл скачивается в архив
+        XLS-файлов, одинаковые файлы хранятся один раз.
         """
-        row = response.meta["row"]
-        base_save_dir = response.meta["base_save_dir"]
-
-        date = row["Дата торгов"]
-        url = row["Ссылка на скачивание"]
-
-        if pd.isna(date) or pd.isna(url):
-            logger.warning(f"Пропущена строка: отсутствует дата или ссылка.")
-            return
+        link = response.meta["link"]
 
+        url = link["url"]
+        incoming_path = self.archive.incoming_path(file_name(link))
+        logger.info(f"Скачиваем файл: {url}")
         try:
-            date_obj = datetime.strptime(date, "%d.%m.%Y")
-            year = date_obj.year
-
-            file_name = f"{date_obj.strftime('%d.%m.%Y')}_{row.name}.xls"
-            save_path = os.path.join(base_save_dir, str(year), file_name)
-            logger.info(f"Скачиваем файл: {url}")
-            self._download_xls(url, save_path)
-        except ValueError:
-            logger.error(f"Не удалось распознать дату: {date}")
-        except Exception as e:
-            logger.error(f"Ошибка при обработке строки: {e}")
+            sha256 = self._download_xls(url, incoming_path)
+            save_path, duplicate = self.archive.store(incoming_path, sha256)
+        except (requests.exceptions.RequestException, OSError) as e:
+            logger.error(f"Ошибка при скачивании файла {url}: {e}")
+            self.registry.mark_failed(url, e)
+            return
+        self.registry.mark_downloaded(url, save_path, sha256)
+        if duplicate:
+            logger.info(f"Файл {url} уже есть в архиве: {save_path}")
 
-    def _create_year_folders(self, base_dir):
+    def closed(self, reason):
         """
-        Создаёт папки для каждого года в указанной базовой директории.
+        Закрывает реестр ссылок и HTTP-сессию, сохраняет метрики
+        регулятора темпа скачивания файлов.
         """
-        min_year = self.settings.get("MIN_YEAR")
-        for year in range(min_year, datetime.now().year + 1):
-            year_folder = os.path.join(base_dir, str(year))
-            if not os.path.exists(year_folder):
-                os.makedirs(year_folder)
-                logger.info(f"Создана папка: {year_folder}")
+        if getattr(self, "registry", None) is not None:
+            self.registry.close()
+            self.session.close()
+            self.rate.export(self.settings.get("RATE_METRICS_FILE"))
 
-    def _validate_csv_file(self, csv_file):
+    def _import_legacy_csv(self, csv_file):
         """
-        Проверяет, существует ли CSV-файл и содержит ли он необходимые столбцы.
+        Переносит ссылки из прежнего CSV-файла в пустой реестр.
         """
-        if not os.path.exists(csv_file):
-            logger.error(f"Файл {csv_file} не найден. Убедитесь, что он существует.")
-            return False
-
+        if self.registry.count() or not os.path.exists(csv_file):
+            return
         try:
-            df = pd.read_csv(csv_file, encoding="utf-8")
-        except Exception as e:
+            new_links = self.registry.import_csv(csv_file)
+        except (OSError, ValueError) as e:
             logger.error(f"Ошибка при чтении файла {csv_file}: {e}")
-            return False
-
-        if "Дата торгов" not in df.columns or "Ссылка на скачивание" not in df.columns:
-            logger.error(
-                "Файл не содержит необходимых столбцов 'Дата торгов' и 'Ссылка на скачивание'."
-            )
-            return False
-
-        return True
+            return
+        logger.info(f"Из {csv_file} перенесено ссылок в реестр: {new_links}")
 
     def _download_xls(self, url, save_path):
         """
         Скачивает XLS-файл по указанной ссылке и сохраняет его по указанному пути.
+        Неизменившийся файл (ответ 304) берётся из HTTP-кэша, пауза
+        перед запросом задаётся регулятором темпа.
+        Возвращает SHA-256 содержимого файла.
         """
-        try:
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-            with open(save_path, "wb") as file:
-                for chunk in response.iter_content():
-                    file.write(chunk)
-            logger.info(f"Файл сохранён: {save_path}")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка при скачивании файла {url}: {e}")
+        with self.rate.slot():
+            result = download_to_file(self.session, self.cache, url, save_path)
+        logger.info(f"Файл сохранён: {save_path}")
+        return result.sha256
@@ -0,0 +1,111 @@
+import os
+
+
+# Папка файлов архива: blobs/<первые два символа хеша>/<sha256>.xls
+BLOBS_DIR = "blobs"
+
+# Папка загрузок: файл переносится в архив, когда известен его хеш
+INCOMING_DIR = "incoming"
+
+
+class XlsArchive:
+    """
+    Архив XLS-файлов с адресацией по содержимому: каждый файл хранится
+    один раз под именем <sha256>.xls, сколько бы ссылок (дат торгов
+    и URL) на него ни указывало. Индекс дата торгов и URL -> файл -
+    реестр ссылок (registry.LinkRegistry, поля sha256 и file_path),
+    поэтому повторная ссылка на тот же бюллетень - только строка реестра.
+
+    Файлы скачиваются в incoming/ и после загрузки переносятся в архив
+    по хешу; если такой файл в архиве уже есть, загруженная копия
+    удаляется. Файлы, скачанные до архива, лежат в root/<год>/.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def blob_path(self, sha256):
+        """
+        Путь файла архива с содержимым sha256.
+        """
+        return os.path.join(self.root, BLOBS_DIR, sha256[:2], sha256 + ".xls")
+
+    def incoming_path(self, name):
+        """
+        Путь для загрузки файла до переноса в архив. Папка загрузок
+        создаётся при первом обращении, чтобы чтение архива (этап results,
+        бенчмарки) не создавало папок.
+        """
+        directory = os.path.join(self.root, INCOMING_DIR)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, name)
+
+    def _is_inside(self, path, *parts):
+        directory = os.path.abspath(os.path.join(self.root, *parts))
+        return os.path.abspath(path).startswith(directory + os.sep)
+
+    def owns(self, path):
+        """
+        Находится ли path в архиве или в папке загрузок.
+        """
+        return self._is_inside(path, BLOBS_DIR) or self._is_inside(path, INCOMING_DIR)
+
+    def store(self, path, sha256):
+        """
+        Переносит скачанный файл path с содержимым sha256 в архив.
+        Возвращает путь файла в архиве и True, если такой файл уже был
+        в архиве (тогда path удаляется).
+        """
+        blob_path = self.blob_path(sha256)
+        if os.path.exists(blob_path):
+            os.remove(path)
+            return blob_path, True
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.replace(path, blob_path)
+        return blob_path, False
+
+    def adopt(self, registry):
+        """
+        Переносит в архив файлы скачанных ссылок, сохранённые до архива
+        (root/<год>/<дата>_<id>.xls), и обновляет путь в реестре.
+        Одинаковые файлы схлопываются в один. Возвращает количество
+        перенесённых файлов.
+        """
+        adopted = 0
+        for link in registry.downloaded():
+            path = link["file_path"]
+            if (
+                not path
+                or not link["sha256"]
+                or self.owns(path)
+                or not self._is_inside(path)
+                or not os.path.exists(path)
+            ):
+                continue
+            blob_path, _ = self.store(path, link["sha256"])
+            registry.mark_downloaded(link["url"], blob_path, link["sha256"])
+            adopted += 1
+        return adopted
+
+    def sources(self, registry):
+        """
+        Возвращает файлы для обработки парами (путь, имена ссылок).
+        Файлы архива - по одному на уникальное содержимое, со списком
+        имён "dd.mm.yyyy_<id>" всех ссылок на него (registry.blobs). Файлы
+        вне архива, не известные реестру, - с None (дата берётся из имени
+        файла).
+        """
+        files = [
+            (file_path, names)
+            for file_path, names in registry.blobs()
+            if self._is_inside(file_path, BLOBS_DIR) and os.path.exists(file_path)
+        ]
+        for root, dirs, names in os.walk(self.root):
+            if os.path.abspath(root) == os.path.abspath(self.root):
+                dirs[:] = [name for name in dirs if name not in (BLOBS_DIR, INCOMING_DIR)]
+            files.extend(
+                (os.path.join(root, name), None)
+                for name in names
+                if name.endswith(".xls")
+            )
+        return files
@@ -1,48 +1,36 @@
 import aiohttp
 import asyncio
-from bs4 import BeautifulSoup
+import hashlib
+import shutil
 import time
-import pandas as pd
 import os
+from datetime import date
+from urllib.parse import urlsplit
 from logger_config import logger
-from config import BASE_URL, BASE_DOMAIN, MIN_YEAR
-
-
-async def _extract_xls_links_and_dates(soup):
-    """
-    Извлекает все ссылки на XLS-файлы и даты торгов с текущей страницы.
-    """
-    xls_links = []
-    dates = []
-
-    for item in soup.find_all("div", class_="accordeon-inner__item"):
-        link_element = item.find(
-            "a", class_="accordeon-inner__item-title link xls"
-            )
-        if link_element:
-            xls_links.append(link_element["href"])
-        else:
-            xls_links.append(None)
-        date_element = soup.select_one(
-            "html body main section div div:nth-of-type(2) div div div:nth-of-type(2) div:nth-of-type(1) div div:nth-of-type(1) div:nth-of-type(5) div div:nth-of-type(2) div p span"
-        )
-        if date_element:
-            date = date_element.text.strip()
-            dates.append(date)
-        else:
-            dates.append(None)
-
-    return xls_links, dates
-
-
-async def _get_next_page_url(soup):
-    """
-    Извлекает ссылку на следующую страницу из пагинации.
-    """
-    next_page_link = soup.find("li", class_="bx-pag-next")
-    if next_page_link and next_page_link.find("a"):
-        return next_page_link.find("a")["href"]
-    return None
+from config import (
+    BASE_URL,
+    BASE_DOMAIN,
+    MIN_YEAR,
+    PAGE_CONCURRENCY,
+    WATERMARK_FILE,
+    REGISTRY_PATH,
+    HTTP_CACHE_DIR,
+    HTTP_CACHE_MAX_BYTES,
+    BASE_SAVE_DIR,
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_CONCURRENCY_PER_HOST,
+    DOWNLOAD_MAX_BYTES_PER_SECOND,
+    RATE_START_DELAY,
+    RATE_MAX_DELAY,
+    RATE_MAX_CONCURRENCY,
+    RATE_METRICS_FILE,
+)
+from http_cache import STATUS_NOT_MODIFIED, HttpCache, get_text_async
+from rate_control import RateController
+from registry import LinkRegistry, file_name
+from archive import XlsArchive
+from listing import build_page_urls, filter_new, parse_page, stop_page
+from watermark import newest_date, resolve_watermark, update_watermark
 
 
 async def _validate_date(date):
@@ -63,32 +51,16 @@ async def _validate_date(date):
     return True
 
 
-async def _save_to_csv(dates, xls_links):
+async def _save_links(registry, dates, xls_links):
     """
-    Сохраняет данные в CSV-файл, добавляя новые данные в существующий файл.
+    Сохраняет ссылки в реестр, пропуская уже известные.
     """
-    data = {
-        "Дата торгов": dates,
-        "Ссылка на скачивание": [
-            BASE_DOMAIN + link if link else None for link in xls_links
-        ],
-    }
-    df = pd.DataFrame(data)
-
-    df = df[df["Дата торгов"].notna() & df["Ссылка на скачивание"].notna()]
-
-    file_path = "raw/trading_results.csv"
-    if os.path.exists(file_path):
-        df.to_csv(
-            file_path,
-            mode="a",
-            header=False,
-            index=False,
-            encoding="utf-8")
-    else:
-        df.to_csv(file_path, index=False, encoding="utf-8")
-
-    logger.info(f"Данные сохранены в файл: {file_path}")
+    new_links = registry.add_links(
+        dates, [BASE_DOMAIN + link if link else None for link in xls_links]
+    )
+    logger.info(
+        f"Новых ссылок: {new_links} из {len(xls_links)} ({REGISTRY_PATH})"
+    )
 
 
 async def _ensure_raw_folder_exists():
@@ -100,89 +72,344 @@ async def _ensure_raw_folder_exists():
         logger.info("Папка 'raw' создана.")
 
 
-async def _download_file(session, url, semaphore):
+class _BandwidthLimiter:
+    """
+    Общее ограничение скорости скачивания (token bucket): не больше
+    bytes_per_second байт в секунду на все загрузки вместе.
+    0 или None - без ограничения.
+    """
+
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        self.allowance = bytes_per_second or 0
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def consume(self, size):
+        if not self.rate:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            self.allowance = min(
+                self.rate, self.allowance + (now - self.updated_at) * self.rate
+            )
+            self.updated_at = now
+            self.allowance -= size
+            if self.allowance < 0:
+                await asyncio.sleep(-self.allowance / self.rate)
+
+
+def _write_chunk(file, digest, chunk):
+    digest.update(chunk)
+    file.write(chunk)
+
+
+async def _download_file(session, cache, url, save_path, limiter, chunk_size):
+    """
+    Скачивает файл потоково: тело читается блоками chunk_size и пишется
+    во временный файл в пуле потоков (не блокируя цикл событий), затем
+    файл атомарно переименовывается в save_path. Неизменившийся файл
+    (ответ 304) копируется из HTTP-кэша; если записи кэша уже нет, файл
+    запрашивается заново без условных заголовков. Возвращает SHA-256
+    содержимого.
+    """
+    tmp_path = save_path + ".part"
+    try:
+        for conditional in (True, False):
+            headers = cache.request_headers(url) if conditional else {}
+            async with session.get(url, headers=headers) as response:
+                if response.status == STATUS_NOT_MODIFIED and conditional:
+                    meta = cache.lookup(url)
+                    if meta is None:
+                        continue
+                    await asyncio.to_thread(
+                        shutil.copyfile, cache.body_path(url), tmp_path
+                    )
+                    await asyncio.to_thread(os.replace, tmp_path, save_path)
+                    cache.touch(url)
+                    return meta["sha256"]
+
+                response.raise_for_status()
+                digest = hashlib.sha256()
+                file = await asyncio.to_thread(open, tmp_path, "wb")
+                try:
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        await limiter.consume(len(chunk))
+                        await asyncio.to_thread(_write_chunk, file, digest, chunk)
+                finally:
+                    await asyncio.to_thread(file.close)
+                headers = response.headers
+            break
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    await asyncio.to_thread(os.replace, tmp_path, save_path)
+    await asyncio.to_thread(cache.store, url, headers, body_file=save_path)
+    return digest.hexdigest()
+
+
+async def _process_link(
+    session, cache, rate, registry, archive, link, semaphore, limiter, chunk_size
+):
     """
-    Скачивает один файл с ограничением количества одновременных запросов.
+    Скачивает файл по одной ссылке из реестра в архив XLS-файлов
+    и сохраняет статус скачивания. Пауза и число одновременных загрузок
+    задаются регулятором темпа rate, semaphore - верхний предел на хост.
     """
+    url = link["url"]
+    incoming_path = archive.incoming_path(file_name(link))
     async with semaphore:
         try:
-            async with session.get(url) as response:
-                response.raise_for_status()
-                logger.info(f"Скачан файл: {url}")
-        except aiohttp.ClientError as e:
+            async with rate.async_slot():
+                sha256 = await _download_file(
+                    session, cache, url, incoming_path, limiter, chunk_size
+                )
+            save_path, duplicate = await asyncio.to_thread(
+                archive.store, incoming_path, sha256
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
             logger.error(f"Ошибка при скачивании файла {url}: {e}")
+            registry.mark_failed(url, e)
+            return False
+    registry.mark_downloaded(url, save_path, sha256)
+    if duplicate:
+        logger.info(f"Файл {url} уже есть в архиве: {save_path}")
+    else:
+        logger.info(f"Скачан файл: {url} -> {save_path}")
+    return True
 
 
-async def _process_page(session, page_url, semaphore):
+async def _download_pending(
+    session,
+    cache,
+    rate,
+    registry,
+    per_host=DOWNLOAD_CONCURRENCY_PER_HOST,
+    max_bytes_per_second=DOWNLOAD_MAX_BYTES_PER_SECOND,
+    chunk_size=DOWNLOAD_CHUNK_SIZE,
+):
     """
-    Обрабатывает одну страницу, извлекает данные и сохраняет их.
+    Скачивает все ещё не скачанные ссылки из реестра: не больше per_host
+    одновременных загрузок на каждый хост и не больше
+    max_bytes_per_second байт в секунду суммарно.
     """
-    logger.info(f"Обрабатывается страница: {page_url}")
-    try:
-        async with session.get(page_url) as response:
-            response.raise_for_status()
-            html = await response.text()
-    except aiohttp.ClientError as e:
-        logger.error(f"Ошибка при загрузке страницы {page_url}: {e}")
-        return None
-
-    soup = BeautifulSoup(html, "html.parser")
-    xls_links, dates = await _extract_xls_links_and_dates(soup)
-
-    for date in dates:
-        if date and not await _validate_date(date):
+    links = registry.pending(min_date=date(MIN_YEAR, 1, 1))
+    logger.info(f"Ссылок для скачивания: {len(links)}")
+    if not links:
+        return
+
+    archive = XlsArchive(BASE_SAVE_DIR)
+    host_semaphores = {}
+    limiter = _BandwidthLimiter(max_bytes_per_second)
+    tasks = []
+    for link in links:
+        host = urlsplit(link["url"]).netloc
+        if host not in host_semaphores:
+            host_semaphores[host] = asyncio.Semaphore(per_host)
+        tasks.append(
+            _process_link(
+                session,
+                cache,
+                rate,
+                registry,
+                archive,
+                link,
+                host_semaphores[host],
+                limiter,
+                chunk_size,
+            )
+        )
+
+    start_time = time.time()
+    results = await asyncio.gather(*tasks)
+    elapsed_time = time.time() - start_time
+    logger.info(
+        f"Скачано файлов: {sum(results)} из {len(links)} за {elapsed_time:.2f} секунд."
+    )
+
+
+async def _fetch_page(session, cache, rate, page_url, semaphore):
+    """
+    Загружает (условным запросом через HTTP-кэш) и разбирает страницу
+    один раз, возвращает PageResult. Пауза и количество одновременных
+    загрузок задаются регулятором темпа rate, semaphore - верхний предел.
+    """
+    async with semaphore:
+        logger.info(f"Загружается страница: {page_url}")
+        try:
+            async with rate.async_slot():
+                html = await get_text_async(session, cache, page_url)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Ошибка при загрузке страницы {page_url}: {e}")
             return None
 
-    await _save_to_csv(dates, xls_links)
+    return parse_page(page_url, html)
 
-    download_tasks = [
-        _download_file(session, BASE_DOMAIN + link, semaphore)
-        for link in xls_links
-        if link
-    ]
-    await asyncio.gather(*download_tasks)
+
+async def _iter_pages(
+    session,
+    cache,
+    rate,
+    first_page,
+    max_pages,
+    concurrency,
+    semaphore,
+    incremental=False,
+):
+    """
+    Отдаёт по порядку страницы 2..N. Если количество страниц известно
+    из блока пагинации, страницы загружаются одновременно окнами
+    по concurrency штук: следующее окно загружается, только если обход
+    не остановлен. При incremental (задан watermark) окна начинаются
+    с одной страницы и удваиваются, чтобы не загружать лишние страницы,
+    когда watermark рядом. Иначе страницы обходятся по ссылке "Вперед".
+    При ошибке загрузки отдаётся None.
+    """
+    page_urls = build_page_urls(first_page, BASE_DOMAIN, max_pages)
+    if page_urls is None:
+        logger.info("Количество страниц не найдено, обход по ссылке \"Вперед\".")
+        page = first_page
+        page_counter = 1
+        while page.next_page_url and page_counter < max_pages:
+            page = await _fetch_page(
+                session, cache, rate, BASE_DOMAIN + page.next_page_url, semaphore
+            )
+            yield page
+            if page is None:
+                return
+            page_counter += 1
+        return
+
+    logger.info(f"Сформировано {len(page_urls) + 1} ссылок на страницы.")
+    window_size = 1 if incremental else concurrency
+    start = 0
+    while start < len(page_urls):
+        window = page_urls[start:start + window_size]
+        pages = await asyncio.gather(
+            *[_fetch_page(session, cache, rate, url, semaphore) for url in window]
+        )
+        for page in pages:
+            yield page
+        start += len(window)
+        window_size = min(window_size * 2, concurrency)
 
 
-async def main(max_pages=10):
+async def _process_page(page, watermark, registry):
+    """
+    Проверяет даты уже разобранной страницы и сохраняет в реестр ссылки
+    не старше watermark. Возвращает PageResult только с новыми
+    ссылками; next_page_url у него пустой, если обход нужно остановить
+    (дата раньше MIN_YEAR, достигнут watermark или последняя страница).
+    """
+    logger.info(f"Обрабатывается страница: {page.url}")
+
+    for trade_date in page.dates:
+        if trade_date and not await _validate_date(trade_date):
+            return stop_page(page)
+
+    page = filter_new(page, watermark)
+    if page.reached_watermark:
+        logger.info(f"Достигнута уже собранная дата торгов {watermark:%d.%m.%Y}.")
+    if not page.dates:
+        return page
+
+    await _save_links(registry, page.dates, page.xls_links)
+    return page
+
+
+async def main(
+    max_pages=10,
+    concurrency=PAGE_CONCURRENCY,
+    since=None,
+    full=False,
+    per_host=DOWNLOAD_CONCURRENCY_PER_HOST,
+    max_bytes_per_second=DOWNLOAD_MAX_BYTES_PER_SECOND,
+):
     await _ensure_raw_folder_exists()
 
     start_time = time.time()
     logger.info("Начало парсинга...")
 
-    page_urls = [BASE_URL]
-    print(page_urls)
-    async with aiohttp.ClientSession(
-        connector=aiohttp.TCPConnector(ssl=False)
-    ) as session:
-        while len(page_urls) < max_pages:
-            current_url = page_urls[-1]
-            logger.info(f"Загружается страница: {current_url}")
-            try:
-                async with session.get(current_url) as response:
-                    response.raise_for_status()
-                    html = await response.text()
-                    soup = BeautifulSoup(html, "html.parser")
-                    next_page_url = await _get_next_page_url(soup)
-                    if next_page_url:
-                        page_urls.append(BASE_DOMAIN + next_page_url)
-                    else:
+    watermark = resolve_watermark(WATERMARK_FILE, since, full)
+    page_semaphore = asyncio.Semaphore(concurrency)
+    last_date = None
+    completed = True
+    cache = HttpCache(HTTP_CACHE_DIR, HTTP_CACHE_MAX_BYTES)
+    # Один регулятор на сайт: страницы и файлы загружаются с одного хоста.
+    # Нижней границы паузы нет - загрузки файлов ограничены числом
+    # одновременных запросов
+    rate = RateController(
+        "asyn_parser",
+        start_delay=RATE_START_DELAY,
+        min_delay=0,
+        max_delay=RATE_MAX_DELAY,
+        max_concurrency=RATE_MAX_CONCURRENCY,
+    )
+
+    with LinkRegistry(REGISTRY_PATH) as registry:
+        async with aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(ssl=False),
+            trace_configs=[rate.trace_config()],
+        ) as session:
+            first_page = await _fetch_page(
+                session, cache, rate, BASE_URL, page_semaphore
+            )
+            if first_page is None:
+                return
+
+            # Страницы обрабатываются по порядку, чтобы обход останавливался
+            # на первой старой дате или на watermark
+            page = await _process_page(first_page, watermark, registry)
+            last_date = newest_date(page.dates, last_date)
+
+            if page.next_page_url:
+                async for next_page in _iter_pages(
+                    session,
+                    cache,
+                    rate,
+                    first_page,
+                    max_pages,
+                    concurrency,
+                    page_semaphore,
+                    incremental=watermark is not None,
+                ):
+                    if next_page is None:
+                        completed = False
                         break
-            except aiohttp.ClientError as e:
-                logger.error(
-                    f"Ошибка при загрузке страницы {current_url}: {e}"
+                    page = await _process_page(next_page, watermark, registry)
+                    last_date = newest_date(page.dates, last_date)
+                    if not page.next_page_url:
+                        break
+                if completed and page.next_page_url:
+                    # Обход остановлен лимитом max_pages: более старые
+                    # страницы не собраны, watermark не сдвигается
+                    logger.info(
+                        f"Достигнут лимит страниц {max_pages}, "
+                        "watermark не обновляется."
                     )
-                break
-
-    logger.info(f"Сформировано {len(page_urls)} ссылок на страницы.")
-
-    download_semaphore = asyncio.Semaphore(1)
+                    completed = False
+
+            await _download_pending(
+                session,
+                cache,
+                rate,
+                registry,
+                per_host=per_host,
+                max_bytes_per_second=max_bytes_per_second,
+            )
 
-    async with aiohttp.ClientSession(
-        connector=aiohttp.TCPConnector(ssl=False)
-    ) as session:
-        tasks = [_process_page(
-            session, url, download_semaphore) for url in page_urls]
-        await asyncio.gather(*tasks)
+    metrics = rate.export(RATE_METRICS_FILE)
+    logger.info(
+        f"Темп запросов: {metrics['throughput']} запр./с, "
+        f"пауза {metrics['delay']} с, одновременно {metrics['concurrency']}, "
+        f"снижений темпа: {sum(metrics['backoffs'].values())} ({RATE_METRICS_FILE})"
+    )
+
+    if completed and last_date is not None:
+        if update_watermark(WATERMARK_FILE, last_date):
+            logger.info(f"Watermark обновлён: {last_date:%d.%m.%Y}")
 
     end_time = time.time()
     elapsed_time = end_time - start_time
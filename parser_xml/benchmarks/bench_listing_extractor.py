@@ -0,0 +1,105 @@
+"""
+Бенчмарк извлечения ссылок и дат со страниц со списком бюллетеней.
+
+Сравнивает прежнюю реализацию (BeautifulSoup + html.parser и абсолютный
+select_one по всему документу на каждый элемент) с extractor.py (lxml,
+XPath скомпилированы один раз, дата ищется внутри элемента).
+
+Запуск из папки parser_xml:
+    python benchmarks/bench_listing_extractor.py
+    python benchmarks/bench_listing_extractor.py --pages saved_pages/*.html
+"""
+import argparse
+import os
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from extractor import (  # noqa: E402
+    extract_xls_links_and_dates,
+    get_next_page_url,
+    parse_html,
+)
+from listing_fixtures import build_listing_page  # noqa: E402
+
+
+def _legacy_extract(text):
+    """
+    Прежняя реализация из parse.py (эталон для сравнения).
+    """
+    soup = BeautifulSoup(text, "html.parser")
+    xls_links = []
+    dates = []
+
+    for item in soup.find_all("div", class_="accordeon-inner__item"):
+        link_element = item.find("a", class_="accordeon-inner__item-title link xls")
+        if link_element:
+            xls_links.append(link_element["href"])
+        else:
+            xls_links.append(None)
+        date_element = soup.select_one(
+            "html body main section div div:nth-of-type(2) div div div:nth-of-type(2) div:nth-of-type(1) div div:nth-of-type(1) div:nth-of-type(5) div div:nth-of-type(2) div p span"
+        )
+        if date_element:
+            dates.append(date_element.text.strip())
+        else:
+            dates.append(None)
+
+    next_page_link = soup.find("li", class_="bx-pag-next")
+    next_page_url = None
+    if next_page_link and next_page_link.find("a"):
+        next_page_url = next_page_link.find("a")["href"]
+    return xls_links, dates, next_page_url
+
+
+def _lxml_extract(text):
+    tree = parse_html(text)
+    xls_links, dates = extract_xls_links_and_dates(tree)
+    return xls_links, dates, get_next_page_url(tree)
+
+
+def _time(extract, pages, repeat):
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        results = [extract(text) for text in pages]
+    return (time.perf_counter() - start_time) / (repeat * len(pages)), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", nargs="*", help="Сохранённые HTML-страницы.")
+    parser.add_argument("--per-page", type=int, default=10, help="Бюллетеней на синтетической странице.")
+    parser.add_argument("--repeat", type=int, default=5, help="Повторов замера.")
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = []
+        for path in args.pages:
+            with open(path, "r", encoding="utf-8") as file:
+                pages.append(file.read())
+    else:
+        pages = [build_listing_page(page, 20, args.per_page) for page in range(1, 21)]
+
+    legacy_time, legacy_results = _time(_legacy_extract, pages, args.repeat)
+    lxml_time, lxml_results = _time(_lxml_extract, pages, args.repeat)
+
+    links_match = all(
+        old[0] == new[0] and old[2] == new[2]
+        for old, new in zip(legacy_results, lxml_results)
+    )
+    dated = sum(1 for result in lxml_results for date in result[1] if date)
+
+    print(f"Страниц: {len(pages)}, размер: {sum(map(len, pages)) // len(pages)} символов")
+    print(f"BeautifulSoup: {legacy_time * 1000:8.2f} мс на страницу")
+    print(f"lxml:          {lxml_time * 1000:8.2f} мс на страницу")
+    print(f"Ускорение:     x{legacy_time / lxml_time:.1f}")
+    print(f"Ссылки и пагинация совпадают: {links_match}, дат найдено: {dated}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Бенчмарк памяти объединённой истории результатов.
+
+Сравнивает объём DataFrame в прежнем виде (все столбцы object, дата -
+строка) с компактной схемой schema.RESULT_DTYPES. Многолетняя история
+имитируется повторением набора файлов --repeat раз.
+
+Запуск из папки parser_xml:
+    python benchmarks/bench_memory.py --dir downloaded_xls_files --repeat 10
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import XML_SAVE_DIR  # noqa: E402
+from schema import OUTPUT_COLUMNS, concat_compact  # noqa: E402
+from to_results_csv import _collect_xls_files, _parse_and_process_file  # noqa: E402
+
+
+def _to_object_frame(df):
+    """
+    Представление результата в прежнем виде: все столбцы object.
+    """
+    legacy = df[OUTPUT_COLUMNS].astype(object)
+    legacy["date"] = df["source"].astype(str)
+    return legacy
+
+
+def _megabytes(df):
+    return df.memory_usage(deep=True).sum() / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dir", default=XML_SAVE_DIR, help="Папка с XLS-файлами.")
+    parser.add_argument("--limit", type=int, default=500, help="Максимум файлов.")
+    parser.add_argument(
+        "--repeat", type=int, default=10, help="Сколько раз повторить набор файлов."
+    )
+    args = parser.parse_args()
+
+    frames = [
+        df
+        for df in map(_parse_and_process_file, _collect_xls_files(args.dir)[: args.limit])
+        if df is not None
+    ]
+    if not frames:
+        print(f"В папке {args.dir} нет XLS-файлов с данными.")
+        return
+    frames = frames * args.repeat
+
+    start_time = time.perf_counter()
+    legacy_df = pd.concat(
+        [_to_object_frame(df) for df in frames], ignore_index=True
+    )
+    legacy_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    compact_df = concat_compact(frames)
+    compact_time = time.perf_counter() - start_time
+
+    legacy_size = _megabytes(legacy_df)
+    compact_size = _megabytes(compact_df)
+    print(f"Фрагментов: {len(frames)}, строк: {len(compact_df)}")
+    print(f"object:     {legacy_size:8.1f} МБ, объединение {legacy_time:.2f} с")
+    print(f"компактная: {compact_size:8.1f} МБ, объединение {compact_time:.2f} с")
+    print(f"Экономия памяти: x{legacy_size / compact_size:.1f}")
+    print()
+    print(compact_df.dtypes.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Набор бенчмарков этапа обработки XLS-файлов на синтетических бюллетенях.
+
+Для каждого размера набора (по умолчанию 10, 1000 и 10000 файлов)
+замеряет _parse_xls_file, _process_data и _parse_all_xls_files и выводит
+файлы/с, строки/с и пиковое потребление памяти (RSS). Каждый замер
+выполняется в отдельном процессе, чтобы пиковый RSS не накапливался.
+Наборы файлов создаются generate_bulletins.py и переиспользуются.
+
+Замеры импортируют копию модулей parser_xml из <workdir>/parser_xml
+и выполняются в её папке: манифест, кэш, реестр, лог и любые новые
+пути этапа оказываются внутри workdir, а не в рабочих данных.
+
+Запуск из папки parser_xml:
+    python benchmarks/bench_parse_stage.py --workdir /tmp/spimex_bench
+    python benchmarks/bench_parse_stage.py --sizes 10 1000 --reader xlrd --json report.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PARSER_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from generate_bulletins import generate  # noqa: E402
+
+STAGES = ["_parse_xls_file", "_process_data", "_parse_all_xls_files"]
+
+
+def _dataset_dir(workdir, size, rows):
+    """
+    Возвращает папку набора из size файлов, создавая её при необходимости.
+    """
+    data_dir = os.path.join(workdir, f"bulletins_{size}x{rows}")
+    marker = os.path.join(data_dir, ".complete")
+    if not os.path.exists(marker):
+        print(f"Генерация набора: {size} файлов по {rows} строк...")
+        generate(data_dir, size, rows)
+        open(marker, "w").close()
+    return data_dir
+
+
+def _sandbox(workdir):
+    """
+    Копирует модули parser_xml в <workdir>/parser_xml и возвращает эту папку.
+    """
+    sandbox = os.path.join(workdir, "parser_xml")
+    os.makedirs(sandbox, exist_ok=True)
+    for name in os.listdir(PARSER_DIR):
+        if name.endswith(".py"):
+            shutil.copy2(os.path.join(PARSER_DIR, name), sandbox)
+    return sandbox
+
+
+def _peak_rss_mb():
+    """
+    Пиковый RSS текущего процесса в мегабайтах (ru_maxrss в Linux - КБ).
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak /= 1024
+    return peak / 1024
+
+
+def _measure(stage, data_dir, sandbox, reader, workers):
+    """
+    Выполняет один замер в дочернем процессе с копией модулей
+    из sandbox (см. _sandbox).
+    """
+    import logging
+
+    # Пути этапа задаются относительно модуля и текущей папки:
+    # оба указывают в sandbox
+    os.chdir(sandbox)
+    sys.path.insert(0, sandbox)
+    import to_results_csv
+
+    logging.disable(logging.INFO)
+
+    file_paths = to_results_csv._collect_xls_files(data_dir)
+
+    if stage == "_parse_xls_file":
+        start_time = time.perf_counter()
+        frames = [to_results_csv._parse_xls_file(path, reader) for path in file_paths]
+        elapsed_time = time.perf_counter() - start_time
+        rows = sum(len(df) for df in frames if df is not None)
+    elif stage == "_process_data":
+        frames = [
+            (to_results_csv._parse_xls_file(path, reader), path) for path in file_paths
+        ]
+        start_time = time.perf_counter()
+        results = [
+            to_results_csv._process_data(df, path)
+            for df, path in frames
+            if df is not None
+        ]
+        elapsed_time = time.perf_counter() - start_time
+        rows = sum(len(df) for df in results)
+    else:
+        start_time = time.perf_counter()
+        result_df = to_results_csv._parse_all_xls_files(
+            data_dir, workers, full=True, reader=reader
+        )
+        elapsed_time = time.perf_counter() - start_time
+        rows = 0 if result_df is None else len(result_df)
+
+    return {
+        "stage": stage,
+        "files": len(file_paths),
+        "rows": rows,
+        "seconds": round(elapsed_time, 4),
+        "files_per_sec": round(len(file_paths) / elapsed_time, 1),
+        "rows_per_sec": round(rows / elapsed_time, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--workdir", default="/tmp/spimex_bench", help="Папка для наборов файлов."
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 1000, 10000],
+        help="Размеры наборов (количество файлов).",
+    )
+    parser.add_argument("--rows", type=int, default=120, help="Строк в каждой секции.")
+    parser.add_argument("--reader", choices=["pyexcel", "xlrd"], default="pyexcel")
+    parser.add_argument("--workers", type=int, default=1, help="Процессов для _parse_all_xls_files.")
+    parser.add_argument(
+        "--stages", nargs="+", choices=STAGES, default=STAGES, help="Замеряемые функции."
+    )
+    parser.add_argument("--json", help="Сохранить отчёт в JSON-файл.")
+    args = parser.parse_args()
+
+    workdir = os.path.abspath(args.workdir)
+    os.makedirs(workdir, exist_ok=True)
+    sandbox = _sandbox(workdir)
+    context = multiprocessing.get_context("spawn")
+
+    report = []
+    print(f"{'функция':<24}{'файлов':>8}{'строк':>10}{'время, с':>10}"
+          f"{'файлов/с':>11}{'строк/с':>12}{'RSS, МБ':>9}")
+    for size in args.sizes:
+        data_dir = _dataset_dir(workdir, size, args.rows)
+        for stage in args.stages:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(
+                    _measure, stage, data_dir, sandbox, args.reader, args.workers
+                ).result()
+            result["reader"] = args.reader
+            report.append(result)
+            print(f"{stage:<24}{result['files']:>8}{result['rows']:>10}"
+                  f"{result['seconds']:>10.2f}{result['files_per_sec']:>11.1f}"
+                  f"{result['rows_per_sec']:>12.1f}{result['peak_rss_mb']:>9.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"Отчёт сохранён в {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Бенчмарк преобразования строк в to_results_csv._process_data.
+
+Сравнивает прежнюю построчную реализацию (iterrows + loc) с колоночной
+и проверяет, что итоговый CSV совпадает побайтно.
+
+Запуск из папки parser_xml:
+    python benchmarks/bench_process_data.py --dir downloaded_xls_files
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import XML_SAVE_DIR  # noqa: E402
+from schema import concat_compact, to_csv_frame  # noqa: E402
+from to_results_csv import _parse_xls_file, _process_data  # noqa: E402
+
+
+def _legacy_process_data(df, file_path):
+    """
+    Прежняя построчная реализация _process_data (эталон для сравнения).
+    """
+    date = os.path.splitext(os.path.basename(file_path))[0]
+
+    df.columns = df.columns.str.replace(r"\s+", " ", regex=True).str.strip()
+
+    result_df = pd.DataFrame(
+        columns=[
+            "id",
+            "exchange_product_id",
+            "exchange_product_name",
+            "oil_id",
+            "delivery_basis_id",
+            "delivery_basis_name",
+            "delivery_type_id",
+            "volume",
+            "total",
+            "count",
+            "date",
+        ]
+    )
+
+    for index, row in df.iterrows():
+        try:
+            exchange_product_id = row["Код Инструмента"]
+            result_df.loc[index] = [
+                index + 1,
+                exchange_product_id,
+                row["Наименование Инструмента"],
+                exchange_product_id[:4],
+                exchange_product_id[4:7],
+                row["Базис поставки"],
+                exchange_product_id[-1],
+                row["Объем Договоров в единицах измерения"],
+                row["Обьем Договоров, руб."],
+                row["Количество Договоров, шт."],
+                date,
+            ]
+        except KeyError:
+            continue
+
+    return result_df
+
+
+def _load_frames(base_dir, limit):
+    """
+    Читает XLS-файлы один раз, чтобы замерять только преобразование строк.
+    """
+    frames = []
+    for root, dirs, files in os.walk(base_dir):
+        for file in files:
+            if file.endswith(".xls"):
+                file_path = os.path.join(root, file)
+                df = _parse_xls_file(file_path)
+                if df is not None and not df.empty:
+                    frames.append((df, file_path))
+                if len(frames) >= limit:
+                    return frames
+    return frames
+
+
+def _legacy_to_csv(results):
+    """
+    CSV прежней реализации.
+    """
+    return pd.concat(results, ignore_index=True).to_csv(index=False)
+
+
+def _compact_to_csv(results):
+    """
+    CSV текущей реализации.
+    """
+    return to_csv_frame(concat_compact(results)).to_csv(index=False)
+
+
+def _run(process, to_csv, frames):
+    """
+    Прогоняет функцию преобразования по всем файлам и возвращает время и CSV.
+    """
+    start_time = time.perf_counter()
+    results = [process(df.copy(), file_path) for df, file_path in frames]
+    elapsed_time = time.perf_counter() - start_time
+    return elapsed_time, to_csv(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dir", default=XML_SAVE_DIR, help="Папка с XLS-файлами.")
+    parser.add_argument("--limit", type=int, default=500, help="Максимум файлов.")
+    args = parser.parse_args()
+
+    frames = _load_frames(args.dir, args.limit)
+    if not frames:
+        print(f"В папке {args.dir} нет XLS-файлов с данными.")
+        return
+
+    rows = sum(len(df) for df, _ in frames)
+    legacy_time, legacy_csv = _run(_legacy_process_data, _legacy_to_csv, frames)
+    vector_time, vector_csv = _run(_process_data, _compact_to_csv, frames)
+
+    print(f"Файлов: {len(frames)}, строк: {rows}")
+    print(f"iterrows + loc: {legacy_time:.3f} с")
+    print(f"колоночная:     {vector_time:.3f} с")
+    print(f"Ускорение:      x{legacy_time / vector_time:.1f}")
+    print(f"CSV совпадает побайтно: {legacy_csv == vector_csv}")
+
+
+if __name__ == "__main__":
+    main()
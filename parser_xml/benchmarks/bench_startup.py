@@ -0,0 +1,132 @@
+"""
+Бенчмарк времени запуска run_parser.py и импорта модулей этапов.
+
+Для каждой цели (cli - только run_parser, parse, download, results,
+pipeline - run_parser и модуль этапа, help - python run_parser.py --help)
+запускает отдельный интерпретатор с python -X importtime и выводит медиану
+времени импорта, полного времени процесса, самые тяжёлые пакеты
+по собственному времени импорта и загруженные тяжёлые библиотеки.
+
+Запуск из папки parser_xml:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --targets cli download --repeat 10 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PARSER_DIR = os.path.dirname(BENCH_DIR)
+
+# Цель -> импортируемые модули (help - запуск CLI целиком)
+TARGETS = {
+    "cli": ["run_parser"],
+    "help": ["run_parser"],
+    "parse": ["run_parser", "parse"],
+    "download": ["run_parser", "download_xls"],
+    "results": ["run_parser", "to_results_csv"],
+    "pipeline": ["run_parser", "pipeline"],
+}
+
+# Библиотеки, которые должны загружаться только нужными этапами
+HEAVY = ["pandas", "numpy", "requests", "pyexcel", "xlrd", "lxml", "bs4", "aiohttp", "pyarrow"]
+
+
+def _command(target):
+    """
+    Команда запуска цели в отдельном интерпретаторе.
+    """
+    if target == "help":
+        return [sys.executable, "-X", "importtime", "run_parser.py", "--help"]
+    code = "; ".join(f"import {module}" for module in TARGETS[target])
+    return [sys.executable, "-X", "importtime", "-c", code]
+
+
+def _parse_importtime(stderr):
+    """
+    Разбирает вывод -X importtime: возвращает список
+    (имя, собственное время, суммарное время, уровень вложенности), мкс.
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        self_us = int(self_us)
+        # Имя с отступом после пробела-разделителя: два пробела на уровень
+        name = name[1:]
+        level = (len(name) - len(name.lstrip())) // 2
+        entries.append((name.strip(), self_us, int(cumulative_us), level))
+    return entries
+
+
+def _measure(target):
+    """
+    Один запуск цели в отдельном процессе.
+    """
+    start_time = time.perf_counter()
+    completed = subprocess.run(
+        _command(target), cwd=PARSER_DIR, capture_output=True, text=True, check=True
+    )
+    wall_ms = (time.perf_counter() - start_time) * 1000
+
+    entries = _parse_importtime(completed.stderr)
+    # Импорты запуска интерпретатора заканчиваются модулем site
+    names = [name for name, _, _, _ in entries]
+    start = names.index("site") + 1 if "site" in names else 0
+    import_ms = sum(
+        cumulative for _, _, cumulative, level in entries[start:] if level == 0
+    ) / 1000
+
+    packages = defaultdict(int)
+    for name, self_us, _, _ in entries[start:]:
+        packages[name.split(".")[0]] += self_us
+    loaded = {name.split(".")[0] for name, _, _, _ in entries}
+    return wall_ms, import_ms, packages, [lib for lib in HEAVY if lib in loaded]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--targets", nargs="+", choices=list(TARGETS), default=list(TARGETS),
+        help="Замеряемые цели.",
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="Запусков каждой цели (медиана).")
+    parser.add_argument("--top", type=int, default=3, help="Сколько тяжёлых пакетов выводить.")
+    parser.add_argument("--json", help="Сохранить отчёт в JSON-файл.")
+    args = parser.parse_args()
+
+    report = []
+    print(f"{'цель':<10}{'импорт, мс':>12}{'процесс, мс':>13}  тяжёлые пакеты / библиотеки")
+    for target in args.targets:
+        runs = [_measure(target) for _ in range(args.repeat)]
+        wall_ms = statistics.median(run[0] for run in runs)
+        import_ms = statistics.median(run[1] for run in runs)
+        packages, heavy = runs[-1][2], runs[-1][3]
+        top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[: args.top]
+
+        result = {
+            "target": target,
+            "import_ms": round(import_ms, 1),
+            "wall_ms": round(wall_ms, 1),
+            "top_packages_ms": {name: round(us / 1000, 1) for name, us in top},
+            "heavy_loaded": heavy,
+        }
+        report.append(result)
+        top_text = ", ".join(f"{name} {ms}" for name, ms in result["top_packages_ms"].items())
+        print(f"{target:<10}{import_ms:>12.1f}{wall_ms:>13.1f}  "
+              f"{top_text} / {', '.join(heavy) or '-'}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"Отчёт сохранён в {args.json}")
+
+
+if __name__ == "__main__":
+    main()
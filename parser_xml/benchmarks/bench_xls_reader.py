@@ -0,0 +1,118 @@
+"""
+Бенчмарк способов чтения XLS-файлов в to_results_csv._parse_xls_file.
+
+Сравнивает чтение всего листа через pyexcel с чтением через xlrd,
+который преобразует только таблицу "Единица измерения: Метрическая тонна".
+xlrd отбрасывает секции в кубических метрах, поэтому скорость чтения
+сравнивается на одинаковом наборе строк: вывод pyexcel обрезается
+до той же таблицы. Ускорение полного разбора выводится вместе с числом
+строк в итоге - это разная работа.
+
+Запуск из папки parser_xml:
+    python benchmarks/bench_xls_reader.py --dir downloaded_xls_files
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import XML_SAVE_DIR  # noqa: E402
+from to_results_csv import (  # noqa: E402
+    _collect_xls_files,
+    _parse_xls_file,
+    _read_xls_rows,
+)
+from xls_reader import METRIC_TON_MARKER, _is_unit_marker  # noqa: E402
+
+READERS = ["pyexcel", "xlrd"]
+
+
+def _read_metric_ton_pyexcel(file_path):
+    """
+    Читает весь лист через pyexcel и оставляет ту же таблицу, что и xlrd:
+    от маркера метрических тонн до следующего маркера единицы измерения.
+    """
+    rows = _read_xls_rows(file_path, "pyexcel")
+    for start, row in enumerate(rows):
+        if METRIC_TON_MARKER in row:
+            break
+    else:
+        return []
+    table = [rows[start]]
+    for row in rows[start + 1 :]:
+        if _is_unit_marker(row):
+            break
+        table.append(row)
+    return table
+
+
+def _time_read(read, file_paths):
+    """
+    Замеряет чтение строк функцией read. Возвращает время и число строк.
+    """
+    start_time = time.perf_counter()
+    rows_read = sum(len(read(file_path)) for file_path in file_paths)
+    return time.perf_counter() - start_time, rows_read
+
+
+def _time_parse(reader, file_paths):
+    """
+    Замеряет полный разбор файлов указанным способом.
+    Возвращает время и число строк в итоге.
+    """
+    start_time = time.perf_counter()
+    frames = [_parse_xls_file(file_path, reader) for file_path in file_paths]
+    parse_time = time.perf_counter() - start_time
+    return parse_time, sum(len(df) for df in frames if df is not None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dir", default=XML_SAVE_DIR, help="Папка с XLS-файлами.")
+    parser.add_argument("--limit", type=int, default=500, help="Максимум файлов.")
+    args = parser.parse_args()
+
+    file_paths = _collect_xls_files(args.dir)[: args.limit]
+    if not file_paths:
+        print(f"В папке {args.dir} нет XLS-файлов.")
+        return
+
+    readers = {
+        "pyexcel": lambda file_path: _read_xls_rows(file_path, "pyexcel"),
+        "pyexcel, т": _read_metric_ton_pyexcel,
+        "xlrd": lambda file_path: _read_xls_rows(file_path, "xlrd"),
+    }
+
+    print(f"Файлов: {len(file_paths)}")
+    print(f"{'способ':<12}{'чтение, с':>12}{'строк прочитано':>18}")
+    reads = {}
+    for name, read in readers.items():
+        reads[name] = _time_read(read, file_paths)
+        read_time, rows_read = reads[name]
+        print(f"{name:<12}{read_time:>12.3f}{rows_read:>18}")
+
+    same_rows = reads["pyexcel, т"][1] == reads["xlrd"][1]
+    print(
+        f"Ускорение чтения таблицы в тоннах (pyexcel, т -> xlrd): "
+        f"x{reads['pyexcel, т'][0] / reads['xlrd'][0]:.1f}"
+        + ("" if same_rows else " - наборы строк различаются, сравнение неточно")
+    )
+
+    print(f"{'способ':<12}{'разбор, с':>12}{'строк в итоге':>18}")
+    parses = {}
+    for reader in READERS:
+        parses[reader] = _time_parse(reader, file_paths)
+        parse_time, rows_kept = parses[reader]
+        print(f"{reader:<12}{parse_time:>12.3f}{rows_kept:>18}")
+
+    print(
+        f"Ускорение полного разбора: x{parses['pyexcel'][0] / parses['xlrd'][0]:.1f} "
+        f"(строк в итоге: pyexcel {parses['pyexcel'][1]}, xlrd {parses['xlrd'][1]}; "
+        f"xlrd не читает секции в кубических метрах)"
+    )
+
+
+if __name__ == "__main__":
+    main()
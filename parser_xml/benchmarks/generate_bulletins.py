@@ -0,0 +1,174 @@
+"""
+Генератор синтетических бюллетеней SPIMEX в формате XLS.
+
+Файлы повторяют структуру настоящих бюллетеней: шапка бюллетеня,
+таблица "Единица измерения: Метрическая тонна" с точными названиями
+столбцов, строка "Итого:" и следующая секция в кубических метрах.
+Файлы раскладываются по папкам годов и называются как при скачивании:
+<год>/dd.mm.yyyy_N.xls.
+
+Запуск из папки parser_xml:
+    python benchmarks/generate_bulletins.py --out /tmp/bulletins --files 1000 --rows 120
+"""
+import argparse
+import datetime
+import os
+import random
+
+import xlwt
+
+
+HEADERS = [
+    "",
+    "Код\nИнструмента",
+    "Наименование\nИнструмента",
+    "Базис\nпоставки",
+    "Объем\nДоговоров\nв единицах\nизмерения",
+    "Обьем\nДоговоров,\nруб.",
+    "Изменение рыночной\nцены к цене\nпредыдущего\nдня",
+    "",
+    "Цена (за единицу измерения), руб.",
+    "",
+    "",
+    "",
+    "Цена в Заявках (за единицу\nизмерения)",
+    "",
+    "Количество\nДоговоров,\nшт.",
+]
+
+SUBHEADERS = [
+    "", "", "", "", "", "", "Руб.", "%", "Минимальная", "Средневзвешенная",
+    "Максимальная", "Рыночная", "Лучшее\nпредложение", "Лучший\nспрос", "",
+]
+
+UNITS = ["Метрическая тонна", "Кубический метр"]
+
+PRODUCTS = {
+    "A100": "Бензин (АИ-100-К5)",
+    "A092": "Бензин (АИ-92-К5)",
+    "A095": "Бензин (АИ-95-К5)",
+    "DSC5": "ДТ ЕВРО сорт C (ДТ-Л-К5)",
+    "DTZ5": "ДТ ЕВРО класс 2 (ДТ-З-К5)",
+    "TS1M": "Топливо для реактивных двигателей (ТС-1)",
+    "MZUT": "Мазут топочный М-100",
+}
+
+BASES = {
+    "ANK": "Ангарск-группа станций",
+    "NVY": "ст. Новоярославская",
+    "UFM": "Уфа-группа станций",
+    "KRS": "ст. Комбинатская",
+    "NPK": "ст. Нижнекамск",
+}
+
+DELIVERY_TYPES = ["060F", "065F", "005A", "025A", "100W"]
+
+
+def _instrument_rows(rnd, rows):
+    """
+    Генерирует строки таблицы инструментов: примерно треть строк
+    без сделок ("-" в количестве договоров).
+    """
+    for _ in range(rows):
+        oil_id = rnd.choice(list(PRODUCTS))
+        basis_id = rnd.choice(list(BASES))
+        code = oil_id + basis_id + rnd.choice(DELIVERY_TYPES)
+        count = rnd.choice([0, 0, 1, 1, 2, 3, 5, 8])
+        price = rnd.randint(40_000, 90_000)
+        volume = rnd.choice([60, 120, 180, 240, 500]) * count
+        yield [
+            "",
+            code,
+            f"{PRODUCTS[oil_id]}, {BASES[basis_id]} (ст. отправления)",
+            BASES[basis_id],
+            str(volume) if count else "-",
+            str(volume * price) if count else "-",
+            str(rnd.randint(-500, 500)) if count else "-",
+            f"{rnd.uniform(-2, 2):.2f}" if count else "-",
+            str(price - 100) if count else "-",
+            str(price) if count else "-",
+            str(price + 100) if count else "-",
+            str(price),
+            str(price + 200),
+            str(price - 200),
+            str(count) if count else "-",
+        ]
+
+
+def write_bulletin(path, trade_date, rows, seed=0):
+    """
+    Записывает один синтетический бюллетень с rows строками в каждой секции.
+    """
+    rnd = random.Random(seed)
+    workbook = xlwt.Workbook(encoding="utf-8")
+    sheet = workbook.add_sheet("TRADE_SUMMARY")
+
+    row_index = 0
+    for line in [
+        "Форма СЭТ-БТ",
+        "Бюллетень по итогам проведения торгов",
+        f"Дата торгов: {trade_date.strftime('%d.%m.%Y')}",
+        "Секция Биржи: «Нефтепродукты» АО «СПбМТСБ»",
+    ]:
+        sheet.write(row_index, 1, line)
+        row_index += 1
+
+    for unit in UNITS:
+        sheet.write(row_index, 1, f"Единица измерения: {unit}")
+        row_index += 1
+        for header_row in (HEADERS, SUBHEADERS):
+            for column, value in enumerate(header_row):
+                sheet.write(row_index, column, value)
+            row_index += 1
+
+        total_volume = total_count = 0
+        for values in _instrument_rows(rnd, rows):
+            for column, value in enumerate(values):
+                sheet.write(row_index, column, value)
+            if values[-1] != "-":
+                total_volume += int(values[4])
+                total_count += int(values[-1])
+            row_index += 1
+
+        sheet.write(row_index, 1, "Итого:")
+        sheet.write(row_index, 4, str(total_volume))
+        sheet.write(row_index, 14, str(total_count))
+        row_index += 2
+
+    workbook.save(path)
+
+
+def generate(out_dir, files, rows, start_date=datetime.date(2023, 1, 9), seed=0):
+    """
+    Генерирует files бюллетеней по рабочим дням начиная с start_date.
+    Возвращает список путей к созданным файлам.
+    """
+    paths = []
+    trade_date = start_date
+    for index in range(files):
+        while trade_date.weekday() >= 5:
+            trade_date += datetime.timedelta(days=1)
+
+        year_dir = os.path.join(out_dir, str(trade_date.year))
+        os.makedirs(year_dir, exist_ok=True)
+        path = os.path.join(year_dir, f"{trade_date.strftime('%d.%m.%Y')}_{index}.xls")
+        write_bulletin(path, trade_date, rows, seed + index)
+        paths.append(path)
+        trade_date += datetime.timedelta(days=1)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", required=True, help="Папка для бюллетеней.")
+    parser.add_argument("--files", type=int, default=100, help="Количество файлов.")
+    parser.add_argument("--rows", type=int, default=120, help="Строк в каждой секции.")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно генератора.")
+    args = parser.parse_args()
+
+    paths = generate(args.out, args.files, args.rows, seed=args.seed)
+    print(f"Создано файлов: {len(paths)} в папке {args.out}")
+
+
+if __name__ == "__main__":
+    main()
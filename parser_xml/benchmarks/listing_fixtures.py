@@ -0,0 +1,95 @@
+"""
+Фикстуры страниц со списком бюллетеней SPIMEX для бенчмарков.
+
+Разметка повторяет страницу результатов торгов: элементы
+accordeon-inner__item со ссылкой на XLS и датой торгов, блок пагинации
+bx-pagination и объёмные шапка и подвал, как у настоящей страницы.
+
+Запуск из папки parser_xml (сохранить страницы в папку):
+    python benchmarks/listing_fixtures.py --out /tmp/listing_pages --pages 20
+"""
+import argparse
+import datetime
+import os
+
+LISTING_PATH = "/markets/oil_products/trades/results/"
+
+
+def _item(trade_date):
+    return (
+        '<div class="accordeon-inner__item">'
+        '<div class="accordeon-inner__header">'
+        '<a class="accordeon-inner__item-title link xls" '
+        f'href="/upload/reports/oil_xls/oil_xls_{trade_date:%Y%m%d}162000.xls" '
+        'target="_blank">Бюллетень по итогам торгов в Секции «Нефтепродукты»</a>'
+        '<div class="accordeon-inner__item-inner__title">'
+        f"<p>Дата торгов: <span>{trade_date:%d.%m.%Y}</span></p>"
+        "</div></div></div>"
+    )
+
+
+def _pagination(page, pages):
+    links = []
+    for number in range(1, pages + 1):
+        active = ' class="bx-active"' if number == page else ""
+        links.append(
+            f'<li{active}><a href="{LISTING_PATH}?page=page-{number}">'
+            f"<span>{number}</span></a></li>"
+        )
+    if page < pages:
+        next_link = (
+            f'<li class="bx-pag-next"><a href="{LISTING_PATH}?page=page-{page + 1}">'
+            "<span>Вперед</span></a></li>"
+        )
+    else:
+        next_link = '<li class="bx-pag-next"><span>Вперед</span></li>'
+    return (
+        '<div class="bx-pagination"><div class="bx-pagination-container"><ul>'
+        '<li class="bx-pag-prev"><span>Назад</span></li>'
+        + "".join(links)
+        + next_link
+        + "</ul></div></div>"
+    )
+
+
+def build_listing_page(
+    page, pages, per_page=10, newest=datetime.date(2024, 12, 20), filler_blocks=200
+):
+    """
+    Возвращает HTML страницы page из pages с per_page бюллетенями.
+    Даты идут по убыванию от newest, по одной на каждый бюллетень.
+    """
+    first = (page - 1) * per_page
+    items = "".join(
+        _item(newest - datetime.timedelta(days=first + index))
+        for index in range(per_page)
+    )
+    filler = "".join(
+        f'<div class="news-item"><p>Новость {index}. {"Текст новости. " * 30}</p></div>'
+        for index in range(filler_blocks)
+    )
+    return (
+        "<!DOCTYPE html><html><head><title>Итоги торгов</title></head><body>"
+        f"<header>{filler}</header><main><section><div class=\"page-content\">"
+        f'<div class="accordeon-inner">{items}</div>{_pagination(page, pages)}'
+        f"</div></section></main><footer>{filler}</footer></body></html>"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--out", required=True, help="Папка для страниц.")
+    parser.add_argument("--pages", type=int, default=20, help="Количество страниц.")
+    parser.add_argument("--per-page", type=int, default=10, help="Бюллетеней на странице.")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for page in range(1, args.pages + 1):
+        path = os.path.join(args.out, f"page-{page}.html")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(build_listing_page(page, args.pages, args.per_page))
+    print(f"Сохранено страниц: {args.pages} в папку {args.out}")
+
+
+if __name__ == "__main__":
+    main()
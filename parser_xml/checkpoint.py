@@ -0,0 +1,57 @@
+import json
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, mode="w", encoding="utf-8"):
+    """
+    Открывает временный файл <path>.tmp для записи и после успешной записи
+    сбрасывает его на диск и переименовывает в path. При ошибке временный
+    файл удаляется, а прежний path остаётся нетронутым, поэтому
+    недописанный файл никогда не попадает на место готового.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    file = open(tmp_path, mode, encoding=None if "b" in mode else encoding)
+    try:
+        yield file
+        file.flush()
+        os.fsync(file.fileno())
+    except BaseException:
+        file.close()
+        os.remove(tmp_path)
+        raise
+    file.close()
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """
+    Читает контрольную точку этапа. Возвращает None, если её нет
+    или она повреждена.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            state = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def save_checkpoint(path, state):
+    """
+    Атомарно сохраняет контрольную точку этапа (словарь JSON).
+    """
+    with atomic_write(path) as file:
+        json.dump(state, file, ensure_ascii=False, indent=1)
+
+
+def clear_checkpoint(path):
+    """
+    Удаляет контрольную точку после успешного завершения этапа.
+    """
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,104 @@
+import os
+
+from logger_config import logger
+from schema import OUTPUT_COLUMNS
+
+
+FILE_EXTENSIONS = {"parquet": ".parquet", "ipc": ".arrow"}
+
+
+def _arrow_schema(pa):
+    """
+    Схема Arrow для результатов торгов.
+    """
+    dictionary = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("exchange_product_id", dictionary),
+            ("exchange_product_name", dictionary),
+            ("oil_id", dictionary),
+            ("delivery_basis_id", dictionary),
+            ("delivery_basis_name", dictionary),
+            ("delivery_type_id", dictionary),
+            ("volume", pa.int64()),
+            ("total", pa.int64()),
+            ("count", pa.int64()),
+            ("date", pa.date32()),
+        ]
+    )
+
+
+def write_partition(df, file_path, output_dir, file_format="parquet"):
+    """
+    Записывает результат обработки одного XLS-файла (в компактной схеме
+    schema.RESULT_DTYPES) в колоночном формате
+    в разделы output_dir/year=YYYY/trade_date=YYYY-MM-DD/ - по одному
+    на каждую дату торгов строк (файл архива, на который ссылаются
+    несколько дат торгов, попадает в раздел каждой даты).
+    Имя файла совпадает с именем исходного XLS-файла, поэтому повторная
+    запись перезаписывает раздел, а не дублирует строки.
+    Возвращает список записанных файлов.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+        import pyarrow.parquet as pq
+    except ImportError:
+        logger.error(
+            "Для колоночного формата требуется pyarrow: pip install pyarrow"
+        )
+        raise
+
+    if df["date"].isna().any():
+        logger.error(f"Не удалось определить дату торгов файла {file_path}")
+        return []
+
+    file_name = os.path.splitext(os.path.basename(file_path))[0]
+    partition_paths = []
+    for trade_date, part in df.groupby("date", sort=True, observed=True):
+        table = pa.Table.from_pandas(
+            part[OUTPUT_COLUMNS], preserve_index=False
+        ).cast(_arrow_schema(pa))
+
+        partition_dir = os.path.join(
+            output_dir,
+            f"year={trade_date.year}",
+            f"trade_date={trade_date.date().isoformat()}",
+        )
+        os.makedirs(partition_dir, exist_ok=True)
+
+        partition_path = os.path.join(
+            partition_dir, file_name + FILE_EXTENSIONS[file_format]
+        )
+        tmp_path = partition_path + ".tmp"
+        if file_format == "ipc":
+            with ipc.new_file(tmp_path, table.schema) as writer:
+                writer.write_table(table)
+        else:
+            pq.write_table(table, tmp_path)
+        os.replace(tmp_path, partition_path)
+        partition_paths.append(partition_path)
+
+    return partition_paths
+
+
+def prune_partitions(output_dir, partition_paths, file_format="parquet"):
+    """
+    Удаляет из output_dir файлы формата file_format, не входящие
+    в partition_paths: разделы удалённых XLS-файлов и файлов, перенесённых
+    в архив под другим именем (иначе их строки попали бы в набор дважды).
+    Пустые папки разделов удаляются. Возвращает количество удалённых файлов.
+    """
+    keep = {os.path.abspath(path) for path in partition_paths}
+    extension = FILE_EXTENSIONS[file_format]
+    removed = 0
+    for root, dirs, files in os.walk(output_dir, topdown=False):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.endswith(extension) and os.path.abspath(path) not in keep:
+                os.remove(path)
+                removed += 1
+        if root != output_dir and not os.listdir(root):
+            os.rmdir(root)
+    return removed
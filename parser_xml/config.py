@@ -5,14 +5,84 @@ BASE_URL = "https://spimex.com/markets/oil_products/trades/results/"
 # Базовый URL для добавления к ссылкам
 BASE_DOMAIN = "https://spimex.com"
 
+# Количество одновременно загружаемых страниц со списком бюллетеней (asyn_parser.py)
+PAGE_CONCURRENCY = 5
+
+# AIMD-регулятор темпа запросов (rate_control.py): начальная, минимальная
+# и максимальная пауза между запросами страниц, с, и предел одновременных
+# запросов. Загрузки файлов начинают без паузы
+RATE_START_DELAY = 2.0
+RATE_MIN_DELAY = 0.2
+RATE_MAX_DELAY = 60.0
+RATE_MAX_CONCURRENCY = 16
+# Метрики регулятора: решения и достигнутый темп запросов
+RATE_METRICS_FILE = "raw/rate_metrics.json"
+
+# Отчёты этапов run_parser.py (строка JSON на этап) и профили --profile
+STAGE_METRICS_FILE = "raw/stage_metrics.jsonl"
+PROFILE_DIR = "raw/profiles"
+
+# Пул прокси (proxi_parser.py): список прокси, оценки между запусками,
+# пауза после ошибки (удваивается с каждой ошибкой подряд), карантин, с,
+# и число ошибок подряд до карантина
+PROXY_LIST_FILE = "working_proxies.txt"
+PROXY_SCORES_FILE = "raw/proxy_scores.json"
+PROXY_COOLDOWN = 30
+PROXY_QUARANTINE = 600
+PROXY_MAX_FAILURES = 3
+
+# Проверка прокси (prox_check.py): исходный список, проверочный URL,
+# одновременных проверок (не больше лимита открытых файлов), таймаут, с,
+# кэш проверки и срок его годности, с
+PROXY_SOURCE_FILE = "http.txt"
+PROXY_CHECK_URL = "http://httpbin.org/ip"
+PROXY_CHECK_CONCURRENCY = 2000
+PROXY_CHECK_TIMEOUT = 5
+PROXY_HEALTH_FILE = "raw/proxy_health.json"
+PROXY_HEALTH_MAX_AGE = 6 * 60 * 60
+
 # Константа для года
 MIN_YEAR = 2023
 
 # Папка сохранения конечного результа
 URL_SAVE_DIR = "../parser_xml/results_csv/spimex.cvs"
+# Папка для колоночного формата (Parquet / Arrow IPC) с разбиением по дате торгов
+COLUMNAR_SAVE_DIR = "../parser_xml/results_columnar"
 LOG_SAVE_DIR = "parser.log"
 XML_SAVE_DIR = "downloaded_xls_files"
 
+# Способ чтения XLS-файлов: "pyexcel" (весь лист) или "xlrd" (только таблица в тоннах)
+XLS_READER = "pyexcel"
+
+# Потоковая запись результатов: сброс на диск каждые N файлов
+STREAM_FLUSH_EVERY = 50
+
+# Манифест обработанных XLS-файлов и кэш их результатов
+MANIFEST_PATH = "results_csv/manifest.json"
+RESULTS_CACHE_DIR = "results_csv/cache"
+# Как часто (каждые N обработанных файлов) сохранять манифест: после сбоя
+# повторно обрабатываются только файлы после последнего сохранения
+MANIFEST_CHECKPOINT_EVERY = 50
+
+# Дисковый HTTP-кэш условных запросов (ETag / Last-Modified) и его предельный размер
+HTTP_CACHE_DIR = "http_cache"
+HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
 # Константы для скачивания XLS-файлов
 CSV_FILE = "raw/trading_results.csv"
+# Реестр ссылок на XLS-файлы (SQLite): статус скачивания и хеш файлов
+REGISTRY_PATH = "raw/links.sqlite3"
+# Самая новая уже собранная дата торгов: обход ссылок останавливается на ней
+WATERMARK_FILE = "raw/watermark.json"
+# Контрольная точка обхода страниц: прерванный обход продолжается с неё
+PARSE_CHECKPOINT_FILE = "raw/parse_checkpoint.json"
 BASE_SAVE_DIR = "downloaded_xls_files"
+# Размер блока потокового скачивания XLS-файлов
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+# Одновременных загрузок на один хост (asyn_parser.py)
+DOWNLOAD_CONCURRENCY_PER_HOST = 4
+# Общее ограничение скорости скачивания, байт/с (0 - без ограничения)
+DOWNLOAD_MAX_BYTES_PER_SECOND = 0
+
+# Размер очередей между этапами в режиме --stage pipeline (ссылки и скачанные файлы)
+PIPELINE_QUEUE_SIZE = 100
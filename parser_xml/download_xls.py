@@ -1,104 +1,162 @@
-import pandas as pd
-import requests
 import os
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
 import time
 
 from logger_config import logger
-from config import MIN_YEAR, CSV_FILE, BASE_SAVE_DIR
-
-
-def _download_xls(url, save_path):
+from config import (
+    MIN_YEAR,
+    CSV_FILE,
+    BASE_SAVE_DIR,
+    REGISTRY_PATH,
+    HTTP_CACHE_DIR,
+    HTTP_CACHE_MAX_BYTES,
+    DOWNLOAD_CHUNK_SIZE,
+    RATE_MAX_DELAY,
+    RATE_METRICS_FILE,
+)
+from http_cache import HttpCache, download_to_file
+from listing import create_session
+from rate_control import RateController
+from registry import LinkRegistry, file_name
+from archive import XlsArchive
+from stage_metrics import STAGE
+
+
+def _download_xls(session, cache, rate, url, save_path):
     """
     Скачивает XLS-файл по указанной ссылке и сохраняет его по указанному пути.
+    Неизменившийся файл (ответ 304) берётся из HTTP-кэша, прерванная
+    загрузка продолжается с места остановки. Пауза и число одновременных
+    загрузок задаются регулятором темпа rate. Возвращает DownloadResult.
     """
-    try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        with open(save_path, 'wb') as file:
-            for chunk in response.iter_content():
-                file.write(chunk)
-        logger.info(f"Файл сохранён: {save_path}")
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Ошибка при скачивании файла {url}: {e}")
+    with rate.slot():
+        start_time = time.perf_counter()
+        result = download_to_file(
+            session, cache, url, save_path, chunk_size=DOWNLOAD_CHUNK_SIZE
+        )
+        elapsed_time = time.perf_counter() - start_time
+    STAGE.add_time("network", elapsed_time)
 
+    details = f"{result.size / 1024:.0f} КБ за {elapsed_time:.2f} с"
+    if result.from_cache:
+        details += ", из кэша"
+    elif result.resumed_from:
+        details += f", продолжено с {result.resumed_from} байт"
+    logger.info(f"Файл сохранён: {save_path} ({details})")
+    return result
 
-def _create_year_folders(base_dir):
-    """
-    Создаёт папки для каждого года в указанной базовой директории.
-    """
-    for year in range(MIN_YEAR, datetime.now().year + 1):
-        year_folder = os.path.join(base_dir, str(year))
-        if not os.path.exists(year_folder):
-            os.makedirs(year_folder)
-            logger.info(f"Создана папка: {year_folder}")
 
-
-def _validate_csv_file(csv_file):
+def _import_legacy_csv(registry, csv_file):
     """
-    Проверяет, существует ли CSV-файл и содержит ли он необходимые столбцы.
+    Переносит ссылки из прежнего CSV-файла в пустой реестр.
     """
-    if not os.path.exists(csv_file):
-        logger.error(
-            f"Файл {csv_file} не найден. Убедитесь, что он существует.")
-        return False
-
+    if registry.count() or not os.path.exists(csv_file):
+        return
     try:
-        df = pd.read_csv(csv_file, encoding="utf-8")
-    except Exception as e:
+        new_links = registry.import_csv(csv_file)
+    except (OSError, ValueError) as e:
         logger.error(f"Ошибка при чтении файла {csv_file}: {e}")
-        return False
-
-    if "Дата торгов" not in df.columns or "Ссылка на скачивание" not in df.columns:
-        logger.error("Файл не содержит необходимых столбцов 'Дата торгов' и 'Ссылка на скачивание'.")
-        return False
-
-    return True
+        return
+    logger.info(f"Из {csv_file} перенесено ссылок в реестр: {new_links}")
 
 
-def _process_row(row, base_save_dir):
+def _process_link(session, cache, rate, link, archive):
     """
-    Обрабатывает одну строку из CSV-файла, скачивает файл и сохраняет его.
+    Скачивает файл по одной ссылке из реестра (выполняется в пуле потоков)
+    и переносит его в архив XLS-файлов по хешу содержимого: повторно
+    скачанный бюллетень не занимает места. Возвращает путь к файлу
+    в архиве, DownloadResult и ошибку (None при успехе): любая ошибка
+    остаётся ошибкой одной ссылки и не прерывает остальные загрузки.
     """
-    date = row["Дата торгов"]
-    url = row["Ссылка на скачивание"]
-
-    if pd.isna(date) or pd.isna(url):
-        logger.warning(f"Пропущена строка: отсутствует дата или ссылка.")
-        return
-
+    url = link["url"]
+    incoming_path = archive.incoming_path(file_name(link))
+    logger.info(f"Скачиваем файл: {url}")
     try:
-        date_obj = datetime.strptime(date, "%d.%m.%Y")
-        year = date_obj.year
-
-        file_name = f"{date_obj.strftime('%d.%m.%Y')}_{row.name}.xls"
-        save_path = os.path.join(base_save_dir, str(year), file_name)
-        logger.info(f"Скачиваем файл: {url}")
-        _download_xls(url, save_path)
-    except ValueError:
-        logger.error(f"Не удалось распознать дату: {date}")
+        result = _download_xls(session, cache, rate, url, incoming_path)
+        save_path, duplicate = archive.store(incoming_path, result.sha256)
     except Exception as e:
-        logger.error(f"Ошибка при обработке строки: {e}")
+        STAGE.add("errors")
+        logger.error(f"Ошибка при скачивании файла {url}: {e}")
+        return incoming_path, None, e
 
+    STAGE.add("files_downloaded")
+    STAGE.add("bytes_downloaded", result.size)
+    if duplicate:
+        STAGE.add("duplicates")
+        logger.info(f"Файл {url} уже есть в архиве: {save_path}")
+    return save_path, result, None
 
-def main():
 
+def main(workers=1):
+    """
+    Скачивает ещё не скачанные ссылки из реестра в workers потоков
+    через общую сессию с пулом keep-alive соединений. Регулятор темпа
+    начинает с одной загрузки и доводит их число до workers, пока сервер
+    отвечает быстро и без ошибок.
+    """
     start_time = time.time()
     logger.info("Начало работы парсера...")
 
-    _create_year_folders(BASE_SAVE_DIR)
-
-    if not _validate_csv_file(CSV_FILE):
-        return
-
-    df = pd.read_csv(CSV_FILE, encoding="utf-8")
-
-    for index, row in df.iterrows():
-        _process_row(row, BASE_SAVE_DIR)
+    archive = XlsArchive(BASE_SAVE_DIR)
+    cache = HttpCache(HTTP_CACHE_DIR, HTTP_CACHE_MAX_BYTES)
+    # Темп загрузок ограничивается числом одновременных запросов:
+    # пауза появляется только после ответов 429, 5xx и таймаутов
+    rate = RateController(
+        "download_xls",
+        start_delay=0,
+        min_delay=0,
+        max_delay=RATE_MAX_DELAY,
+        max_concurrency=workers,
+    )
+    total_bytes = 0
+    with LinkRegistry(REGISTRY_PATH) as registry, create_session(workers) as session:
+        rate.attach(session)
+        _import_legacy_csv(registry, CSV_FILE)
+        adopted = archive.adopt(registry)
+        if adopted:
+            logger.info(f"Перенесено в архив файлов, скачанных ранее: {adopted}")
+
+        links = registry.pending(min_date=date(MIN_YEAR, 1, 1))
+        logger.info(f"Ссылок для скачивания: {len(links)}, потоков: {workers}")
+
+        # Реестр (SQLite) обновляется только из основного потока
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    _process_link, session, cache, rate, link, archive
+                ): link
+                for link in links
+            }
+            for future in as_completed(futures):
+                url = futures[future]["url"]
+                save_path, result, error = future.result()
+                if error is None:
+                    try:
+                        registry.mark_downloaded(url, save_path, result.sha256)
+                    except Exception as e:
+                        STAGE.add("errors")
+                        logger.error(f"Ошибка при сохранении {url} в реестр: {e}")
+                        error = e
+                if error is not None:
+                    registry.mark_failed(url, error)
+                    continue
+                total_bytes += result.size
+
+    metrics = rate.export(RATE_METRICS_FILE)
+    logger.info(
+        f"Темп запросов: {metrics['throughput']} запр./с, "
+        f"одновременно {metrics['concurrency']}, "
+        f"снижений темпа: {sum(metrics['backoffs'].values())} ({RATE_METRICS_FILE})"
+    )
 
     end_time = time.time()
     elapsed_time = end_time - start_time
     elapsed_time_minutes = elapsed_time / 60
+    logger.info(
+        f"Скачано {total_bytes / 1024 / 1024:.1f} МБ, "
+        f"{total_bytes / 1024 / 1024 / max(elapsed_time, 1e-9):.1f} МБ/с."
+    )
     logger.info(
         f"Парсер завершил работу. Время выполнения: {elapsed_time_minutes:.2f} минут."
         )
@@ -0,0 +1,104 @@
+"""
+Извлечение ссылок на XLS-файлы, дат торгов и пагинации со страниц
+результатов торгов SPIMEX.
+
+Единственная реализация для parse.py, asyn_parser.py, proxi_parser.py
+и TradingSpider. Разбор выполняется lxml, XPath-выражения компилируются
+один раз при импорте модуля. Модуль не зависит от config и logger_config,
+поэтому импортируется и как parser_xml.extractor из проекта Scrapy.
+"""
+import re
+
+from lxml import etree
+from lxml import html as lxml_html
+
+
+def _has_class(name):
+    """
+    XPath-условие "у элемента есть класс name" (точное совпадение токена).
+    """
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+
+_ITEMS = etree.XPath(f"//div[{_has_class('accordeon-inner__item')}]")
+_ITEM_LINK = etree.XPath(
+    f".//a[{_has_class('accordeon-inner__item-title')} and {_has_class('xls')}]/@href"
+)
+_ITEM_DATE = etree.XPath(".//p/span")
+_NEXT_PAGE = etree.XPath(f"//li[{_has_class('bx-pag-next')}]/a/@href")
+_PAGE_LINKS = etree.XPath(
+    f"//div[{_has_class('bx-pagination')}]//li"
+    f"[not({_has_class('bx-pag-prev')}) and not({_has_class('bx-pag-next')})]"
+)
+_PAGE_LINK_HREF = etree.XPath("./a/@href")
+
+
+def parse_html(text):
+    """
+    Разбирает HTML страницы в дерево lxml.
+    """
+    return lxml_html.fromstring(text)
+
+
+def extract_xls_links_and_dates(tree):
+    """
+    Извлекает ссылки на XLS-файлы и даты торгов. Дата ищется внутри
+    того же элемента accordeon-inner__item, что и ссылка.
+    """
+    xls_links = []
+    dates = []
+
+    for item in _ITEMS(tree):
+        links = _ITEM_LINK(item)
+        xls_links.append(links[0] if links else None)
+
+        date_elements = _ITEM_DATE(item)
+        if date_elements:
+            dates.append(date_elements[0].text_content().strip())
+        else:
+            dates.append(None)
+
+    return xls_links, dates
+
+
+def get_next_page_url(tree):
+    """
+    Извлекает ссылку на следующую страницу из пагинации.
+    """
+    links = _NEXT_PAGE(tree)
+    return links[0] if links else None
+
+
+def get_pagination(tree):
+    """
+    Читает блок пагинации bx-pagination. Возвращает количество страниц
+    (наибольший номер в блоке, 0 - если блока нет) и словарь
+    {номер страницы: ссылка} для страниц, на которые в блоке есть ссылки.
+    """
+    page_count = 0
+    page_links = {}
+
+    for item in _PAGE_LINKS(tree):
+        text = item.text_content().strip()
+        if not text.isdigit():
+            continue
+        number = int(text)
+        page_count = max(page_count, number)
+        hrefs = _PAGE_LINK_HREF(item)
+        if hrefs:
+            page_links[number] = hrefs[0]
+
+    return page_count, page_links
+
+
+def build_page_url(sample_href, sample_number, page_number):
+    """
+    Строит ссылку на страницу page_number по образцу ссылки на страницу
+    sample_number: номер подставляется в значение параметра запроса,
+    например "?page=page-2" или "?PAGEN_1=2". Возвращает None, если
+    номер в параметрах ссылки-образца не найден.
+    """
+    pattern = re.compile(rf"(=(?:[^&#]*?\D)?){sample_number}(?=[&#]|$)")
+    if not pattern.search(sample_href):
+        return None
+    return pattern.sub(rf"\g<1>{page_number}", sample_href, count=1)
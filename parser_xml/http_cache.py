@@ -0,0 +1,426 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+
+
+# Размер кэша по умолчанию: при превышении удаляются давно не использованные записи
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Размер блока потоковой записи файлов по умолчанию
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+STATUS_PARTIAL_CONTENT = 206
+STATUS_NOT_MODIFIED = 304
+
+
+class HttpCache:
+    """
+    Дисковый HTTP-кэш для условных запросов (ETag / Last-Modified).
+
+    Для каждого URL хранится тело ответа (<ключ>.body) и метаданные
+    (<ключ>.json): валидаторы, кодировка, размер, SHA-256 тела и время
+    последнего использования. Запрос отправляется с If-None-Match /
+    If-Modified-Since, ответ 304 отдаётся из кэша. Кэшируются только ответы
+    с валидаторами. При превышении max_bytes удаляются записи, которые
+    дольше всего не использовались.
+
+    Модуль не зависит от HTTP-клиента: функции ниже работают с сессиями
+    requests и aiohttp, для Scrapy есть HttpCacheMiddleware в
+    parser_spimex.middlewares.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        # Кэш используется из пула потоков загрузчика: размер кэша
+        # и вытеснение меняются только под блокировкой
+        self._lock = threading.Lock()
+        self.total_bytes = sum(meta["size"] for meta in self._iter_meta())
+
+    def _key(self, url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _meta_path(self, key):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def _body_path(self, key):
+        return os.path.join(self.cache_dir, key + ".body")
+
+    def _iter_meta(self):
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.cache_dir, name), "r", encoding="utf-8") as file:
+                    yield json.load(file)
+            except (OSError, ValueError):
+                continue
+
+    def _write_meta(self, key, meta):
+        meta_path = self._meta_path(key)
+        tmp_path = meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(meta, file, ensure_ascii=False)
+        os.replace(tmp_path, meta_path)
+
+    def lookup(self, url):
+        """
+        Возвращает метаданные записи для url или None, если записи нет
+        или тело ответа потеряно.
+        """
+        key = self._key(url)
+        try:
+            with open(self._meta_path(key), "r", encoding="utf-8") as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self._body_path(key)):
+            return None
+        return meta
+
+    def request_headers(self, url):
+        """
+        Заголовки условного запроса для url (пустой словарь, если записи нет).
+        """
+        meta = self.lookup(url)
+        if meta is None:
+            return {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def body_path(self, url):
+        """
+        Путь к сохранённому телу ответа.
+        """
+        return self._body_path(self._key(url))
+
+    def read_body(self, url):
+        """
+        Отдаёт тело ответа из кэша (ответ 304) и отмечает использование записи.
+        """
+        self.touch(url)
+        with open(self.body_path(url), "rb") as file:
+            return file.read()
+
+    def touch(self, url):
+        """
+        Обновляет время последнего использования записи (для вытеснения).
+        """
+        meta = self.lookup(url)
+        if meta is not None:
+            meta["used_at"] = time.time()
+            self._write_meta(self._key(url), meta)
+
+    def store(self, url, headers, body=None, body_file=None, encoding=None):
+        """
+        Сохраняет ответ 200: тело передаётся байтами (body) или путём
+        к уже записанному файлу (body_file, копируется в кэш).
+        headers - заголовки ответа (ETag, Last-Modified).
+        Ответы без валидаторов не кэшируются. Возвращает метаданные записи.
+        """
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return None
+
+        key = self._key(url)
+        old_meta = self.lookup(url)
+        body_path = self._body_path(key)
+        tmp_path = body_path + ".tmp"
+        digest = hashlib.sha256()
+        if body_file is not None:
+            shutil.copyfile(body_file, tmp_path)
+            with open(tmp_path, "rb") as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        else:
+            digest.update(body)
+            with open(tmp_path, "wb") as file:
+                file.write(body)
+        os.replace(tmp_path, body_path)
+
+        now = time.time()
+        meta = {
+            "url": url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "encoding": encoding,
+            "content_type": headers.get("Content-Type"),
+            "size": os.path.getsize(body_path),
+            "sha256": digest.hexdigest(),
+            "stored_at": now,
+            "used_at": now,
+        }
+        self._write_meta(key, meta)
+
+        with self._lock:
+            self.total_bytes += meta["size"] - (old_meta["size"] if old_meta else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+        return meta
+
+    def evict(self):
+        """
+        Удаляет давно не использованные записи, пока размер кэша
+        не станет меньше max_bytes.
+        """
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        entries = sorted(self._iter_meta(), key=lambda meta: meta["used_at"])
+        total = sum(meta["size"] for meta in entries)
+        for meta in entries:
+            if total <= self.max_bytes:
+                break
+            key = self._key(meta["url"])
+            for path in (self._meta_path(key), self._body_path(key)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= meta["size"]
+        self.total_bytes = total
+
+
+def _decode(body, encoding):
+    return body.decode(encoding or "utf-8", errors="replace")
+
+
+def _request_headers(cache, url, headers, conditional):
+    """
+    Заголовки запроса: при conditional - с условными заголовками из кэша.
+    """
+    headers = dict(headers)
+    if conditional:
+        headers.update(cache.request_headers(url))
+    return headers
+
+
+def get_text(session, cache, url, **kwargs):
+    """
+    Условный GET через requests.Session. Возвращает текст страницы:
+    при ответе 304 - из кэша. Если записи кэша для ответа 304 уже нет
+    (вытеснена после построения запроса), страница запрашивается
+    заново без условных заголовков. Ошибки HTTP поднимаются как
+    requests.exceptions.HTTPError.
+    """
+    headers = kwargs.pop("headers", None) or {}
+    for conditional in (True, False):
+        response = session.get(
+            url, headers=_request_headers(cache, url, headers, conditional), **kwargs
+        )
+        if response.status_code == STATUS_NOT_MODIFIED and conditional:
+            meta = cache.lookup(url)
+            if meta is None:
+                continue
+            return _decode(cache.read_body(url), meta["encoding"])
+        break
+    response.raise_for_status()
+    cache.store(url, response.headers, body=response.content, encoding=response.encoding)
+    return response.text
+
+
+async def get_text_async(session, cache, url, **kwargs):
+    """
+    Условный GET через aiohttp.ClientSession. Возвращает текст страницы:
+    при ответе 304 - из кэша, без записи кэша - повторным запросом без
+    условных заголовков, как get_text(). Ошибки HTTP поднимаются как
+    aiohttp.ClientResponseError.
+    """
+    headers = kwargs.pop("headers", None) or {}
+    for conditional in (True, False):
+        async with session.get(
+            url, headers=_request_headers(cache, url, headers, conditional), **kwargs
+        ) as response:
+            if response.status == STATUS_NOT_MODIFIED and conditional:
+                meta = cache.lookup(url)
+                if meta is None:
+                    continue
+                return _decode(cache.read_body(url), meta["encoding"])
+            response.raise_for_status()
+            body = await response.read()
+            encoding = response.get_encoding()
+        break
+    cache.store(url, response.headers, body=body, encoding=encoding)
+    return _decode(body, encoding)
+
+
+def _range_validator(headers):
+    """
+    Валидатор для If-Range: сильный ETag или Last-Modified.
+    Слабый ETag (W/...) для If-Range не подходит.
+    """
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+def _resume_state(part_path, validator_path):
+    """
+    Возвращает размер недокачанного файла и валидатор первой попытки.
+    Без валидатора продолжать загрузку небезопасно - тогда (0, None).
+    """
+    try:
+        offset = os.path.getsize(part_path)
+        with open(validator_path, "r", encoding="utf-8") as file:
+            validator = file.read().strip()
+    except OSError:
+        return 0, None
+    if not offset or not validator:
+        return 0, None
+    return offset, validator
+
+
+def _hash_file(path, digest):
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+
+@dataclass
+class DownloadResult:
+    """
+    Результат скачивания файла: SHA-256 и размер содержимого,
+    с какого байта продолжена прерванная загрузка и взят ли файл из кэша.
+    """
+    sha256: str
+    size: int
+    resumed_from: int = 0
+    from_cache: bool = False
+
+
+def _content_range_start(headers):
+    """
+    Первый байт из Content-Range ("bytes START-END/TOTAL") или None.
+    """
+    value = headers.get("Content-Range") or ""
+    unit, _, byte_range = value.partition(" ")
+    if unit != "bytes":
+        return None
+    try:
+        return int(byte_range.split("-", 1)[0])
+    except ValueError:
+        return None
+
+
+def _discard_partial(part_path, validator_path):
+    """
+    Удаляет недокачанный файл и его валидатор.
+    """
+    for path in (part_path, validator_path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _download_once(
+    session, cache, url, save_path, chunk_size, headers, resume, **kwargs
+):
+    """
+    Одна попытка download_to_file. Возвращает None, если продолжить
+    загрузку или взять файл из кэша не удалось и файл нужно скачать
+    заново целиком.
+    """
+    part_path = save_path + ".part"
+    validator_path = part_path + ".validator"
+
+    headers = dict(headers)
+    offset, validator = _resume_state(part_path, validator_path) if resume else (0, None)
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = validator
+    elif resume:
+        headers.update(cache.request_headers(url))
+
+    with session.get(url, headers=headers, stream=True, **kwargs) as response:
+        status = response.status_code
+        if status == STATUS_NOT_MODIFIED:
+            meta = cache.lookup(url)
+            if meta is None:
+                # Запись кэша вытеснена после построения условного запроса
+                return None
+            shutil.copyfile(cache.body_path(url), part_path)
+            os.replace(part_path, save_path)
+            cache.touch(url)
+            return DownloadResult(meta["sha256"], meta["size"], from_cache=True)
+        if offset and status >= 400:
+            # 416 (файл уже докачан) и прочие ошибки запроса Range
+            return None
+        response.raise_for_status()
+
+        partial = status == STATUS_PARTIAL_CONTENT
+        if partial and _content_range_start(response.headers) != (offset or 0):
+            # Сервер отдал не тот диапазон: дописывать его к файлу нельзя
+            return None
+
+        digest = hashlib.sha256()
+        if offset and partial:
+            _hash_file(part_path, digest)
+            mode = "ab"
+        else:
+            offset = 0
+            mode = "wb"
+            validator = _range_validator(response.headers)
+            if validator:
+                with open(validator_path, "w", encoding="utf-8") as file:
+                    file.write(validator)
+            elif os.path.exists(validator_path):
+                os.remove(validator_path)
+
+        with open(part_path, mode) as file:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                digest.update(chunk)
+                file.write(chunk)
+        response_headers = response.headers
+
+    os.replace(part_path, save_path)
+    if os.path.exists(validator_path):
+        os.remove(validator_path)
+    cache.store(url, response_headers, body_file=save_path)
+    return DownloadResult(
+        digest.hexdigest(), os.path.getsize(save_path), resumed_from=offset
+    )
+
+
+def download_to_file(
+    session, cache, url, save_path, chunk_size=DEFAULT_CHUNK_SIZE, **kwargs
+):
+    """
+    Условный GET файла через requests.Session с записью в save_path.
+
+    Тело пишется блоками chunk_size во временный файл <save_path>.part,
+    который после загрузки атомарно переименовывается в save_path.
+    Прерванная загрузка продолжается запросом Range c If-Range по
+    валидатору первой попытки; если файл на сервере изменился (ответ 200
+    вместо 206), загрузка начинается заново. При ответе 304 файл
+    копируется из кэша. Если продолжить загрузку не удалось (ответ 416
+    или другая ошибка, диапазон не с того байта) или записи кэша для
+    ответа 304 уже нет, недокачанный файл удаляется и файл скачивается
+    заново без Range и условных заголовков. Возвращает DownloadResult;
+    если и повторная загрузка получила такой ответ, поднимает ValueError.
+    """
+    headers = kwargs.pop("headers", None) or {}
+    result = _download_once(
+        session, cache, url, save_path, chunk_size, headers, resume=True, **kwargs
+    )
+    if result is None:
+        part_path = save_path + ".part"
+        _discard_partial(part_path, part_path + ".validator")
+        result = _download_once(
+            session, cache, url, save_path, chunk_size, headers, resume=False, **kwargs
+        )
+    if result is None:
+        raise ValueError(f"Неожиданный ответ сервера при повторной загрузке {url}")
+    return result
@@ -0,0 +1,122 @@
+from dataclasses import dataclass, field, replace
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from extractor import (
+    build_page_url,
+    extract_xls_links_and_dates,
+    get_next_page_url,
+    get_pagination,
+    parse_html,
+)
+from watermark import split_by_watermark
+
+
+# Размер пула keep-alive соединений общей сессии
+SESSION_POOL_SIZE = 10
+
+
+@dataclass
+class PageResult:
+    """
+    Результат загрузки и разбора одной страницы со списком бюллетеней.
+    Страница скачивается и разбирается один раз, дальше используются
+    только данные этого объекта.
+    """
+    url: str
+    xls_links: List[Optional[str]]
+    dates: List[Optional[str]]
+    next_page_url: Optional[str]
+    page_count: int = 0
+    page_links: Dict[int, str] = field(default_factory=dict)
+    reached_watermark: bool = False
+
+    @property
+    def file_count(self):
+        """
+        Количество найденных на странице ссылок на XLS-файлы.
+        """
+        return sum(1 for link in self.xls_links if link)
+
+
+def parse_page(page_url, text):
+    """
+    Разбирает HTML страницы со списком бюллетеней в PageResult.
+    """
+    tree = parse_html(text)
+    xls_links, dates = extract_xls_links_and_dates(tree)
+    page_count, page_links = get_pagination(tree)
+    return PageResult(
+        page_url,
+        xls_links,
+        dates,
+        get_next_page_url(tree),
+        page_count,
+        page_links,
+    )
+
+
+def filter_new(page, watermark):
+    """
+    Оставляет на странице только ссылки с датой не старше watermark.
+    Если на странице есть дата старше watermark, ссылка на следующую
+    страницу сбрасывается: более старые страницы уже собраны.
+    """
+    dates, xls_links, reached = split_by_watermark(
+        page.dates, page.xls_links, watermark
+    )
+    return replace(
+        page,
+        dates=dates,
+        xls_links=xls_links,
+        next_page_url=None if reached else page.next_page_url,
+        reached_watermark=reached,
+    )
+
+
+def stop_page(page):
+    """
+    Возвращает страницу без ссылок и без перехода дальше: обход
+    остановлен на дате раньше MIN_YEAR.
+    """
+    return replace(page, dates=[], xls_links=[], next_page_url=None)
+
+
+def build_page_urls(first_page, base_domain, max_pages=None):
+    """
+    Строит ссылки на страницы 2..N по блоку пагинации первой страницы.
+    Ссылки, которых нет в блоке (Bitrix показывает только часть номеров),
+    строятся по образцу известной ссылки. Возвращает None, если количество
+    страниц не удалось определить - тогда страницы обходятся по ссылке
+    "Вперед".
+    """
+    if not first_page.page_count or not first_page.page_links:
+        return None
+
+    page_count = first_page.page_count
+    if max_pages:
+        page_count = min(page_count, max_pages)
+
+    sample_number, sample_href = max(first_page.page_links.items())
+    page_urls = []
+    for number in range(2, page_count + 1):
+        href = first_page.page_links.get(number) or build_page_url(
+            sample_href, sample_number, number
+        )
+        if href is None:
+            return None
+        page_urls.append(base_domain + href)
+    return page_urls
+
+
+def create_session(pool_size=SESSION_POOL_SIZE):
+    """
+    Создаёт общую requests.Session с пулом keep-alive соединений.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
@@ -7,10 +7,11 @@ base_path = os.path.abspath(os.path.dirname(__file__))
 
 # Получаем путь для сохранения файла
 output_path = get_output_path(base_path, LOG_SAVE_DIR)
+# Файл лога открывается при первой записи, а не при импорте (--help, импорт модулей)
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler(output_path), logging.StreamHandler()],
+    handlers=[logging.FileHandler(output_path, delay=True), logging.StreamHandler()],
 )
 
 logger = logging.getLogger(__name__)
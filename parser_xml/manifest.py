@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from checkpoint import atomic_write
+from logger_config import logger
+from schema import SCHEMA_VERSION
+
+
+def _file_hash(file_path):
+    """
+    Считает SHA-256 содержимого файла.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path):
+    """
+    Загружает манифест обработанных файлов. При отсутствии или повреждении
+    файла возвращает пустой манифест.
+    """
+    if not os.path.exists(manifest_path):
+        return {}
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Манифест {manifest_path} не прочитан, будет создан заново: {e}")
+        return {}
+
+
+def save_manifest(manifest, manifest_path):
+    """
+    Атомарно сохраняет манифест: запись во временный файл и переименование.
+    """
+    with atomic_write(manifest_path) as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=1)
+
+
+def check_file(manifest, file_path, cache_dir, reader):
+    """
+    Проверяет, изменился ли файл с прошлого запуска.
+    Возвращает пару (актуален ли кэш, хеш содержимого). Хеш считается
+    только если размер или время изменения не совпали с манифестом.
+    Результат, полученный другим способом чтения XLS или по другой
+    версии схемы, считается устаревшим.
+    """
+    stat = os.stat(file_path)
+    entry = manifest.get(file_path)
+    if (
+        entry is None
+        or entry.get("reader") != reader
+        or entry.get("schema") != SCHEMA_VERSION
+    ):
+        return False, None
+
+    cache_path = entry["cache"] and os.path.join(cache_dir, entry["cache"])
+    if cache_path and not os.path.exists(cache_path):
+        return False, None
+
+    if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+        return True, entry["sha256"]
+
+    content_hash = _file_hash(file_path)
+    if entry["sha256"] != content_hash:
+        return False, content_hash
+
+    entry["size"] = stat.st_size
+    entry["mtime"] = stat.st_mtime_ns
+    return True, content_hash
+
+
+def load_cached_rows(manifest, file_path, cache_dir):
+    """
+    Возвращает сохранённый результат обработки файла или None,
+    если файл не содержал данных.
+    """
+    cache_name = manifest[file_path]["cache"]
+    if cache_name is None:
+        return None
+    return pd.read_pickle(os.path.join(cache_dir, cache_name))
+
+
+def store_rows(manifest, file_path, content_hash, result_df, cache_dir, reader):
+    """
+    Сохраняет результат обработки файла в кэш и обновляет запись манифеста.
+    Файл кэша записывается атомарно и на диск до того, как на него
+    сошлётся сохранённый манифест.
+    """
+    stat = os.stat(file_path)
+    if content_hash is None:
+        content_hash = _file_hash(file_path)
+
+    cache_name = None
+    rows = 0
+    if result_df is not None:
+        # Имя файла входит в ключ: из него берётся столбец date
+        file_name = os.path.splitext(os.path.basename(file_path))[0]
+        cache_name = f"{content_hash}_{file_name}_{reader}.pkl"
+        rows = len(result_df)
+        with atomic_write(os.path.join(cache_dir, cache_name), "wb") as file:
+            result_df.to_pickle(file)
+
+    manifest[file_path] = {
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "sha256": content_hash,
+        "rows": rows,
+        "cache": cache_name,
+        "reader": reader,
+        "schema": SCHEMA_VERSION,
+    }
+
+
+def prune_manifest(manifest, file_paths, cache_dir):
+    """
+    Удаляет из манифеста записи об исчезнувших файлах, кэш, на который
+    больше нет ссылок, и недописанные файлы кэша прерванного запуска.
+    """
+    existing = set(file_paths)
+    for file_path in list(manifest):
+        if file_path not in existing:
+            del manifest[file_path]
+
+    used = {entry["cache"] for entry in manifest.values() if entry["cache"]}
+    for cache_name in os.listdir(cache_dir):
+        if cache_name.endswith(".tmp") or (
+            cache_name.endswith(".pkl") and cache_name not in used
+        ):
+            os.remove(os.path.join(cache_dir, cache_name))
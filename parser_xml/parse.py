@@ -1,45 +1,29 @@
 import requests
-from bs4 import BeautifulSoup
 import time
-import pandas as pd
 import os
+from datetime import date
 from logger_config import logger
-from config import BASE_URL, BASE_DOMAIN, MIN_YEAR
-
-
-def _extract_xls_links_and_dates(soup):
-    """
-    Извлекает все ссылки на XLS-файлы и даты торгов с текущей страницы.
-    """
-    xls_links = []
-    dates = []
-
-    for item in soup.find_all("div", class_="accordeon-inner__item"):
-        link_element = item.find("a", class_="accordeon-inner__item-title link xls")
-        if link_element:
-            xls_links.append(link_element["href"])
-        else:
-            xls_links.append(None)
-        date_element = soup.select_one(
-            "html body main section div div:nth-of-type(2) div div div:nth-of-type(2) div:nth-of-type(1) div div:nth-of-type(1) div:nth-of-type(5) div div:nth-of-type(2) div p span"
-        )
-        if date_element:
-            date = date_element.text.strip()
-            dates.append(date)
-        else:
-            dates.append(None)
-
-    return xls_links, dates
-
-
-def _get_next_page_url(soup):
-    """
-    Извлекает ссылку на следующую страницу из пагинации.
-    """
-    next_page_link = soup.find("li", class_="bx-pag-next")
-    if next_page_link and next_page_link.find("a"):
-        return next_page_link.find("a")["href"]
-    return None
+from config import (
+    BASE_URL,
+    BASE_DOMAIN,
+    MIN_YEAR,
+    WATERMARK_FILE,
+    REGISTRY_PATH,
+    HTTP_CACHE_DIR,
+    HTTP_CACHE_MAX_BYTES,
+    RATE_START_DELAY,
+    RATE_MIN_DELAY,
+    RATE_MAX_DELAY,
+    RATE_METRICS_FILE,
+    PARSE_CHECKPOINT_FILE,
+)
+from checkpoint import clear_checkpoint, load_checkpoint, save_checkpoint
+from http_cache import HttpCache, get_text
+from rate_control import RateController
+from registry import LinkRegistry
+from stage_metrics import STAGE
+from listing import create_session, filter_new, parse_page, stop_page
+from watermark import newest_date, resolve_watermark, update_watermark
 
 
 def _validate_date(date):
@@ -60,29 +44,17 @@ def _validate_date(date):
     return True
 
 
-def _save_to_csv(dates, xls_links):
+def _save_links(registry, dates, xls_links):
     """
-    Сохраняет данные в CSV-файл, добавляя новые данные в существующий файл.
+    Сохраняет ссылки в реестр, пропуская уже известные.
     """
-    data = {
-        "Дата торгов": dates,
-        "Ссылка на скачивание": [
-            BASE_DOMAIN + link if link else None for link in xls_links
-        ],
-    }
-    df = pd.DataFrame(data)
-
-    df = df[df["Дата торгов"].notna() & df["Ссылка на скачивание"].notna()]
-
-    file_path = "raw/trading_results.csv"
-    if os.path.exists(file_path):
-        df.to_csv(
-            file_path,
-            mode="a", header=False, index=False, encoding="utf-8")
-    else:
-        df.to_csv(file_path, index=False, encoding="utf-8")
-
-    logger.info(f"Данные сохранены в файл: {file_path}")
+    new_links = registry.add_links(
+        dates, [BASE_DOMAIN + link if link else None for link in xls_links]
+    )
+    STAGE.add("links", new_links)
+    logger.info(
+        f"Новых ссылок: {new_links} из {len(xls_links)} ({REGISTRY_PATH})"
+    )
 
 
 def _ensure_raw_folder_exists():
@@ -94,54 +66,161 @@ def _ensure_raw_folder_exists():
         logger.info("Папка 'raw' создана.")
 
 
-def _process_page(page_url, page_counter):
+def _log_rate(rate):
     """
-    Обрабатывает одну страницу, извлекает данные и сохраняет их.
+    Сохраняет метрики регулятора темпа запросов и выводит итог в лог.
     """
-    logger.info(f"Обрабатывается страница {page_counter}...")
+    metrics = rate.export(RATE_METRICS_FILE)
+    logger.info(
+        f"Темп запросов: {metrics['throughput']} запр./с, "
+        f"пауза {metrics['delay']} с, одновременно {metrics['concurrency']}, "
+        f"снижений темпа: {sum(metrics['backoffs'].values())} ({RATE_METRICS_FILE})"
+    )
+
+
+def _load_progress(watermark):
+    """
+    Возвращает контрольную точку прерванного обхода с той же границей
+    watermark или None. Ссылки пройденных страниц уже в реестре, поэтому
+    обход продолжается со следующей непройденной страницы.
+    """
+    state = load_checkpoint(PARSE_CHECKPOINT_FILE)
+    boundary = watermark.isoformat() if watermark else None
+    if state is None or state.get("watermark") != boundary:
+        return None
+    return state
 
+
+def _save_progress(watermark, page_url, page_counter, total_files, last_date):
+    """
+    Сохраняет контрольную точку обхода: следующую страницу, число
+    найденных файлов и самую новую дату торгов (для watermark).
+    """
+    save_checkpoint(
+        PARSE_CHECKPOINT_FILE,
+        {
+            "watermark": watermark.isoformat() if watermark else None,
+            "page_url": page_url,
+            "page_counter": page_counter,
+            "total_files": total_files,
+            "last_date": last_date.isoformat() if last_date else None,
+        },
+    )
+
+
+def _fetch_page(session, cache, rate, page_url):
+    """
+    Загружает (условным запросом через HTTP-кэш) и разбирает страницу
+    один раз, возвращает PageResult. Пауза перед запросом задаётся
+    регулятором темпа rate.
+    """
     try:
-        response = requests.get(page_url)
-        response.raise_for_status()
+        with rate.slot(), STAGE.timer("network"):
+            text = get_text(session, cache, page_url)
     except requests.exceptions.RequestException as e:
+        STAGE.add("errors")
         logger.error(f"Ошибка при загрузке страницы {page_url}: {e}")
         return None
 
-    soup = BeautifulSoup(response.text, "html.parser")
-    xls_links, dates = _extract_xls_links_and_dates(soup)
+    STAGE.add("pages")
+    with STAGE.timer("parse"):
+        return parse_page(page_url, text)
 
-    for date in dates:
-        if date and not _validate_date(date):
-            return None
 
-    _save_to_csv(dates, xls_links)
-    return _get_next_page_url(soup)
+def _process_page(session, cache, rate, page_url, page_counter, watermark, registry):
+    """
+    Обрабатывает одну страницу, извлекает данные и сохраняет ссылки
+    не старше watermark. Возвращает PageResult только с новыми ссылками
+    или None при ошибке загрузки.
+    """
+    logger.info(f"Обрабатывается страница {page_counter}...")
+
+    page = _fetch_page(session, cache, rate, page_url)
+    if page is None:
+        return None
+
+    for trade_date in page.dates:
+        if trade_date and not _validate_date(trade_date):
+            return stop_page(page)
+
+    page = filter_new(page, watermark)
+    if page.dates:
+        _save_links(registry, page.dates, page.xls_links)
+    if page.reached_watermark:
+        logger.info(f"Достигнута уже собранная дата торгов {watermark:%d.%m.%Y}.")
+    return page
 
 
-def main():
+def main(since=None, full=False, on_links=None):
+    """
+    Собирает ссылки на XLS-файлы новее сохранённого watermark.
+    since (date) - собрать ссылки начиная с этой даты,
+    full - обойти все страницы до MIN_YEAR.
+    on_links - функция, которой после каждой страницы передаются записи
+    реестра для её новых ссылок (режим pipeline в run_parser.py).
+    """
     _ensure_raw_folder_exists()
 
     start_time = time.time()
     logger.info("Начало парсинга...")
 
+    watermark = resolve_watermark(WATERMARK_FILE, since, full)
+    cache = HttpCache(HTTP_CACHE_DIR, HTTP_CACHE_MAX_BYTES)
+    rate = RateController(
+        "parse",
+        start_delay=RATE_START_DELAY,
+        min_delay=RATE_MIN_DELAY,
+        max_delay=RATE_MAX_DELAY,
+        max_concurrency=1,
+    )
     page_url = BASE_URL
     page_counter = 1
     total_files = 0
-
-    while page_url:
-        next_page_url = _process_page(page_url, page_counter)
-        if next_page_url:
-            page_url = BASE_DOMAIN + next_page_url
-            page_counter += 1
-            total_files += len(
-                _extract_xls_links_and_dates(
-                    BeautifulSoup
-                    (requests.get(page_url).text, "html.parser"))[0]
-                    )
-            time.sleep(2)
-        else:
-            logger.info("Достигнута последняя страница.")
-            break
+    last_date = None
+    completed = True
+
+    progress = _load_progress(watermark)
+    if progress is not None:
+        page_url = progress["page_url"]
+        page_counter = progress["page_counter"]
+        total_files = progress["total_files"]
+        if progress["last_date"]:
+            last_date = date.fromisoformat(progress["last_date"])
+        logger.info(f"Продолжение прерванного обхода со страницы {page_counter}.")
+
+    with LinkRegistry(REGISTRY_PATH) as registry, create_session() as session:
+        rate.attach(session)
+        while page_url:
+            page = _process_page(
+                session, cache, rate, page_url, page_counter, watermark, registry
+            )
+            if page is None:
+                completed = False
+                break
+
+            total_files += page.file_count
+            last_date = newest_date(page.dates, last_date)
+            if on_links is not None and page.dates:
+                on_links(
+                    registry.find(BASE_DOMAIN + link for link in page.xls_links if link)
+                )
+            if page.next_page_url:
+                page_url = BASE_DOMAIN + page.next_page_url
+                page_counter += 1
+                _save_progress(
+                    watermark, page_url, page_counter, total_files, last_date
+                )
+            else:
+                if not page.reached_watermark:
+                    logger.info("Достигнута последняя страница.")
+                break
+
+    _log_rate(rate)
+
+    if completed:
+        clear_checkpoint(PARSE_CHECKPOINT_FILE)
+        if last_date is not None and update_watermark(WATERMARK_FILE, last_date):
+            logger.info(f"Watermark обновлён: {last_date:%d.%m.%Y}")
 
     end_time = time.time()
     elapsed_time = end_time - start_time
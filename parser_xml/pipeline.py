@@ -0,0 +1,255 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date
+
+from logger_config import logger
+from config import (
+    MIN_YEAR,
+    BASE_SAVE_DIR,
+    REGISTRY_PATH,
+    HTTP_CACHE_DIR,
+    HTTP_CACHE_MAX_BYTES,
+    RATE_MAX_DELAY,
+    RATE_METRICS_FILE,
+    MANIFEST_PATH,
+    MANIFEST_CHECKPOINT_EVERY,
+    RESULTS_CACHE_DIR,
+    XLS_READER,
+    PIPELINE_QUEUE_SIZE,
+)
+from archive import XlsArchive
+from http_cache import HttpCache
+from listing import create_session
+from manifest import check_file, load_manifest, save_manifest, store_rows
+from rate_control import RateController
+from registry import STATUS_DOWNLOADED, LinkRegistry, file_name
+from stage_metrics import STAGE
+from utils import ensure_directory_exists, get_absolute_path, get_output_path
+import download_xls
+import parse
+import to_results_csv
+
+
+# Признак конца очереди
+_DONE = None
+
+
+def _crawl(links_queue, since, full, workers):
+    """
+    Производитель (поток): сначала отдаёт в очередь ссылки, не скачанные
+    в прошлых запусках, затем - новые ссылки каждой страницы сразу после
+    её разбора. Очередь ограничена: если загрузчики не успевают, обход
+    ждёт. В конце в очередь кладётся по признаку конца на каждый загрузчик.
+    """
+    seen = set()
+
+    def put_links(links):
+        for link in links:
+            if link["status"] == STATUS_DOWNLOADED or link["id"] in seen:
+                continue
+            seen.add(link["id"])
+            links_queue.put(dict(link))
+
+    try:
+        with LinkRegistry(REGISTRY_PATH) as registry:
+            put_links(registry.pending(min_date=date(MIN_YEAR, 1, 1)))
+        logger.info(f"Ссылок из прошлых запусков: {len(seen)}")
+        parse.main(since=since, full=full, on_links=put_links)
+    except Exception as e:
+        logger.error(f"Ошибка при парсинге ссылок: {e}")
+    finally:
+        for _ in range(workers):
+            links_queue.put(_DONE)
+
+
+def _download(links_queue, files_queue, session, cache, rate, archive):
+    """
+    Загрузчик (поток): скачивает файлы по ссылкам из очереди в архив
+    и передаёт результат (ссылка, путь в архиве, DownloadResult, ошибка)
+    в очередь обработки. Любая ошибка скачивания передаётся как ошибка
+    ссылки: поток не завершается, пока очередь ссылок не разобрана,
+    иначе обход ждал бы места в очереди бесконечно.
+    """
+    try:
+        while True:
+            link = links_queue.get()
+            if link is _DONE:
+                break
+            try:
+                save_path, result, error = download_xls._process_link(
+                    session, cache, rate, link, archive
+                )
+            except Exception as e:
+                STAGE.add("errors")
+                logger.error(f"Ошибка при скачивании файла {link['url']}: {e}")
+                save_path, result, error = None, None, e
+            files_queue.put((link, save_path, result, error))
+    finally:
+        files_queue.put(_DONE)
+
+
+def _store_parsed(manifest, cache_dir, reader, future, pending):
+    """
+    Сохраняет результат обработки файла в кэш результатов.
+    """
+    save_path, sha256 = pending.pop(future)
+    try:
+        processed_data = future.result()
+    except Exception as e:
+        STAGE.add("errors")
+        logger.error(f"Ошибка при обработке файла {save_path}: {e}")
+        return
+    STAGE.add("files_parsed")
+    store_rows(manifest, save_path, sha256, processed_data, cache_dir, reader)
+
+
+def main(
+    workers=1,
+    since=None,
+    full=False,
+    stream=False,
+    reader=XLS_READER,
+    output_format="csv",
+):
+    """
+    Запускает три этапа одновременно, связывая их ограниченными очередями:
+    ссылки передаются загрузчикам сразу после разбора страницы, скачанные
+    файлы - процессам обработки сразу после скачивания. Очереди
+    ограничены PIPELINE_QUEUE_SIZE, поэтому быстрый этап ждёт медленный,
+    а память не растёт. Результаты обработки попадают в кэш результатов
+    (манифест), и итоговый файл собирается этапом results из кэша.
+    """
+    start_time = time.time()
+    base_path = os.path.abspath(os.path.dirname(__file__))
+    manifest_path = get_output_path(base_path, MANIFEST_PATH)
+    cache_dir = get_absolute_path(base_path, RESULTS_CACHE_DIR)
+    ensure_directory_exists(cache_dir)
+    manifest = {} if full else load_manifest(manifest_path)
+
+    archive = XlsArchive(BASE_SAVE_DIR)
+    links_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    files_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+
+    cache = HttpCache(HTTP_CACHE_DIR, HTTP_CACHE_MAX_BYTES)
+    rate = RateController(
+        "pipeline.download",
+        start_delay=0,
+        min_delay=0,
+        max_delay=RATE_MAX_DELAY,
+        max_concurrency=workers,
+    )
+    session = rate.attach(create_session(workers))
+
+    # Потоки-демоны не держат процесс, если основной поток упал
+    threads = [
+        threading.Thread(
+            target=_crawl, args=(links_queue, since, full, workers), daemon=True
+        )
+    ]
+    threads += [
+        threading.Thread(
+            target=_download,
+            args=(links_queue, files_queue, session, cache, rate, archive),
+            daemon=True,
+        )
+        for _ in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+
+    downloaded = failed = 0
+    pending = {}
+    # Файлы архива, уже отправленные в обработку: каждый разбирается один раз
+    parsed = set()
+    # Процессы обработки запускаются через spawn: fork во время работы
+    # потоков обхода и скачивания может унаследовать захваченную ими
+    # блокировку (например, потока вывода лога), и процесс зависнет
+    executor = (
+        ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+        if workers > 1
+        else None
+    )
+    try:
+        with LinkRegistry(REGISTRY_PATH) as registry:
+            finished_downloaders = 0
+            while finished_downloaders < workers:
+                item = files_queue.get()
+                if item is _DONE:
+                    finished_downloaders += 1
+                    continue
+
+                link, save_path, result, error = item
+                if error is not None:
+                    registry.mark_failed(link["url"], error)
+                    failed += 1
+                    continue
+                registry.mark_downloaded(link["url"], save_path, result.sha256)
+                downloaded += 1
+                # Контрольная точка: после сбоя обработанные файлы берутся из кэша
+                if downloaded % MANIFEST_CHECKPOINT_EVERY == 0:
+                    save_manifest(manifest, manifest_path)
+
+                if save_path in parsed or check_file(
+                    manifest, save_path, cache_dir, reader
+                )[0]:
+                    continue
+                parsed.add(save_path)
+                # Имя ссылки "dd.mm.yyyy_<id>" - дата торгов строк файла
+                source = os.path.splitext(file_name(link))[0]
+
+                if executor is None:
+                    with STAGE.timer("parse"):
+                        processed_data = to_results_csv._parse_and_process_file(
+                            save_path, reader, source
+                        )
+                    STAGE.add("files_parsed")
+                    store_rows(
+                        manifest, save_path, result.sha256, processed_data,
+                        cache_dir, reader,
+                    )
+                    continue
+
+                # Не больше двух файлов на процесс в работе: пока они
+                # обрабатываются, очередь скачанных файлов не разбирается
+                while len(pending) >= workers * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        _store_parsed(manifest, cache_dir, reader, future, pending)
+                future = executor.submit(
+                    to_results_csv._parse_and_process_file,
+                    save_path,
+                    reader,
+                    source,
+                )
+                pending[future] = (save_path, result.sha256)
+
+            for future in list(pending):
+                _store_parsed(manifest, cache_dir, reader, future, pending)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        session.close()
+        save_manifest(manifest, manifest_path)
+
+    for thread in threads:
+        thread.join()
+    rate.export(RATE_METRICS_FILE)
+    logger.info(
+        f"Конвейер: скачано файлов {downloaded}, ошибок {failed} "
+        f"за {time.time() - start_time:.2f} секунд."
+    )
+
+    # Итоговый файл: обработанные конвейером файлы берутся из кэша
+    to_results_csv.main(
+        workers=workers,
+        stream=stream,
+        full=False,
+        reader=reader,
+        output_format=output_format,
+    )
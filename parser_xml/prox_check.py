@@ -1,36 +1,250 @@
-import requests
-from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+import argparse
+import asyncio
+import errno
+import time
+from logger_config import logger
+from config import (
+    PROXY_SOURCE_FILE,
+    PROXY_LIST_FILE,
+    PROXY_HEALTH_FILE,
+    PROXY_HEALTH_MAX_AGE,
+    PROXY_CHECK_URL,
+    PROXY_CHECK_CONCURRENCY,
+    PROXY_CHECK_TIMEOUT,
+)
+from proxy_pool import is_fresh, load_health, save_health
+
+
+# Как часто писать в лог ход проверки (каждые N прокси)
+PROGRESS_EVERY = 500
+
+# Дескрипторы, оставляемые под лог, кэш и прочие файлы процесса
+FD_RESERVE = 64
 
+# Ошибки нехватки ресурсов на своей стороне: прокси тут ни при чём
+LOCAL_ERRNOS = {errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.EADDRNOTAVAIL}
 
-def check_proxy(proxy):
+
+def _proxy_url(proxy):
+    """
+    URL прокси для aiohttp: в файлах прокси хранятся как host:port.
+    """
+    return proxy if "://" in proxy else f"http://{proxy}"
+
+
+def _fd_limited(concurrency):
+    """
+    Ограничивает число одновременных проверок лимитом открытых файлов:
+    каждая проверка держит свой сокет. Мягкий лимит по возможности
+    поднимается до жёсткого.
+    """
     try:
-        response = requests.get(
-            "http://httpbin.org/ip", proxies={"http": proxy, "https": proxy}, timeout=5
+        import resource
+    except ImportError:
+        return concurrency
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = concurrency + FD_RESERVE
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        new_soft = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+            soft = new_soft
+        except (ValueError, OSError):
+            pass
+    if soft == resource.RLIM_INFINITY:
+        return concurrency
+    return max(1, min(concurrency, soft - FD_RESERVE))
+
+
+def _is_local_error(error):
+    """
+    Ошибка вызвана нехваткой дескрипторов или сокетов у самого процесса,
+    а не неработающим прокси.
+    """
+    if isinstance(error, aiohttp.ClientConnectorError):
+        error = error.os_error
+    return isinstance(error, OSError) and error.errno in LOCAL_ERRNOS
+
+
+async def check_proxy(session, proxy, target, timeout):
+    """
+    Проверяет один прокси запросом к target. Возвращает запись кэша:
+    alive (ответ 200), latency (с) и error. Возвращает None, если
+    проверку сорвала нехватка ресурсов на своей стороне: такой прокси
+    остаётся непроверенным.
+    """
+    start_time = time.perf_counter()
+    try:
+        async with session.get(
+            target,
+            proxy=_proxy_url(proxy),
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        ) as response:
+            await response.read()
+            status = response.status
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, OSError) as e:
+        if _is_local_error(e):
+            return None
+        return {
+            "alive": False,
+            "latency": None,
+            "checked_at": time.time(),
+            "error": f"{type(e).__name__}: {e}",
+        }
+    latency = time.perf_counter() - start_time
+    return {
+        "alive": status == 200,
+        "latency": round(latency, 4) if status == 200 else None,
+        "checked_at": time.time(),
+        "error": None if status == 200 else f"HTTP {status}",
+    }
+
+
+async def check_proxies(proxies, target, concurrency, timeout):
+    """
+    Проверяет прокси одновременно: не больше concurrency запросов
+    в работе (и не больше, чем позволяет лимит открытых файлов).
+    Возвращает словарь {прокси: запись кэша}; прокси, проверку которых
+    сорвала ошибка на своей стороне, в словарь не попадают.
+    """
+    limited = _fd_limited(concurrency)
+    if limited < concurrency:
+        logger.warning(
+            f"Одновременных проверок: {limited} вместо {concurrency} "
+            f"(лимит открытых файлов)"
         )
-        # Если статус код 200, значит прокси работает
-        if response.status_code == 200:
-            print(f"Прокси {proxy} работает")
-            return proxy
-    except:
-        # Если возникла ошибка, значит прокси не работает
-        print(f"Прокси {proxy} не работает")
-        return None
-
-
-with open("http.txt", "r") as file:
-    proxies = file.read().splitlines()
-
-working_proxies = []
-with ThreadPoolExecutor(max_workers=10) as executor:
-    results = executor.map(check_proxy, proxies)
-    for result in results:
-        if result:
-            working_proxies.append(result)
-
-with open("working_proxies.txt", "w") as file:
-    for proxy in working_proxies:
-        file.write(proxy + "\n")
-
-print(
-    f"Найдено {len(working_proxies)} рабочих прокси. Список сохранен в working_proxies.txt"
-)
+        concurrency = limited
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {}
+    done = 0
+
+    # Соединения не переиспользуются: каждый запрос идёт через свой прокси
+    connector = aiohttp.TCPConnector(limit=concurrency, force_close=True, ssl=False)
+    async with aiohttp.ClientSession(connector=connector) as session:
+
+        async def probe(proxy):
+            nonlocal done
+            try:
+                async with semaphore:
+                    entry = await check_proxy(session, proxy, target, timeout)
+            except Exception as e:
+                logger.warning(f"Прокси {proxy} не проверен: {type(e).__name__}: {e}")
+                entry = None
+            if entry is not None:
+                results[proxy] = entry
+            done += 1
+            if done % PROGRESS_EVERY == 0:
+                alive = sum(entry["alive"] for entry in results.values())
+                logger.info(
+                    f"Проверено прокси: {done} из {len(proxies)}, рабочих: {alive}"
+                )
+
+        await asyncio.gather(
+            *(probe(proxy) for proxy in proxies), return_exceptions=True
+        )
+    return results
+
+
+def _load_proxy_list(file_path):
+    """
+    Загружает список прокси без пустых строк и повторов.
+    """
+    with open(file_path, "r") as file:
+        return list(dict.fromkeys(line.strip() for line in file if line.strip()))
+
+
+def main(
+    source=PROXY_SOURCE_FILE,
+    output=PROXY_LIST_FILE,
+    health_path=PROXY_HEALTH_FILE,
+    target=PROXY_CHECK_URL,
+    concurrency=PROXY_CHECK_CONCURRENCY,
+    timeout=PROXY_CHECK_TIMEOUT,
+    max_age=PROXY_HEALTH_MAX_AGE,
+    recheck=False,
+):
+    """
+    Проверяет прокси из source и сохраняет рабочие (от быстрых к медленным)
+    в output. Результаты проверки с задержкой каждого прокси пишутся
+    в кэш health_path: прокси, проверенные не раньше max_age секунд назад,
+    повторно не проверяются (если не задан recheck), а proxi_parser.py
+    по этому кэшу пропускает нерабочие прокси.
+    """
+    start_time = time.time()
+    proxies = _load_proxy_list(source)
+    health = load_health(health_path)
+
+    now = time.time()
+    to_check = [
+        proxy
+        for proxy in proxies
+        if recheck or not is_fresh(health.get(proxy), max_age, now)
+    ]
+    logger.info(
+        f"Прокси в списке: {len(proxies)}, к проверке: {len(to_check)}, "
+        f"из кэша: {len(proxies) - len(to_check)} ({target})"
+    )
+
+    if to_check:
+        checked = asyncio.run(check_proxies(to_check, target, concurrency, timeout))
+        if len(checked) < len(to_check):
+            logger.warning(
+                f"Не проверено из-за ошибок на своей стороне: "
+                f"{len(to_check) - len(checked)} прокси"
+            )
+        health.update(checked)
+        save_health(health_path, health)
+
+    working_proxies = sorted(
+        (proxy for proxy in proxies if health.get(proxy, {}).get("alive")),
+        key=lambda proxy: health[proxy]["latency"],
+    )
+    with open(output, "w") as file:
+        for proxy in working_proxies:
+            file.write(proxy + "\n")
+
+    elapsed_time = time.time() - start_time
+    logger.info(
+        f"Найдено {len(working_proxies)} рабочих прокси из {len(proxies)} "
+        f"за {elapsed_time:.2f} секунд. Список сохранен в {output}"
+    )
+    return working_proxies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Проверка списка прокси.")
+    parser.add_argument(
+        "--source", default=PROXY_SOURCE_FILE,
+        help=f"Файл со списком прокси host:port (по умолчанию {PROXY_SOURCE_FILE})."
+    )
+    parser.add_argument(
+        "--output", default=PROXY_LIST_FILE,
+        help=f"Куда сохранить рабочие прокси (по умолчанию {PROXY_LIST_FILE})."
+    )
+    parser.add_argument(
+        "--target", default=PROXY_CHECK_URL,
+        help="URL проверочного запроса (например, локальный тестовый сервер)."
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=PROXY_CHECK_CONCURRENCY,
+        help=f"Одновременных проверок (по умолчанию {PROXY_CHECK_CONCURRENCY})."
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=PROXY_CHECK_TIMEOUT,
+        help=f"Таймаут проверки одного прокси, с (по умолчанию {PROXY_CHECK_TIMEOUT})."
+    )
+    parser.add_argument(
+        "--recheck", action="store_true",
+        help="Проверить все прокси заново, не используя кэш проверки."
+    )
+    args = parser.parse_args()
+    main(
+        source=args.source,
+        output=args.output,
+        target=args.target,
+        concurrency=args.concurrency,
+        timeout=args.timeout,
+        recheck=args.recheck,
+    )
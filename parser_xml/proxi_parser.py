@@ -1,46 +1,36 @@
 import requests
-from bs4 import BeautifulSoup
 import time
-import pandas as pd
 import os
 from logger_config import logger
-from config import BASE_URL, BASE_DOMAIN, MIN_YEAR
-import random
-
-
-def _extract_xls_links_and_dates(soup):
-    """
-    Извлекает все ссылки на XLS-файлы и даты торгов с текущей страницы.
-    """
-    xls_links = []
-    dates = []
-
-    for item in soup.find_all("div", class_="accordeon-inner__item"):
-        link_element = item.find("a", class_="accordeon-inner__item-title link xls")
-        if link_element:
-            xls_links.append(link_element["href"])
-        else:
-            xls_links.append(None)
-        date_element = soup.select_one(
-            "html body main section div div:nth-of-type(2) div div div:nth-of-type(2) div:nth-of-type(1) div div:nth-of-type(1) div:nth-of-type(5) div div:nth-of-type(2) div p span"
-        )
-        if date_element:
-            date = date_element.text.strip()
-            dates.append(date)
-        else:
-            dates.append(None)
-
-    return xls_links, dates
-
-
-def _get_next_page_url(soup):
-    """
-    Извлекает ссылку на следующую страницу из пагинации.
-    """
-    next_page_link = soup.find("li", class_="bx-pag-next")
-    if next_page_link and next_page_link.find("a"):
-        return next_page_link.find("a")["href"]
-    return None
+from config import (
+    BASE_URL,
+    BASE_DOMAIN,
+    MIN_YEAR,
+    WATERMARK_FILE,
+    REGISTRY_PATH,
+    HTTP_CACHE_DIR,
+    HTTP_CACHE_MAX_BYTES,
+    RATE_START_DELAY,
+    RATE_MIN_DELAY,
+    RATE_MAX_DELAY,
+    RATE_METRICS_FILE,
+    PROXY_LIST_FILE,
+    PROXY_SCORES_FILE,
+    PROXY_COOLDOWN,
+    PROXY_QUARANTINE,
+    PROXY_MAX_FAILURES,
+    PROXY_HEALTH_FILE,
+    PROXY_HEALTH_MAX_AGE,
+)
+from http_cache import HttpCache, get_text
+from proxy_pool import ProxyPool, load_health, skip_dead
+from rate_control import RateController
+from registry import LinkRegistry
+from listing import create_session, filter_new, parse_page, stop_page
+from watermark import newest_date, resolve_watermark, update_watermark
+
+# Ошибки соединения с прокси: штрафуют прокси, но не темп запросов к сайту
+PROXY_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
 
 
 def _validate_date(date):
@@ -61,27 +51,16 @@ def _validate_date(date):
     return True
 
 
-def _save_to_csv(dates, xls_links):
+def _save_links(registry, dates, xls_links):
     """
-    Сохраняет данные в CSV-файл, добавляя новые данные в существующий файл.
+    Сохраняет ссылки в реестр, пропуская уже известные.
     """
-    data = {
-        "Дата торгов": dates,
-        "Ссылка на скачивание": [
-            BASE_DOMAIN + link if link else None for link in xls_links
-        ],
-    }
-    df = pd.DataFrame(data)
-
-    df = df[df["Дата торгов"].notna() & df["Ссылка на скачивание"].notna()]
-
-    file_path = "raw/trading_results.csv"
-    if os.path.exists(file_path):
-        df.to_csv(file_path, mode="a", header=False, index=False, encoding="utf-8")
-    else:
-        df.to_csv(file_path, index=False, encoding="utf-8")
-
-    logger.info(f"Данные сохранены в файл: {file_path}")
+    new_links = registry.add_links(
+        dates, [BASE_DOMAIN + link if link else None for link in xls_links]
+    )
+    logger.info(
+        f"Новых ссылок: {new_links} из {len(xls_links)} ({REGISTRY_PATH})"
+    )
 
 
 def _ensure_raw_folder_exists():
@@ -93,101 +72,170 @@ def _ensure_raw_folder_exists():
         logger.info("Папка 'raw' создана.")
 
 
-def _load_proxies(file_path):
+def _log_rate(rate):
     """
-    Загружает прокси из файла.
+    Сохраняет метрики регулятора темпа запросов и выводит итог в лог.
     """
-    with open(file_path, "r") as file:
-        proxies = [line.strip() for line in file.readlines()]
-    return proxies
+    metrics = rate.export(RATE_METRICS_FILE)
+    logger.info(
+        f"Темп запросов: {metrics['throughput']} запр./с, "
+        f"пауза {metrics['delay']} с, одновременно {metrics['concurrency']}, "
+        f"снижений темпа: {sum(metrics['backoffs'].values())} ({RATE_METRICS_FILE})"
+    )
 
 
-def _get_random_proxy(proxies):
+def _load_proxies(file_path):
     """
-    Возвращает случайный прокси из списка.
+    Загружает прокси из файла (пустые строки пропускаются).
     """
-    return random.choice(proxies)
+    try:
+        with open(file_path, "r") as file:
+            return [line.strip() for line in file if line.strip()]
+    except OSError as e:
+        logger.error(f"Ошибка при чтении файла {file_path}: {e}")
+        return []
 
 
-def _process_page(page_url, page_counter, proxies):
+def _fetch_page(session, cache, rate, page_url, pool):
     """
-    Обрабатывает одну страницу, извлекает данные и сохраняет их.
+    Загружает страницу через прокси из пула и разбирает её один раз.
+    Оба протокола идут через один выбранный прокси. При ошибке
+    соединения или таймауте прокси уходит на паузу или в карантин,
+    попытка повторяется с другим. None - если в пуле не осталось
+    доступных прокси или сайт ответил ошибкой. Пауза перед запросом
+    задаётся регулятором темпа rate; ошибки прокси темп сайта не снижают.
     """
-    logger.info(f"Обрабатывается страница {page_counter}...")
-
-    # Используем случайный прокси
-    proxy = _get_random_proxy(proxies)
-    proxies_dict = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
-
-    try:
-        response = requests.get(
-            page_url, proxies=proxies_dict, timeout=15
-        )  # Увеличен таймаут
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        logger.error(
-            f"Ошибка при загрузке страницы {page_url} через прокси {proxy}: {e}"
-        )
-        # Удаляем неработающий прокси из списка
-        proxies.remove(proxy)
-        if proxies:
-            return _process_page(
-                page_url, page_counter, proxies
-            )  # Повторяем попытку с другим прокси
-        else:
+    while True:
+        proxy = pool.acquire()
+        if proxy is None:
             logger.error("Нет доступных прокси. Остановка парсинга.")
             return None
+        proxies_dict = {"http": f"http://{proxy}", "https": f"http://{proxy}"}
+
+        try:
+            with rate.slot(ignore=PROXY_ERRORS):
+                start_time = time.perf_counter()
+                text = get_text(
+                    session, cache, page_url, proxies=proxies_dict, timeout=15
+                )  # Увеличен таймаут
+        except PROXY_ERRORS as e:
+            logger.error(
+                f"Ошибка при загрузке страницы {page_url} через прокси {proxy}: {e}"
+            )
+            if pool.report_failure(proxy):
+                logger.warning(f"Прокси {proxy} отправлен в карантин.")
+            continue
+        except requests.exceptions.RequestException as e:
+            # Ошибка сайта (404, 429, 5xx), а не прокси: статус ответа
+            # уже учтён регулятором темпа, прокси не штрафуется
+            logger.error(f"Ошибка при загрузке страницы {page_url}: {e}")
+            return None
+
+        pool.report_success(proxy, time.perf_counter() - start_time)
+        return parse_page(page_url, text)
+
+
+def _process_page(
+    session, cache, rate, page_url, page_counter, pool, watermark, registry
+):
+    """
+    Обрабатывает одну страницу, извлекает данные и сохраняет ссылки
+    не старше watermark. Возвращает PageResult только с новыми ссылками
+    или None при ошибке загрузки.
+    """
+    logger.info(f"Обрабатывается страница {page_counter}...")
 
-    soup = BeautifulSoup(response.text, "html.parser")
-    xls_links, dates = _extract_xls_links_and_dates(soup)
+    page = _fetch_page(session, cache, rate, page_url, pool)
+    if page is None:
+        return None
 
-    for date in dates:
+    for date in page.dates:
         if date and not _validate_date(date):
-            return None
+            return stop_page(page)
 
-    _save_to_csv(dates, xls_links)
-    return _get_next_page_url(soup)
+    page = filter_new(page, watermark)
+    if page.dates:
+        _save_links(registry, page.dates, page.xls_links)
+    if page.reached_watermark:
+        logger.info(f"Достигнута уже собранная дата торгов {watermark:%d.%m.%Y}.")
+    return page
 
 
-def main():
+def main(since=None, full=False):
+    """
+    Собирает ссылки на XLS-файлы новее сохранённого watermark.
+    since (date) - собрать ссылки начиная с этой даты,
+    full - обойти все страницы до MIN_YEAR.
+    """
     _ensure_raw_folder_exists()
 
     start_time = time.time()
     logger.info("Начало парсинга...")
 
-    # Загружаем прокси из файла
-    proxies = _load_proxies("working_proxies.txt")
-    if not proxies:
-        logger.error("Нет доступных прокси. Проверьте файл working_proxies.txt.")
+    # Загружаем прокси из файла без заведомо нерабочих (по кэшу
+    # prox_check.py), оценки прокси - из прошлых запусков
+    health = load_health(PROXY_HEALTH_FILE)
+    proxies = _load_proxies(PROXY_LIST_FILE)
+    alive_proxies = skip_dead(proxies, health, PROXY_HEALTH_MAX_AGE)
+    if len(alive_proxies) < len(proxies):
+        logger.info(
+            f"Пропущено нерабочих прокси по {PROXY_HEALTH_FILE}: "
+            f"{len(proxies) - len(alive_proxies)}"
+        )
+    if not alive_proxies:
+        logger.error(f"Нет доступных прокси. Проверьте файл {PROXY_LIST_FILE}.")
         return
-
+    pool = ProxyPool(
+        alive_proxies,
+        state_path=PROXY_SCORES_FILE,
+        health=health,
+        cooldown=PROXY_COOLDOWN,
+        quarantine=PROXY_QUARANTINE,
+        max_failures=PROXY_MAX_FAILURES,
+    )
+    logger.info(f"Прокси в пуле: {len(pool)}, доступно: {pool.available()}")
+
+    watermark = resolve_watermark(WATERMARK_FILE, since, full)
+    cache = HttpCache(HTTP_CACHE_DIR, HTTP_CACHE_MAX_BYTES)
+    rate = RateController(
+        "proxi_parser",
+        start_delay=RATE_START_DELAY,
+        min_delay=RATE_MIN_DELAY,
+        max_delay=RATE_MAX_DELAY,
+        max_concurrency=1,
+    )
     page_url = BASE_URL
     page_counter = 1
     total_files = 0
-
-    while page_url:
-        next_page_url = _process_page(page_url, page_counter, proxies)
-        if next_page_url:
-            page_url = BASE_DOMAIN + next_page_url
-            page_counter += 1
-            total_files += len(
-                _extract_xls_links_and_dates(
-                    BeautifulSoup(
-                        requests.get(
-                            page_url,
-                            proxies={
-                                "http": f"http://{_get_random_proxy(proxies)}",
-                                "https": f"http://{_get_random_proxy(proxies)}",
-                            },
-                        ).text,
-                        "html.parser",
-                    )
-                )[0]
+    last_date = None
+    completed = True
+
+    with LinkRegistry(REGISTRY_PATH) as registry, create_session() as session:
+        rate.attach(session)
+        while page_url:
+            page = _process_page(
+                session, cache, rate, page_url, page_counter, pool, watermark, registry
             )
-            time.sleep(2)  # Добавляем задержку между запросами
-        else:
-            logger.info("Достигнута последняя страница.")
-            break
+            if page is None:
+                completed = False
+                break
+
+            total_files += page.file_count
+            last_date = newest_date(page.dates, last_date)
+            if page.next_page_url:
+                page_url = BASE_DOMAIN + page.next_page_url
+                page_counter += 1
+            else:
+                if not page.reached_watermark:
+                    logger.info("Достигнута последняя страница.")
+                break
+
+    pool.save()
+    _log_rate(rate)
+
+    if completed and last_date is not None:
+        if update_watermark(WATERMARK_FILE, last_date):
+            logger.info(f"Watermark обновлён: {last_date:%d.%m.%Y}")
 
     end_time = time.time()
     elapsed_time = end_time - start_time
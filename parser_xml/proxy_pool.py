@@ -0,0 +1,238 @@
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+
+# Вес сглаживания EWMA задержки и доли успешных запросов
+DEFAULT_ALPHA = 0.3
+
+# Пауза после ошибки прокси (удваивается с каждой ошибкой подряд), с
+DEFAULT_COOLDOWN = 30
+
+# Карантин после max_failures ошибок подряд, с
+DEFAULT_QUARANTINE = 600
+
+DEFAULT_MAX_FAILURES = 3
+
+# Минимальная доля веса: медленные и новые прокси тоже иногда выбираются
+MIN_WEIGHT_SHARE = 0.05
+
+
+@dataclass
+class ProxyScore:
+    """
+    Оценка одного прокси: EWMA задержки (с) и доли успешных запросов,
+    число ошибок подряд и время (unix), до которого прокси не выбирается.
+    """
+    latency: float = None
+    success: float = 1.0
+    failures: int = 0
+    available_at: float = 0.0
+    quarantines: int = 0
+
+
+class ProxyPool:
+    """
+    Пул прокси с оценками вместо случайного выбора и удаления.
+
+    Прокси выбирается случайно с весом success / latency: быстрые
+    и надёжные прокси выбираются чаще, остальные - не реже доли
+    MIN_WEIGHT_SHARE от среднего веса. После ошибки прокси уходит
+    на паузу cooldown (удваивается с каждой ошибкой подряд), после
+    max_failures ошибок подряд - в карантин на quarantine секунд.
+    Оценки и карантин сохраняются в JSON-файл state_path между запусками.
+    Для прокси без замеров начальная задержка берётся из кэша проверки
+    health (prox_check.py).
+    """
+
+    def __init__(
+        self,
+        proxies,
+        state_path=None,
+        alpha=DEFAULT_ALPHA,
+        cooldown=DEFAULT_COOLDOWN,
+        quarantine=DEFAULT_QUARANTINE,
+        max_failures=DEFAULT_MAX_FAILURES,
+        health=None,
+        rng=None,
+    ):
+        self.state_path = state_path
+        self.alpha = alpha
+        self.cooldown = cooldown
+        self.quarantine = quarantine
+        self.max_failures = max_failures
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+
+        saved = self._load_state()
+        self.scores = {
+            proxy: saved.get(proxy, ProxyScore()) for proxy in dict.fromkeys(proxies)
+        }
+        for proxy, score in self.scores.items():
+            entry = (health or {}).get(proxy)
+            if score.latency is None and entry and entry.get("latency"):
+                score.latency = entry["latency"]
+
+    def __len__(self):
+        return len(self.scores)
+
+    def _load_state(self):
+        if not self.state_path:
+            return {}
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            return {proxy: ProxyScore(**score) for proxy, score in data.items()}
+        except (OSError, ValueError, TypeError, AttributeError):
+            return {}
+
+    def save(self):
+        """
+        Атомарно сохраняет оценки в state_path. Оценки прокси, которых
+        нет в текущем списке, сохраняются из прежнего файла.
+        """
+        if not self.state_path:
+            return
+        data = {proxy: asdict(score) for proxy, score in self._load_state().items()}
+        with self._lock:
+            data.update({proxy: asdict(score) for proxy, score in self.scores.items()})
+
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def _weights(self, candidates):
+        latencies = [
+            self.scores[proxy].latency
+            for proxy in candidates
+            if self.scores[proxy].latency
+        ]
+        # Прокси без замеров получают среднюю задержку
+        default_latency = sum(latencies) / len(latencies) if latencies else 1.0
+        weights = [
+            self.scores[proxy].success / (self.scores[proxy].latency or default_latency)
+            for proxy in candidates
+        ]
+        floor = MIN_WEIGHT_SHARE * sum(weights) / len(weights)
+        return [max(weight, floor) for weight in weights]
+
+    def acquire(self, wait=True):
+        """
+        Выбирает прокси с весом по оценке. Если все прокси на паузе
+        и wait, ждёт окончания ближайшей паузы. Возвращает None, если
+        все прокси в карантине (или на паузе и не wait).
+        """
+        while True:
+            with self._lock:
+                now = time.time()
+                candidates = [
+                    proxy
+                    for proxy, score in self.scores.items()
+                    if score.available_at <= now
+                ]
+                if candidates:
+                    weights = self._weights(candidates) if len(candidates) > 1 else None
+                    return self.rng.choices(candidates, weights=weights)[0]
+
+                cooling = [
+                    score.available_at
+                    for score in self.scores.values()
+                    if score.failures < self.max_failures
+                ]
+                if not cooling or not wait:
+                    return None
+                delay = min(cooling) - now
+            time.sleep(max(delay, 0))
+
+    def report_success(self, proxy, latency):
+        """
+        Учитывает успешный запрос через proxy за latency секунд.
+        """
+        with self._lock:
+            score = self.scores[proxy]
+            if score.latency is None:
+                score.latency = latency
+            else:
+                score.latency += self.alpha * (latency - score.latency)
+            score.success += self.alpha * (1.0 - score.success)
+            score.failures = 0
+            score.available_at = 0.0
+
+    def report_failure(self, proxy):
+        """
+        Учитывает ошибку запроса через proxy: пауза или карантин.
+        Возвращает True, если прокси отправлен в карантин.
+        """
+        with self._lock:
+            score = self.scores[proxy]
+            score.success -= self.alpha * score.success
+            score.failures += 1
+            if score.failures >= self.max_failures:
+                score.quarantines += 1
+                score.available_at = time.time() + self.quarantine
+                return True
+            score.available_at = time.time() + self.cooldown * 2 ** (score.failures - 1)
+            return False
+
+    def available(self):
+        """
+        Количество прокси, которые можно выбрать сейчас.
+        """
+        now = time.time()
+        with self._lock:
+            return sum(score.available_at <= now for score in self.scores.values())
+
+
+def load_health(path):
+    """
+    Читает кэш проверки прокси (prox_check.py): для каждого прокси
+    alive, latency (с), checked_at (unix) и error. Возвращает пустой
+    словарь, если файла нет или он повреждён.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_health(path, health):
+    """
+    Атомарно сохраняет кэш проверки прокси.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(health, file, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def is_fresh(entry, max_age, now=None):
+    """
+    Проверка прокси из кэша не старше max_age секунд.
+    """
+    now = time.time() if now is None else now
+    return entry is not None and now - entry.get("checked_at", 0) <= max_age
+
+
+def skip_dead(proxies, health, max_age):
+    """
+    Убирает из списка прокси, которые по свежей проверке из кэша
+    не работают. Непроверенные и давно проверенные прокси остаются.
+    """
+    now = time.time()
+    return [
+        proxy
+        for proxy in proxies
+        if not (is_fresh(health.get(proxy), max_age, now) and not health[proxy]["alive"])
+    ]
@@ -0,0 +1,322 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+
+STATUS_TOO_MANY_REQUESTS = 429
+
+# Решения контроллера, которые хранятся для метрик
+HISTORY_SIZE = 100
+
+# Пауза после снижения темпа, если до этого пауза была нулевой, с
+MIN_BACKOFF_DELAY = 0.1
+
+
+def _is_timeout(error):
+    return isinstance(error, (TimeoutError, asyncio.TimeoutError)) or (
+        "Timeout" in type(error).__name__
+    )
+
+
+def _has_response(error):
+    """
+    Ошибка со статусом ответа (HTTPError requests, ClientResponseError
+    aiohttp) уже учтена по ответу - повторно её не записываем.
+    """
+    return getattr(error, "response", None) is not None or hasattr(error, "status")
+
+
+def parse_retry_after(headers):
+    """
+    Значение Retry-After в секундах (формат даты не поддерживается).
+    """
+    value = headers.get("Retry-After") if headers else None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateController:
+    """
+    AIMD-регулятор темпа запросов к одному сайту.
+
+    Каждый успешный ответ без всплеска задержки аддитивно увеличивает
+    темп: +rate_step запросов в секунду (пауза между запросами
+    сокращается) и примерно +1 к числу одновременных запросов за окно.
+    Ответ 429, ошибка 5xx, таймаут или задержка выше latency_factor от
+    средней (EWMA) мультипликативно уменьшают темп и число одновременных
+    запросов в backoff_factor раз, не чаще одного раза за среднее время
+    ответа. Retry-After учитывается как минимальная пауза.
+
+    Контроллер общий для requests (slot() и attach()), aiohttp
+    (async_slot() и trace_config()) и Scrapy (AimdThrottleMiddleware
+    в parser_spimex.middlewares). Решения и достигнутый темп доступны
+    через metrics() и export().
+    """
+
+    def __init__(
+        self,
+        name,
+        start_delay=2.0,
+        min_delay=0.2,
+        max_delay=60.0,
+        max_concurrency=16,
+        start_concurrency=1,
+        rate_step=0.1,
+        backoff_factor=0.5,
+        latency_factor=3.0,
+        warmup=5,
+    ):
+        self.name = name
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_concurrency = max_concurrency
+        self.rate_step = rate_step
+        self.backoff_factor = backoff_factor
+        self.latency_factor = latency_factor
+        self.warmup = warmup
+
+        self.delay = start_delay
+        self.concurrency = float(start_concurrency)
+        self.latency_ewma = None
+        self.active = 0
+
+        self.started_at = time.monotonic()
+        self.requests = 0
+        self.successes = 0
+        self.backoffs = {}
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self._latency_samples = 0
+        self._last_backoff = 0.0
+        self._next_start = 0.0
+
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._async_condition = None
+
+    @property
+    def limit(self):
+        """
+        Текущее допустимое число одновременных запросов.
+        """
+        return max(1, int(self.concurrency))
+
+    def record(self, latency, status=None, error=None, retry_after=None):
+        """
+        Учитывает результат запроса и пересчитывает темп.
+        Возвращает причину снижения темпа или None.
+        """
+        with self._condition:
+            self.requests += 1
+            reason = self._classify(latency, status, error)
+            if reason is None:
+                self._increase(latency)
+            else:
+                self._backoff(reason, retry_after)
+            self._condition.notify_all()
+        return reason
+
+    def _classify(self, latency, status, error):
+        if error is not None:
+            return "timeout" if _is_timeout(error) else "error"
+        if status == STATUS_TOO_MANY_REQUESTS:
+            return "throttled"
+        if status is not None and status >= 500:
+            return "server_error"
+        if (
+            self._latency_samples >= self.warmup
+            and latency > self.latency_factor * self.latency_ewma
+        ):
+            return "latency"
+        return None
+
+    def _increase(self, latency):
+        self.successes += 1
+        self._latency_samples += 1
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma = 0.8 * self.latency_ewma + 0.2 * latency
+
+        if self.delay > 0:
+            rate = 1 / self.delay + self.rate_step
+            self.delay = max(self.min_delay, 1 / rate)
+        self.concurrency = min(
+            self.max_concurrency, self.concurrency + 1 / self.concurrency
+        )
+
+    def _backoff(self, reason, retry_after):
+        self.backoffs[reason] = self.backoffs.get(reason, 0) + 1
+
+        now = time.monotonic()
+        window = self.latency_ewma or self.delay
+        if now - self._last_backoff >= window:
+            self._last_backoff = now
+            self.delay = min(
+                self.max_delay,
+                max(MIN_BACKOFF_DELAY, self.delay / self.backoff_factor),
+            )
+            self.concurrency = max(1.0, self.concurrency * self.backoff_factor)
+        if retry_after:
+            self.delay = min(self.max_delay, max(self.delay, retry_after))
+        self.history.append(
+            {
+                "at": round(now - self.started_at, 3),
+                "reason": reason,
+                "delay": round(self.delay, 3),
+                "concurrency": self.limit,
+            }
+        )
+
+    def _reserve_start(self):
+        """
+        Резервирует время старта следующего запроса (под блокировкой).
+        Возвращает, сколько нужно подождать до старта.
+        """
+        now = time.monotonic()
+        start = max(now, self._next_start)
+        self._next_start = start + self.delay
+        self.active += 1
+        return start - now
+
+    def _release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, ignore=()):
+        """
+        Слот для синхронного запроса: ждёт свободного места в пределах
+        limit и паузы delay после предыдущего старта. Ошибки без ответа
+        (таймауты, обрывы соединения) записываются как снижение темпа,
+        кроме ошибок типов ignore (например, ошибок прокси, а не сайта).
+        """
+        with self._condition:
+            while self.active >= self.limit:
+                self._condition.wait()
+            wait = self._reserve_start()
+        if wait > 0:
+            time.sleep(wait)
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if not _has_response(e) and not isinstance(e, ignore):
+                self.record(time.monotonic() - start, error=e)
+            raise
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """
+        Слот для запроса в asyncio: то же, что slot(), без блокировки
+        цикла событий.
+        """
+        if self._async_condition is None:
+            self._async_condition = asyncio.Condition()
+        async with self._async_condition:
+            await self._async_condition.wait_for(lambda: self.active < self.limit)
+            with self._lock:
+                wait = self._reserve_start()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if not _has_response(e):
+                self.record(time.monotonic() - start, error=e)
+            raise
+        finally:
+            self._release()
+            async with self._async_condition:
+                self._async_condition.notify_all()
+
+    def attach(self, session):
+        """
+        Подключает контроллер к requests.Session: каждый ответ
+        (время до заголовков и статус) записывается через hook.
+        Ошибки без ответа записывает slot().
+        """
+        def hook(response, *args, **kwargs):
+            self.record(
+                response.elapsed.total_seconds(),
+                status=response.status_code,
+                retry_after=parse_retry_after(response.headers),
+            )
+            return response
+
+        session.hooks["response"].append(hook)
+        return session
+
+    def trace_config(self):
+        """
+        aiohttp.TraceConfig, записывающий время и статус каждого ответа.
+        Ошибки без ответа записывает async_slot(). aiohttp импортируется
+        только здесь.
+        """
+        import aiohttp
+
+        async def on_request_start(session, context, params):
+            context.started_at = time.monotonic()
+
+        async def on_request_end(session, context, params):
+            self.record(
+                time.monotonic() - context.started_at,
+                status=params.response.status,
+                retry_after=parse_retry_after(params.response.headers),
+            )
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        return trace_config
+
+    def metrics(self):
+        """
+        Текущее состояние и решения контроллера.
+        """
+        with self._lock:
+            elapsed = time.monotonic() - self.started_at
+            return {
+                "requests": self.requests,
+                "successes": self.successes,
+                "backoffs": dict(self.backoffs),
+                "delay": round(self.delay, 3),
+                "rate_per_second": round(1 / self.delay, 3) if self.delay else None,
+                "concurrency": self.limit,
+                "latency_ewma": (
+                    round(self.latency_ewma, 4) if self.latency_ewma is not None else None
+                ),
+                "elapsed": round(elapsed, 3),
+                "throughput": round(self.requests / elapsed, 3) if elapsed else 0.0,
+                "decisions": list(self.history),
+            }
+
+    def export(self, path):
+        """
+        Сохраняет метрики в JSON-файл path под ключом name
+        (метрики других контроллеров в файле сохраняются).
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            data = {}
+        data[self.name] = self.metrics()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return data[self.name]
@@ -0,0 +1,223 @@
+import csv
+import datetime
+import os
+import sqlite3
+
+
+STATUS_PENDING = "pending"
+STATUS_DOWNLOADED = "downloaded"
+STATUS_FAILED = "failed"
+
+# Формат дат торгов на странице и в именах скачанных файлов
+DATE_FORMAT = "%d.%m.%Y"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS links (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    trade_date TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    file_path TEXT,
+    sha256 TEXT,
+    error TEXT,
+    added_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS links_trade_date ON links (trade_date);
+CREATE INDEX IF NOT EXISTS links_status ON links (status, trade_date);
+"""
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def _iso_date(date):
+    """
+    Преобразует дату торгов "dd.mm.yyyy" в "yyyy-mm-dd" (для сортировки
+    и сравнения в SQLite). Возвращает None для некорректной даты.
+    """
+    try:
+        return datetime.datetime.strptime(date.strip(), DATE_FORMAT).date().isoformat()
+    except (AttributeError, ValueError):
+        return None
+
+
+class LinkRegistry:
+    """
+    Реестр ссылок на XLS-файлы в SQLite: ключ - URL, индекс - дата торгов.
+    Хранит статус скачивания и SHA-256 скачанного файла. Для архива
+    XLS-файлов (archive.py) реестр - индекс дата торгов и URL -> файл:
+    ссылки с одинаковым содержимым указывают на один файл архива.
+
+    База открывается в режиме WAL: несколько процессов (парсеры ссылок,
+    паук, загрузчик) могут писать одновременно, конфликтующие записи
+    ждут до timeout секунд. Каждый процесс открывает своё подключение.
+    """
+
+    def __init__(self, path, timeout=30):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=timeout)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def add_links(self, dates, urls):
+        """
+        Добавляет ссылки с датами торгов "dd.mm.yyyy". Уже известные ссылки
+        и строки без даты или ссылки пропускаются. Возвращает количество
+        новых ссылок.
+        """
+        now = _now()
+        rows = [
+            (url, _iso_date(date), now, now)
+            for date, url in zip(dates, urls)
+            if date and url and _iso_date(date)
+        ]
+        with self.connection:
+            before = self.connection.total_changes
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO links (url, trade_date, added_at, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            return self.connection.total_changes - before
+
+    def is_known(self, url):
+        """
+        Проверяет, есть ли ссылка в реестре (поиск по уникальному индексу).
+        """
+        row = self.connection.execute(
+            "SELECT 1 FROM links WHERE url = ?", (url,)
+        ).fetchone()
+        return row is not None
+
+    def count(self, status=None):
+        """
+        Количество ссылок в реестре (всего или с указанным статусом).
+        """
+        if status is None:
+            return self.connection.execute("SELECT COUNT(*) FROM links").fetchone()[0]
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM links WHERE status = ?", (status,)
+        ).fetchone()[0]
+
+    def find(self, urls):
+        """
+        Возвращает записи реестра для указанных ссылок (поля id, url,
+        trade_date и status, как у pending()). Неизвестные ссылки пропускаются.
+        """
+        rows = []
+        urls = list(urls)
+        # Ограничение SQLite на число параметров запроса
+        for start in range(0, len(urls), 500):
+            chunk = urls[start:start + 500]
+            rows.extend(
+                self.connection.execute(
+                    "SELECT id, url, trade_date, status FROM links "
+                    f"WHERE url IN ({', '.join('?' * len(chunk))}) "
+                    "ORDER BY trade_date, id",
+                    chunk,
+                ).fetchall()
+            )
+        return rows
+
+    def pending(self, min_date=None):
+        """
+        Возвращает ссылки, которые ещё не скачаны (новые и с ошибкой),
+        от старых дат торгов к новым. Каждая запись - sqlite3.Row
+        с полями id, url, trade_date ("yyyy-mm-dd") и status.
+        min_date (date) - только ссылки не раньше этой даты.
+        """
+        query = (
+            "SELECT id, url, trade_date, status FROM links "
+            "WHERE status IN (?, ?)"
+        )
+        params = [STATUS_PENDING, STATUS_FAILED]
+        if min_date is not None:
+            query += " AND trade_date >= ?"
+            params.append(min_date.isoformat())
+        query += " ORDER BY trade_date, id"
+        return self.connection.execute(query, params).fetchall()
+
+    def downloaded(self):
+        """
+        Возвращает скачанные ссылки с полями id, url, trade_date,
+        file_path и sha256.
+        """
+        return self.connection.execute(
+            "SELECT id, url, trade_date, file_path, sha256 FROM links "
+            "WHERE status = ? ORDER BY trade_date, id",
+            (STATUS_DOWNLOADED,),
+        ).fetchall()
+
+    def blobs(self):
+        """
+        Возвращает уникальные скачанные файлы (по SHA-256) от старых дат
+        торгов к новым парами (file_path, имена): имена "dd.mm.yyyy_<id>"
+        (file_name без расширения) всех ссылок на файл по порядку дат торгов.
+        """
+        blobs = {}
+        for link in self.downloaded():
+            if not link["sha256"]:
+                continue
+            _, names = blobs.setdefault(link["sha256"], (link["file_path"], []))
+            names.append(os.path.splitext(file_name(link))[0])
+        return list(blobs.values())
+
+    def mark_downloaded(self, url, file_path, sha256):
+        """
+        Отмечает ссылку скачанной и сохраняет путь и хеш файла.
+        """
+        with self.connection:
+            self.connection.execute(
+                "UPDATE links SET status = ?, file_path = ?, sha256 = ?, "
+                "error = NULL, updated_at = ? WHERE url = ?",
+                (STATUS_DOWNLOADED, file_path, sha256, _now(), url),
+            )
+
+    def mark_failed(self, url, error):
+        """
+        Отмечает ошибку скачивания: ссылка останется в pending().
+        """
+        with self.connection:
+            self.connection.execute(
+                "UPDATE links SET status = ?, error = ?, updated_at = ? WHERE url = ?",
+                (STATUS_FAILED, str(error), _now(), url),
+            )
+
+    def import_csv(self, csv_file):
+        """
+        Переносит ссылки из прежнего raw/trading_results.csv
+        (столбцы "Дата торгов" и "Ссылка на скачивание").
+        Возвращает количество новых ссылок.
+        """
+        with open(csv_file, "r", encoding="utf-8", newline="") as file:
+            rows = list(csv.DictReader(file))
+        return self.add_links(
+            [row.get("Дата торгов") for row in rows],
+            [row.get("Ссылка на скачивание") for row in rows],
+        )
+
+
+def file_name(link):
+    """
+    Имя XLS-файла для записи реестра: "dd.mm.yyyy_<id>.xls". id записи
+    не меняется между запусками, поэтому имя файла стабильно.
+    """
+    trade_date = datetime.date.fromisoformat(link["trade_date"])
+    return f"{trade_date.strftime(DATE_FORMAT)}_{link['id']}.xls"
@@ -1,25 +1,82 @@
+import os
 import time
 import argparse
+import importlib
+from functools import partial
 from logger_config import logger
+from config import XLS_READER, STAGE_METRICS_FILE, PROFILE_DIR
+from stage_metrics import STAGE, append_report, profiled
+from watermark import parse_date
 
-from parse import main as parse_main
-from download_xls import main as download_main
-from to_results_csv import main as results_main
+
+def _stage_main(module_name):
+    """
+    Возвращает main модуля этапа, который импортируется только при запуске
+    этапа: pandas, requests и pyexcel не загружаются для --help и для
+    этапов, которым они не нужны. Время импорта входит в отчёт этапа.
+    """
+    def stage_main(**kwargs):
+        return importlib.import_module(module_name).main(**kwargs)
+
+    return stage_main
 
 
-def run_stage(stage_name, stage_function):
+parse_main = _stage_main("parse")
+download_main = _stage_main("download_xls")
+results_main = _stage_main("to_results_csv")
+pipeline_main = _stage_main("pipeline")
+
+
+def run_stage(stage_name, stage_function, stage_key, run_id, profile=False):
     """
     Запускает указанный этап парсинга и логирует время его выполнения.
+    Отчёт этапа (скорости, ошибки, пиковый RSS, время в сети, разборе
+    и записи) дописывается строкой JSON в STAGE_METRICS_FILE, в том числе
+    при ошибке этапа. При profile основной поток этапа профилируется
+    cProfile в PROFILE_DIR/<run_id>_<stage_key>.prof.
     """
     logger.info(f"Начало этапа: {stage_name}")
+    STAGE.reset()
+    profile_path = (
+        os.path.join(PROFILE_DIR, f"{run_id}_{stage_key}.prof") if profile else None
+    )
     start_time = time.time()
+    status = "error"
 
     # Запуск этапа
-    stage_function()
+    try:
+        with profiled(profile_path):
+            stage_function()
+        status = "ok"
+    finally:
+        end_time = time.time()
+        elapsed_time = end_time - start_time
+        report = STAGE.report(stage_key, elapsed_time, run_id, status)
+        append_report(STAGE_METRICS_FILE, report)
 
-    end_time = time.time()
-    elapsed_time = end_time - start_time
     logger.info(f"Завершение этапа: {stage_name}. Время выполнения: {elapsed_time:.2f} секунд.")
+    logger.info(
+        f"Метрики этапа {stage_key}: страниц {report['pages']}, "
+        f"скачано файлов {report['files_downloaded']} "
+        f"({report['bytes_downloaded'] / 1024 / 1024:.1f} МБ), "
+        f"разобрано файлов {report['files_parsed']}, строк {report['rows']}, "
+        f"ошибок {report['errors']}, пиковый RSS {report['peak_rss_mb']} МБ "
+        f"({STAGE_METRICS_FILE})"
+    )
+    if profile_path:
+        logger.info(f"Профиль этапа {stage_key} сохранён в {profile_path}")
+
+
+def _since_date(value):
+    """
+    Разбирает дату аргумента --since в формате dd.mm.yyyy.
+    """
+    since = parse_date(value)
+    if since is None:
+        raise argparse.ArgumentTypeError(
+            f"Некорректная дата {value}, ожидается dd.mm.yyyy"
+        )
+    return since
 
 
 def main():
@@ -29,20 +86,102 @@ def main():
     parser = argparse.ArgumentParser(description="Запуск этапов парсинга.")
     parser.add_argument(
         "--stage",
-        choices=["parse", "download", "results", "all"],
+        choices=["parse", "download", "results", "all", "pipeline"],
         default="all",
-        help="Выберите этап для запуска: parse, download, results или all (по умолчанию)."
+        help="Выберите этап для запуска: parse, download, results, all (по умолчанию) "
+             "или pipeline (все этапы одновременно, связанные очередями)."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Количество потоков скачивания и процессов обработки "
+             "XLS-файлов (по умолчанию 1)."
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Дописывать результаты в CSV по мере обработки файлов "
+             "с возможностью продолжить прерванный запуск."
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Полная пересборка: обойти все страницы до MIN_YEAR, "
+             "игнорируя watermark, и игнорировать манифест обработанных файлов."
+    )
+    parser.add_argument(
+        "--since",
+        type=_since_date,
+        help="Собрать ссылки начиная с даты торгов dd.mm.yyyy "
+             "(дозагрузка истории) вместо сохранённого watermark."
+    )
+    parser.add_argument(
+        "--reader",
+        choices=["pyexcel", "xlrd"],
+        default=XLS_READER,
+        help="Способ чтения XLS-файлов: pyexcel (весь лист) "
+             "или xlrd (только таблица в метрических тоннах)."
+    )
+    parser.add_argument(
+        "--format",
+        dest="output_format",
+        choices=["csv", "parquet", "ipc"],
+        default="csv",
+        help="Формат результатов: csv (по умолчанию), parquet или ipc "
+             "(Arrow IPC) с разбиением по году и дате торгов."
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help=f"Профилировать каждый этап cProfile (файлы .prof и .txt в {PROFILE_DIR})."
     )
     args = parser.parse_args()
+    run_id = time.strftime("%Y%m%d-%H%M%S")
+    run = partial(run_stage, run_id=run_id, profile=args.profile)
 
     if args.stage == "parse" or args.stage == "all":
-        run_stage("Парсинг ссылок на XLS-файлы", parse_main)
+        run(
+            "Парсинг ссылок на XLS-файлы",
+            partial(parse_main, since=args.since, full=args.full),
+            "parse",
+        )
 
     if args.stage == "download" or args.stage == "all":
-        run_stage("Скачивание XLS-файлов", download_main)
+        run(
+            "Скачивание XLS-файлов",
+            partial(download_main, workers=args.workers),
+            "download",
+        )
 
     if args.stage == "results" or args.stage == "all":
-        run_stage("Обработка XLS-файлов и сохранение результатов", results_main)
+        run(
+            "Обработка XLS-файлов и сохранение результатов",
+            partial(
+                results_main,
+                workers=args.workers,
+                stream=args.stream,
+                full=args.full,
+                reader=args.reader,
+                output_format=args.output_format,
+            ),
+            "results",
+        )
+
+    if args.stage == "pipeline":
+        run(
+            "Конвейер: парсинг ссылок, скачивание и обработка XLS-файлов",
+            partial(
+                pipeline_main,
+                workers=args.workers,
+                since=args.since,
+                full=args.full,
+                stream=args.stream,
+                reader=args.reader,
+                output_format=args.output_format,
+            ),
+            "pipeline",
+        )
 
     if args.stage == "all":
         logger.info("Все этапы парсинга завершены.")
@@ -0,0 +1,125 @@
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+
+# Версия схемы результатов: при изменении кэш обработанных файлов устаревает
+SCHEMA_VERSION = 3
+
+# Формат даты торгов в именах файлов и в CSV ("dd.mm.yyyy_N")
+CSV_DATE_FORMAT = "%d.%m.%Y"
+
+# Соответствие столбцов XLS-файла столбцам результатов
+RESULT_COLUMNS_MAP = {
+    "Код Инструмента": "exchange_product_id",
+    "Наименование Инструмента": "exchange_product_name",
+    "Базис поставки": "delivery_basis_name",
+    "Объем Договоров в единицах измерения": "volume",
+    "Обьем Договоров, руб.": "total",
+    "Количество Договоров, шт.": "count",
+}
+
+# Компактная схема результатов: повторяющиеся коды - категории,
+# числа - int64, дата торгов - datetime64 с точностью до дня,
+# source - имя исходного файла "dd.mm.yyyy_N" (в CSV - столбец date)
+RESULT_DTYPES = {
+    "id": "int64",
+    "exchange_product_id": "category",
+    "exchange_product_name": "category",
+    "oil_id": "category",
+    "delivery_basis_id": "category",
+    "delivery_basis_name": "category",
+    "delivery_type_id": "category",
+    "volume": "Int64",
+    "total": "Int64",
+    "count": "int64",
+    "date": "datetime64[s]",
+    "source": "category",
+}
+
+RESULT_COLUMNS = list(RESULT_DTYPES)
+
+# Столбцы CSV и колоночных файлов (source записывается в CSV вместо даты)
+OUTPUT_COLUMNS = [column for column in RESULT_COLUMNS if column != "source"]
+
+CATEGORY_COLUMNS = [
+    column for column, dtype in RESULT_DTYPES.items() if dtype == "category"
+]
+
+
+def parse_trade_date(value):
+    """
+    Извлекает дату торгов из строки вида "dd.mm.yyyy" или "dd.mm.yyyy_N"
+    (имя скачанного XLS-файла).
+    """
+    return pd.to_datetime(
+        str(value).split("_")[0], format=CSV_DATE_FORMAT, errors="coerce"
+    )
+
+
+def to_compact_frame(df):
+    """
+    Приводит DataFrame результатов к компактной схеме RESULT_DTYPES.
+    Без столбца source имя файла берётся из date.
+    Дробные значения целочисленных столбцов округляются до целых
+    (см. fractional_cells), нечисловые становятся пропусками.
+    """
+    df = df.copy()
+    if "source" not in df:
+        df["source"] = (
+            df["date"].astype(str)
+            if df["date"].dtype == object
+            else df["date"].dt.strftime(CSV_DATE_FORMAT)
+        )
+    for column, dtype in RESULT_DTYPES.items():
+        if column == "date":
+            if df[column].dtype == object:
+                df[column] = pd.to_datetime(
+                    df[column].astype(str).str.split("_").str[0],
+                    format=CSV_DATE_FORMAT,
+                    errors="coerce",
+                )
+        elif dtype in ("int64", "Int64"):
+            df[column] = pd.to_numeric(df[column], errors="coerce").round()
+            if dtype == "int64":
+                df[column] = df[column].fillna(0)
+        df[column] = df[column].astype(dtype)
+    return df[RESULT_COLUMNS]
+
+
+def fractional_cells(df):
+    """
+    Количество дробных значений в целочисленных столбцах результатов:
+    to_compact_frame округляет их до целых.
+    """
+    count = 0
+    for column, dtype in RESULT_DTYPES.items():
+        if dtype in ("int64", "Int64") and column in df:
+            values = pd.to_numeric(df[column], errors="coerce")
+            count += int((values.notna() & (values != values.round())).sum())
+    return count
+
+
+def to_csv_frame(df):
+    """
+    Готовит компактный DataFrame к записи в CSV: в столбец date, как
+    и прежде, записывается имя исходного файла "dd.mm.yyyy_N".
+    """
+    return df.assign(date=df["source"].astype(str))[OUTPUT_COLUMNS]
+
+
+def concat_compact(frames):
+    """
+    Объединяет компактные DataFrame, сохраняя категориальные столбцы.
+    pd.concat приводит категории с разными наборами значений к object,
+    поэтому категориальные столбцы объединяются через union_categoricals.
+    """
+    columns = {}
+    for column in RESULT_COLUMNS:
+        parts = [frame[column] for frame in frames]
+        if column in CATEGORY_COLUMNS:
+            columns[column] = pd.Series(
+                union_categoricals(parts, ignore_order=True), name=column
+            )
+        else:
+            columns[column] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
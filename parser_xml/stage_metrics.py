@@ -0,0 +1,169 @@
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Счётчики отчёта этапа
+COUNTERS = (
+    "pages",
+    "links",
+    "files_downloaded",
+    "bytes_downloaded",
+    "duplicates",
+    "files_parsed",
+    "rows",
+    "errors",
+)
+
+# Время (с), суммарно по всем потокам этапа
+TIMERS = ("network", "parse", "write")
+
+# Строк сводки профиля в текстовом файле
+PROFILE_TOP = 40
+
+
+def _peak_rss_mb(who):
+    """
+    Пиковый RSS в мегабайтах с начала запуска (ru_maxrss в Linux - КБ).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    if sys.platform == "darwin":
+        peak /= 1024
+    return round(peak / 1024, 1)
+
+
+class StageMetrics:
+    """
+    Метрики текущего этапа: счётчики (страницы, новые ссылки, скачанные
+    файлы и байты, повторы уже сохранённых в архиве файлов, разобранные
+    файлы, строки результата, ошибки) и время
+    в сети, разборе и записи. Этапы пишут в общий объект STAGE (в том числе
+    из потоков загрузчика), run_parser.py обнуляет его перед этапом
+    и сохраняет отчёт после.
+    Процессы пула обработки метрики не пишут: разобранные файлы и строки
+    учитываются в основном процессе, а время разбора - как ожидание
+    результата пула.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = dict.fromkeys(COUNTERS, 0)
+            self.timers = dict.fromkeys(TIMERS, 0.0)
+
+    def add(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.timers[name] += seconds
+
+    @contextmanager
+    def timer(self, name):
+        """
+        Добавляет время выполнения блока к таймеру name.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start_time)
+
+    def report(self, stage, elapsed, run_id, status="ok"):
+        """
+        Отчёт этапа: счётчики, скорости в секунду, время по категориям
+        и пиковый RSS (основной процесс и дочерние процессы пула).
+        """
+        with self._lock:
+            counters = dict(self.counters)
+            timers = {name: round(value, 3) for name, value in self.timers.items()}
+
+        def per_second(value):
+            return round(value / elapsed, 3) if elapsed else None
+
+        return {
+            "run_id": run_id,
+            "stage": stage,
+            "status": status,
+            "finished_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "elapsed": round(elapsed, 3),
+            **counters,
+            "pages_per_second": per_second(counters["pages"]),
+            "files_downloaded_per_second": per_second(counters["files_downloaded"]),
+            "files_parsed_per_second": per_second(counters["files_parsed"]),
+            "rows_per_second": per_second(counters["rows"]),
+            "mb_per_second": per_second(counters["bytes_downloaded"] / 1024 / 1024),
+            "time": timers,
+            "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+            "peak_rss_children_mb": (
+                _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None
+            ),
+        }
+
+
+# Метрики выполняемого этапа
+STAGE = StageMetrics()
+
+
+def append_report(path, report):
+    """
+    Дописывает отчёт этапа строкой JSON в файл path (одна строка на этап,
+    отчёты разных запусков можно сравнивать по run_id).
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as file:
+        file.write(json.dumps(report, ensure_ascii=False) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+
+
+@contextmanager
+def profiled(path):
+    """
+    Профилирует блок cProfile (только основной поток) и сохраняет профиль
+    в path (.prof, для snakeviz / pstats) и сводку по cumulative-времени
+    в path с расширением .txt. Без path блок выполняется без профиля.
+    """
+    if not path:
+        yield
+        return
+
+    # Профилировщик загружается только с --profile
+    import cProfile
+    import io
+    import pstats
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(path)
+
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(
+            PROFILE_TOP
+        )
+        with open(os.path.splitext(path)[0] + ".txt", "w", encoding="utf-8") as file:
+            file.write(summary.getvalue())
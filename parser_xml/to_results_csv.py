@@ -1,10 +1,52 @@
 import os
-import pyexcel as pe
+import re
 import pandas as pd
-from config import URL_SAVE_DIR, XML_SAVE_DIR
-from utils import normalize_csv, get_output_path
+from config import (
+    URL_SAVE_DIR,
+    XML_SAVE_DIR,
+    STREAM_FLUSH_EVERY,
+    MANIFEST_PATH,
+    MANIFEST_CHECKPOINT_EVERY,
+    RESULTS_CACHE_DIR,
+    XLS_READER,
+    COLUMNAR_SAVE_DIR,
+    REGISTRY_PATH,
+)
+from utils import (
+    get_output_path,
+    get_absolute_path,
+    ensure_directory_exists,
+)
+from manifest import (
+    load_manifest,
+    save_manifest,
+    check_file,
+    load_cached_rows,
+    store_rows,
+    prune_manifest,
+)
+from archive import XlsArchive
+from checkpoint import atomic_write
+from registry import LinkRegistry
+from xls_reader import read_metric_ton_table
+from columnar import prune_partitions, write_partition
+from schema import (
+    RESULT_COLUMNS_MAP,
+    concat_compact,
+    fractional_cells,
+    parse_trade_date,
+    to_compact_frame,
+    to_csv_frame,
+)
 from logger_config import logger
+from stage_metrics import STAGE
 import time
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+
+
+# Кэш макетов заголовка: отпечаток строки заголовка -> позиции столбцов
+_LAYOUT_CACHE = {}
 
 
 def _find_header_index(data):
@@ -17,12 +59,68 @@ def _find_header_index(data):
     return None
 
 
-def _parse_xls_file(file_path):
+def _read_xls_rows(file_path, reader=XLS_READER):
+    """
+    Читает строки XLS-файла выбранным способом:
+    "pyexcel" - весь первый лист целиком,
+    "xlrd" - только таблица в метрических тоннах.
+    """
+    if reader == "xlrd":
+        return read_metric_ton_table(file_path)
+    # pyexcel импортируется только для этого способа чтения
+    import pyexcel as pe
+
+    return pe.get_array(file_name=file_path)
+
+
+def _normalize_header(value):
+    """
+    Нормализует название столбца: схлопывает пробелы и переносы строк,
+    повторяющиеся запятые и обрезает края.
+    """
+    value = re.sub(r"\s+", " ", str(value))
+    return re.sub(r",+", ",", value).strip()
+
+
+def _resolve_layout(headers, file_path):
+    """
+    Возвращает позиции нужных столбцов для строки заголовка.
+
+    Бюллетени SPIMEX используют несколько одинаковых макетов, поэтому
+    результат кэшируется по отпечатку строки заголовка: нормализация
+    названий выполняется один раз на макет, а не на каждый файл.
+    О неизвестном макете сообщается один раз, при первом файле.
+    """
+    fingerprint = tuple(str(header) for header in headers)
+    if fingerprint in _LAYOUT_CACHE:
+        return _LAYOUT_CACHE[fingerprint]
+
+    positions = {}
+    for position, header in enumerate(fingerprint):
+        positions.setdefault(_normalize_header(header), position)
+
+    missing = [column for column in RESULT_COLUMNS_MAP if column not in positions]
+    if missing:
+        logger.error(
+            f"Неизвестный макет заголовка в файле {file_path}: "
+            f"отсутствуют столбцы {missing}. "
+            f"Доступные столбцы: {[name for name in positions if name]}. "
+            f"Файлы с таким же заголовком будут пропущены."
+        )
+        layout = None
+    else:
+        layout = [positions[column] for column in RESULT_COLUMNS_MAP]
+
+    _LAYOUT_CACHE[fingerprint] = layout
+    return layout
+
+
+def _parse_xls_file(file_path, reader=XLS_READER):
     """
     Парсит XLS-файл и возвращает обработанный DataFrame.
     """
     try:
-        data = pe.get_array(file_name=file_path)
+        data = _read_xls_rows(file_path, reader)
 
         header_index = _find_header_index(data)
         if header_index is None:
@@ -31,28 +129,26 @@ def _parse_xls_file(file_path):
             )
             return None
 
-        headers = data[header_index + 1]
-        df = pd.DataFrame(data[header_index + 2 :], columns=headers)
+        layout = _resolve_layout(data[header_index + 1], file_path)
+        if layout is None:
+            return None
 
+        df = pd.DataFrame(data[header_index + 2 :]).iloc[:, layout]
+        df.columns = list(RESULT_COLUMNS_MAP)
         df = df.dropna(how="all")
-        df = normalize_csv(df)
 
-        if "Количество Договоров, шт." in df.columns:
-            try:
-                df["Количество Договоров, шт."] = pd.to_numeric(
-                    df["Количество Договоров, шт."], errors="coerce"
-                )
-                df = df[df["Количество Договоров, шт."] > 0]
-                df["Количество Договоров, шт."] = df[
-                    "Количество Договоров, шт."
-                ].astype(int)
-            except Exception as e:
-                logger.error(
-                    f"Ошибка обработки колонки 'Количество Договоров, шт.': {e}"
-                )
-                return None
-        else:
-            logger.error("Колонка 'Количество Договоров, шт.' отсутствует в данных.")
+        try:
+            df["Количество Договоров, шт."] = pd.to_numeric(
+                df["Количество Договоров, шт."], errors="coerce"
+            )
+            df = df[df["Количество Договоров, шт."] > 0]
+            df["Количество Договоров, шт."] = df[
+                "Количество Договоров, шт."
+            ].astype(int)
+        except Exception as e:
+            logger.error(
+                f"Ошибка обработки колонки 'Количество Договоров, шт.': {e}"
+            )
             return None
 
         return df
@@ -63,106 +159,404 @@ def _parse_xls_file(file_path):
         return None
 
 
-def _process_data(df, file_path):
+def _process_data(df, file_path, source=None):
     """
     Обрабатывает данные и возвращает результирующий DataFrame.
+    source - имя "dd.mm.yyyy_N" ссылки на файл архива, по умолчанию
+    имя файла без расширения; из него берётся дата торгов.
     """
-    date = os.path.splitext(os.path.basename(file_path))[0]
+    source = source or os.path.splitext(os.path.basename(file_path))[0]
 
-    df.columns = df.columns.str.replace(r"\s+", " ", regex=True).str.strip()
+    result_df = df[list(RESULT_COLUMNS_MAP)].rename(columns=RESULT_COLUMNS_MAP)
 
-    if "Код Инструмента" not in df.columns:
-        logger.error("Столбец 'Код Инструмента' отсутствует!")
-        logger.error("Доступные столбцы:", df.columns.tolist())
-        return None
+    product_id = result_df["exchange_product_id"].str
+    result_df["oil_id"] = product_id[:4]
+    result_df["delivery_basis_id"] = product_id[4:7]
+    result_df["delivery_type_id"] = product_id[-1]
+    result_df["id"] = df.index + 1
+    result_df["date"] = parse_trade_date(source)
+    result_df["source"] = source
+
+    fractional = fractional_cells(result_df)
+    if fractional:
+        logger.warning(
+            f"В файле {file_path} дробных значений в целочисленных "
+            f"столбцах: {fractional}, значения округлены до целых"
+        )
+    return to_compact_frame(result_df)
 
-    result_df = pd.DataFrame(
-        columns=[
-            "id",
-            "exchange_product_id",
-            "exchange_product_name",
-            "oil_id",
-            "delivery_basis_id",
-            "delivery_basis_name",
-            "delivery_type_id",
-            "volume",
-            "total",
-            "count",
-            "date",
-        ]
+
+def _collect_xls_files(base_dir):
+    """
+    Собирает пути ко всем XLS-файлам в директории в порядке обхода os.walk.
+    """
+    file_paths = []
+    for root, dirs, files in os.walk(base_dir):
+        for file in files:
+            if file.endswith(".xls"):
+                file_paths.append(os.path.join(root, file))
+    return file_paths
+
+
+def _collect_sources(base_dir):
+    """
+    Собирает XLS-файлы для обработки: файлы архива из реестра ссылок -
+    по одному на уникальное содержимое, сколько бы ссылок на него ни было,
+    и файлы вне архива, не известные реестру. Файлы, скачанные до архива,
+    сначала переносятся в него. Возвращает пути и имена ссылок на файлы
+    архива {путь: ["dd.mm.yyyy_N", ...]}.
+    """
+    archive = XlsArchive(base_dir)
+    with LinkRegistry(REGISTRY_PATH) as registry:
+        adopted = archive.adopt(registry)
+        sources = archive.sources(registry)
+    if adopted:
+        logger.info(f"Перенесено в архив файлов, скачанных ранее: {adopted}")
+
+    file_paths = [file_path for file_path, _ in sources]
+    link_names = {file_path: names for file_path, names in sources if names}
+    logger.info(
+        f"Файлов в архиве: {len(link_names)}, "
+        f"вне архива: {len(file_paths) - len(link_names)}"
     )
+    return file_paths, link_names
 
-    for index, row in df.iterrows():
-        try:
-            exchange_product_id = row["Код Инструмента"]
-            exchange_product_name = row["Наименование Инструмента"]
-            delivery_basis_name = row["Базис поставки"]
-            volume = row["Объем Договоров в единицах измерения"]
-            total = row["Обьем Договоров, руб."]
-            count = row["Количество Договоров, шт."]
-
-            oil_id = exchange_product_id[:4]
-            delivery_basis_id = exchange_product_id[4:7]
-            delivery_type_id = exchange_product_id[-1]
-
-            result_df.loc[index] = [
-                index + 1,
-                exchange_product_id,
-                exchange_product_name,
-                oil_id,
-                delivery_basis_id,
-                delivery_basis_name,
-                delivery_type_id,
-                volume,
-                total,
-                count,
-                date,
-            ]
-        except KeyError as e:
-            logger.error(f"Ошибка обработки строки {index}: {e}")
+
+def _with_link_names(processed_data, names):
+    """
+    Размножает строки файла архива по ссылкам на него: файл разбирается
+    один раз, а результаты остаются такими же, как если бы каждая ссылка
+    была скачана в отдельный файл "dd.mm.yyyy_N.xls".
+    """
+    if processed_data is None or not names:
+        return processed_data
+    return concat_compact([
+        processed_data.assign(
+            date=parse_trade_date(name).as_unit("s"), source=name
+        ).astype({"source": "category"})
+        for name in names
+    ])
+
+
+def _parse_and_process_file(file_path, reader=XLS_READER, source=None):
+    """
+    Парсит и обрабатывает один XLS-файл.
+    Выполняется как в основном, так и в дочерних процессах пула.
+    Ошибка в данных файла логируется, и пропускается только этот файл.
+    """
+    logger.info(f"Обрабатывается файл: {file_path}")
+
+    result = _parse_xls_file(file_path, reader)
+    if result is None or result.empty:
+        return None
+    try:
+        return _process_data(result, file_path, source)
+    except Exception as e:
+        logger.error(f"Ошибка при обработке данных файла {file_path}: {e}")
+        return None
+
+
+def _iter_processed_files(file_paths, workers=1, reader=XLS_READER, link_names=None):
+    """
+    Возвращает пары (путь, результат) в порядке file_paths.
+    При workers > 1 файлы обрабатываются в пуле процессов: в работе
+    и в ожидании чтения не больше workers * 2 файлов, поэтому готовые
+    результаты не копятся в памяти. Если чтение прервано (ошибка записи,
+    Ctrl-C), ещё не начатые файлы отменяются.
+    """
+    sources = [
+        (link_names or {}).get(file_path, [None])[0] for file_path in file_paths
+    ]
+    if workers <= 1:
+        for file_path, source in zip(file_paths, sources):
+            yield file_path, _parse_and_process_file(file_path, reader, source)
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        for file_path, source in zip(file_paths, sources):
+            pending.append(
+                (
+                    file_path,
+                    executor.submit(_parse_and_process_file, file_path, reader, source),
+                )
+            )
+            if len(pending) >= workers * 2:
+                file_path, future = pending.popleft()
+                yield file_path, future.result()
+        while pending:
+            file_path, future = pending.popleft()
+            yield file_path, future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _iter_results(
+    file_paths, workers=1, full=False, reader=XLS_READER, link_names=None,
+    prune=True,
+):
+    """
+    Возвращает пары (путь, результат) в порядке file_paths, переиспользуя
+    результаты неизменившихся файлов из манифеста. Парсятся только новые
+    и изменённые файлы; при full=True парсятся все файлы.
+    При prune=True (file_paths - все исходные файлы) из манифеста и кэша
+    удаляются записи файлов, которых нет в file_paths.
+    Время разбора в метриках этапа - время ожидания результата
+    (при workers > 1 - результата пула процессов).
+    Манифест сохраняется каждые MANIFEST_CHECKPOINT_EVERY обработанных
+    файлов: после сбоя уже обработанные файлы берутся из кэша.
+    """
+    base_path = os.path.abspath(os.path.dirname(__file__))
+    manifest_path = get_output_path(base_path, MANIFEST_PATH)
+    cache_dir = get_absolute_path(base_path, RESULTS_CACHE_DIR)
+    ensure_directory_exists(cache_dir)
+
+    manifest = {} if full else load_manifest(manifest_path)
+
+    hashes = {}
+    to_parse = []
+    for file_path in file_paths:
+        is_cached, content_hash = check_file(
+            manifest, file_path, cache_dir, reader
+        )
+        if is_cached:
             continue
+        hashes[file_path] = content_hash
+        to_parse.append(file_path)
 
-    return result_df
+    logger.info(
+        f"Файлов к обработке: {len(to_parse)}, "
+        f"из кэша: {len(file_paths) - len(to_parse)}"
+    )
+
+    parsed = _iter_processed_files(to_parse, workers, reader, link_names)
+    parsed_count = 0
+    try:
+        for file_path in file_paths:
+            if file_path in hashes:
+                with STAGE.timer("parse"):
+                    _, processed_data = next(parsed)
+                STAGE.add("files_parsed")
+                store_rows(
+                    manifest,
+                    file_path,
+                    hashes[file_path],
+                    processed_data,
+                    cache_dir,
+                    reader,
+                )
+                parsed_count += 1
+                if parsed_count % MANIFEST_CHECKPOINT_EVERY == 0:
+                    save_manifest(manifest, manifest_path)
+            else:
+                processed_data = load_cached_rows(manifest, file_path, cache_dir)
+            processed_data = _with_link_names(
+                processed_data, (link_names or {}).get(file_path)
+            )
+            if processed_data is not None:
+                STAGE.add("rows", len(processed_data))
+            yield file_path, processed_data
+        if prune:
+            prune_manifest(manifest, file_paths, cache_dir)
+    finally:
+        parsed.close()
+        save_manifest(manifest, manifest_path)
 
 
-def _parse_all_xls_files(base_dir):
+def _parse_all_xls_files(base_dir, workers=1, full=False, reader=XLS_READER):
     """
     Парсит все XLS-файлы в указанной директории.
     """
-    all_data = []
-    for root, dirs, files in os.walk(base_dir):
-        for file in files:
-            if file.endswith(".xls"):
-                file_path = os.path.join(root, file)
-                logger.info(f"Обрабатывается файл: {file_path}")
+    file_paths, link_names = _collect_sources(base_dir)
 
-                result = _parse_xls_file(file_path)
-                if result is not None and not result.empty:
-                    processed_data = _process_data(result, file_path)
-                    if processed_data is not None:
-                        all_data.append(processed_data)
+    all_data = []
+    for file_path, processed_data in _iter_results(
+        file_paths, workers, full, reader, link_names
+    ):
+        if processed_data is not None:
+            all_data.append(processed_data)
 
     if len(all_data) > 0:
-        final_df = pd.concat(all_data, ignore_index=True)
+        final_df = concat_compact(all_data)
         return final_df
     else:
         logger.warning("Нет данных для сохранения.")
         return None
 
 
-def main():
+def _load_stream_progress(output_path, progress_path):
+    """
+    Загружает контрольную точку потоковой записи.
+    Обрезает выходной файл до последнего зафиксированного смещения,
+    чтобы строки недописанного файла не попали в результат дважды.
+    Возвращает None, если выходной файл не соответствует контрольной точке.
+    """
+    done_files = set()
+    offset = 0
+    with open(progress_path, "r", encoding="utf-8") as progress:
+        for line in progress:
+            # Недописанная последняя строка означает, что запись прервалась
+            if not line.endswith("\n"):
+                break
+            line_offset, _, file_path = line.rstrip("\n").partition("\t")
+            offset = int(line_offset)
+            done_files.add(file_path)
+
+    if not os.path.exists(output_path) or os.path.getsize(output_path) < offset:
+        logger.warning(
+            f"Файл {output_path} не соответствует контрольной точке {progress_path}"
+        )
+        return None
+
+    with open(output_path, "a", encoding="utf-8") as output:
+        output.truncate(offset)
+    return done_files
+
+
+def _stream_all_xls_files(
+    base_dir, output_path, workers=1, full=False, reader=XLS_READER
+):
+    """
+    Парсит XLS-файлы и дописывает строки каждого файла в выходной CSV
+    сразу после обработки. Прогресс фиксируется в файле .progress,
+    по завершении создаётся маркер .done. Прерванный запуск продолжается
+    с последней контрольной точки.
+    """
+    progress_path = output_path + ".progress"
+    done_path = output_path + ".done"
+
+    done_files = None
+    if os.path.exists(progress_path) and not os.path.exists(done_path):
+        done_files = _load_stream_progress(output_path, progress_path)
+
+    if done_files is not None:
+        logger.info(
+            f"Продолжение прерванной записи: обработано файлов {len(done_files)}"
+        )
+    else:
+        done_files = set()
+        for path in (output_path, progress_path, done_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    file_paths, link_names = _collect_sources(base_dir)
+    # При продолжении уже записанные файлы пропускаются, поэтому
+    # записи манифеста по неполному списку файлов не удаляются
+    prune = not done_files
+    file_paths = [
+        file_path for file_path in file_paths if file_path not in done_files
+    ]
+
+    with open(output_path, "a", encoding="utf-8", newline="") as output, open(
+        progress_path, "a", encoding="utf-8"
+    ) as progress:
+        write_header = output.tell() == 0
+        pending_progress = []
+
+        for counter, (file_path, processed_data) in enumerate(
+            _iter_results(file_paths, workers, full, reader, link_names, prune),
+            start=1,
+        ):
+            if processed_data is not None and not processed_data.empty:
+                with STAGE.timer("write"):
+                    to_csv_frame(processed_data).to_csv(
+                        output, header=write_header, index=False
+                    )
+                write_header = False
+            pending_progress.append((output.tell(), file_path))
+
+            if counter % STREAM_FLUSH_EVERY == 0 or counter == len(file_paths):
+                with STAGE.timer("write"):
+                    _flush_stream(output, progress, pending_progress)
+                pending_progress = []
+
+    with open(done_path, "w", encoding="utf-8") as done:
+        done.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+
+    if os.path.getsize(output_path) == 0:
+        logger.warning("Нет данных для сохранения.")
+        return False
+    return True
+
+
+def _flush_stream(output, progress, entries):
+    """
+    Сбрасывает выходной CSV на диск и только затем фиксирует
+    обработанные файлы вместе со смещениями конца их строк в файле прогресса.
+    """
+    output.flush()
+    os.fsync(output.fileno())
+
+    progress.writelines(
+        f"{offset}\t{file_path}\n" for offset, file_path in entries
+    )
+    progress.flush()
+    os.fsync(progress.fileno())
+
+
+def _write_columnar_all(
+    base_dir, output_dir, workers=1, full=False, reader=XLS_READER,
+    file_format="parquet",
+):
+    """
+    Парсит XLS-файлы и записывает результат каждого файла в колоночном
+    формате (Parquet или Arrow IPC) с разбиением по году и дате торгов.
+    Файлы разделов, не относящиеся к текущим XLS-файлам, удаляются.
+    """
+    file_paths, link_names = _collect_sources(base_dir)
+
+    partition_paths = []
+    for file_path, processed_data in _iter_results(
+        file_paths, workers, full, reader, link_names
+    ):
+        if processed_data is None or processed_data.empty:
+            continue
+        with STAGE.timer("write"):
+            partition_paths += write_partition(
+                processed_data, file_path, output_dir, file_format
+            )
+
+    removed = prune_partitions(output_dir, partition_paths, file_format)
+    if removed:
+        logger.info(f"Удалено устаревших файлов разделов: {removed}")
+    if not partition_paths:
+        logger.warning("Нет данных для сохранения.")
+        return False
+    logger.info(f"Записано разделов: {len(partition_paths)}")
+    return True
+
+
+def main(
+    workers=1, stream=False, full=False, reader=XLS_READER, output_format="csv"
+):
     """
     Основная функция для обработки XLS-файлов.
     """
     start_time = time.time()
 
-    result_df = _parse_all_xls_files(XML_SAVE_DIR)
-    if result_df is not None:
-        base_path = os.path.abspath(os.path.dirname(__file__))
+    base_path = os.path.abspath(os.path.dirname(__file__))
 
+    if output_format != "csv":
+        output_path = get_absolute_path(base_path, COLUMNAR_SAVE_DIR)
+        saved = _write_columnar_all(
+            XML_SAVE_DIR, output_path, workers, full, reader, output_format
+        )
+    elif stream:
+        output_path = get_output_path(base_path, URL_SAVE_DIR)
+        saved = _stream_all_xls_files(
+            XML_SAVE_DIR, output_path, workers, full, reader
+        )
+    else:
         output_path = get_output_path(base_path, URL_SAVE_DIR)
+        result_df = _parse_all_xls_files(XML_SAVE_DIR, workers, full, reader)
+        saved = result_df is not None
+        if saved:
+            # Недописанный CSV не заменяет результат прошлого запуска
+            with STAGE.timer("write"), atomic_write(output_path) as output:
+                to_csv_frame(result_df).to_csv(output, index=False)
 
-        result_df.to_csv(output_path, index=False, encoding="utf-8")
+    if saved:
         logger.info(f"Результаты сохранены в файл: {output_path}")
         end_time = time.time()
         elapsed_time = end_time - start_time
@@ -1,21 +1,4 @@
 import os
-import pandas as pd
-
-def normalize_csv(df):
-    """
-    Нормализует DataFrame:
-    - Удаляет лишние запятые и пробелы.
-    - Убирает пустые строки и столбцы.
-    """
-    df.columns = (
-        df.columns
-        .str.replace(r'\s+', ' ', regex=True)
-        .str.replace(r',+', ',', regex=True)
-        .str.strip()
-    )
-
-    df = df.dropna(how="all").dropna(axis=1, how="all")
-    return df
 
 
 def get_absolute_path(base_path, relative_path):
@@ -0,0 +1,110 @@
+import datetime
+import json
+import os
+
+
+# Формат дат торгов на странице и в файле watermark
+DATE_FORMAT = "%d.%m.%Y"
+
+
+def parse_date(value):
+    """
+    Преобразует строку "dd.mm.yyyy" в date. Возвращает None,
+    если строка пустая или имеет другой формат.
+    """
+    try:
+        return datetime.datetime.strptime(value.strip(), DATE_FORMAT).date()
+    except (AttributeError, ValueError):
+        return None
+
+
+def load_watermark(path):
+    """
+    Читает из файла watermark самую новую уже собранную дату торгов.
+    Возвращает None, если файла нет или он повреждён.
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return parse_date(json.load(file).get("last_trade_date"))
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def save_watermark(path, trade_date):
+    """
+    Атомарно сохраняет самую новую собранную дату торгов в файл watermark.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(
+            {"last_trade_date": trade_date.strftime(DATE_FORMAT)},
+            file,
+            ensure_ascii=False,
+        )
+    os.replace(tmp_path, path)
+
+
+def update_watermark(path, last_date):
+    """
+    Сохраняет last_date, если она новее сохранённого watermark
+    (при обходе с since или full watermark не уменьшается).
+    Возвращает True, если watermark обновлён.
+    """
+    current = load_watermark(path)
+    if current is not None and last_date <= current:
+        return False
+    save_watermark(path, last_date)
+    return True
+
+
+def resolve_watermark(path, since=None, full=False):
+    """
+    Определяет границу обхода: при full - без границы, при since
+    (date) - собираются даты начиная с since включительно, иначе -
+    даты начиная с сохранённого watermark включительно.
+    """
+    if full:
+        return None
+    if since is not None:
+        return since
+    return load_watermark(path)
+
+
+def split_by_watermark(dates, xls_links, watermark):
+    """
+    Оставляет только ссылки с датой торгов не старше watermark: бюллетень
+    за саму дату watermark мог быть опубликован позже, а повторные ссылки
+    отсеивает реестр (ключ - URL). Возвращает новые даты, новые ссылки
+    и признак того, что на странице встретилась дата старше watermark:
+    страницы идут от новых к старым, поэтому дальше обходить не нужно.
+    """
+    if watermark is None:
+        return dates, xls_links, False
+
+    new_dates = []
+    new_links = []
+    reached = False
+    for date, link in zip(dates, xls_links):
+        trade_date = parse_date(date) if date else None
+        if trade_date is None:
+            continue
+        if trade_date < watermark:
+            reached = True
+            continue
+        new_dates.append(date)
+        new_links.append(link)
+    return new_dates, new_links, reached
+
+
+def newest_date(dates, current=None):
+    """
+    Возвращает самую новую дату из строк dates и current.
+    """
+    parsed = [parse_date(date) for date in dates if date]
+    candidates = [date for date in parsed if date is not None]
+    if current is not None:
+        candidates.append(current)
+    return max(candidates) if candidates else None
@@ -0,0 +1,86 @@
+import datetime
+import math
+
+import xlrd
+
+
+METRIC_TON_MARKER = "Единица измерения: Метрическая тонна"
+UNIT_MARKER_PREFIX = "Единица измерения:"
+ERROR_VALUE = "#N/A"
+
+
+def _convert_row(types, values, date_mode):
+    """
+    Приводит значения ячеек строки к тем же типам, что и pyexcel:
+    целые числа без дробной части - int, даты - date/datetime,
+    ошибки - "#N/A".
+    """
+    row = []
+    for cell_type, value in zip(types, values):
+        if cell_type == xlrd.XL_CELL_NUMBER:
+            if value == math.floor(value):
+                value = int(value)
+        elif cell_type == xlrd.XL_CELL_DATE:
+            value = _xldate_to_python(value, date_mode)
+        elif cell_type == xlrd.XL_CELL_ERROR:
+            value = ERROR_VALUE
+        row.append(value)
+    return row
+
+
+def _xldate_to_python(value, date_mode):
+    """
+    Преобразует дату Excel в date, time или datetime.
+    """
+    date_tuple = xlrd.xldate_as_tuple(value, date_mode)
+    if date_tuple[:3] == (0, 0, 0):
+        return datetime.time(*date_tuple[3:])
+    if date_tuple[3:] == (0, 0, 0):
+        return datetime.date(*date_tuple[:3])
+    return datetime.datetime(*date_tuple)
+
+
+def _is_unit_marker(values):
+    """
+    Проверяет, начинается ли в строке новая секция "Единица измерения: ...".
+    """
+    return any(
+        isinstance(value, str) and value.startswith(UNIT_MARKER_PREFIX)
+        for value in values
+    )
+
+
+def read_metric_ton_table(file_path):
+    """
+    Читает из первого листа только таблицу "Единица измерения: Метрическая тонна".
+
+    Лист xlrd разбирает целиком (on_demand откладывает только остальные
+    листы), поэтому экономия здесь в обработке строк: до маркера значения
+    не преобразуются, после конца таблицы (следующий маркер единицы
+    измерения или конец листа) строки не перебираются. Возвращает список
+    строк, начиная со строки маркера, или пустой список, если маркер
+    не найден.
+    """
+    book = xlrd.open_workbook(file_path, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+
+        start = None
+        for row_index in range(sheet.nrows):
+            if METRIC_TON_MARKER in sheet.row_values(row_index):
+                start = row_index
+                break
+        if start is None:
+            return []
+
+        table = [sheet.row_values(start)]
+        for row_index in range(start + 1, sheet.nrows):
+            values = sheet.row_values(row_index)
+            if _is_unit_marker(values):
+                break
+            table.append(
+                _convert_row(sheet.row_types(row_index), values, book.datemode)
+            )
+        return table
+    finally:
+        book.release_resources()